@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Cold-start cost of both Lambda handlers: module import and first-use init.
+
+Each run is a fresh interpreter started with -X importtime, so nothing is
+cached between runs. It times the handler import, then each lazy init step
+in the order a real invocation reaches it:
+  worker:    s3 client, dynamodb client, feed aggregator (all feeds keyed), numpy
+  submitter: dynamodb client (GET /scans/{id}), then s3 and sqs clients (POST /scans)
+The import-time log gives the breakdown by root package (boto3, botocore,
+requests, numpy, lib, ...), attributed to the step that imported it.
+
+Medians over --runs are printed. --record appends them with the commit id
+(suffixed -dirty when tracked files differ from it) to
+benchmarks/cold_start_history.jsonl, and --history shows how they moved. The
+timings are machine-specific: the history is kept by CI as an artifact, not
+committed (record from a clean checkout of the commit being measured).
+
+Usage:
+    python benchmarks/bench_cold_start.py [--runs 5] [--record]
+    python benchmarks/bench_cold_start.py --history
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+HISTORY_PATH = os.path.join(ROOT, "benchmarks", "cold_start_history.jsonl")
+ENV = {"TABLE_NAME": "t", "S3_BUCKET": "b", "QUEUE_URL": "q", "AWS_DEFAULT_REGION": "us-east-1",
+       "AWS_ACCESS_KEY_ID": "local", "AWS_SECRET_ACCESS_KEY": "local",
+       "ABUSEIPDB_API_KEY": "k", "GREYNOISE_API_KEY": "k", "SHODAN_API_KEY": "k", "OTX_API_KEY": "k"}
+
+# handler -> init steps run after its import (name, statement)
+STEPS = {
+    "worker_lambda": [
+        ("s3_client", "client('s3')"),
+        ("dynamodb_client", "client('dynamodb')"),
+        ("aggregator", "handler.get_aggregator()"),
+        ("numpy", "load_numpy()"),
+    ],
+    "submitter_lambda": [
+        ("dynamodb_client", "client('dynamodb')"),
+        ("s3_client", "client('s3')"),
+        ("sqs_client", "client('sqs')"),
+    ],
+}
+
+PROBE = """
+import sys, time, json
+sys.path.insert(0, {lambdas!r})
+marks = []
+def mark(name):
+    marks.append((name, time.perf_counter()))
+    print('@@mark ' + name, file=sys.stderr, flush=True)
+mark('start')
+import {handler} as handler
+mark('import')
+from lib.aws_clients import client
+from lib.batch_scoring import load_numpy
+{steps}
+print(json.dumps([(n, round((t - marks[i][1]) * 1000, 3)) for i, (n, t) in enumerate(marks[1:])]))
+"""
+
+
+def probe(handler):
+    """One fresh-interpreter run: ({step: ms}, {step: {package: ms}})."""
+    steps = "\n".join(f"{stmt}\nmark({name!r})" for name, stmt in STEPS[handler])
+    code = PROBE.format(lambdas=os.path.join(ROOT, "lambdas"), handler=handler, steps=steps)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                          env={**os.environ, **ENV}, cwd=ROOT, check=True)
+    timings = dict(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    # "import time: self [us] | cumulative | name": self times summed by root package,
+    # for the step that follows the last mark seen
+    names = ["start", "import"] + [name for name, _ in STEPS[handler]]
+    following = dict(zip(names, names[1:]))
+    packages, step = {}, None
+    for line in proc.stderr.splitlines():
+        if line.startswith("@@mark "):
+            step = following.get(line[len("@@mark "):])
+            continue
+        if step is None or not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if not own.strip().isdigit():
+            continue    # the column header
+        pkg = name.strip().split(".")[0]
+        bucket = packages.setdefault(step, {})
+        bucket[pkg] = bucket.get(pkg, 0.0) + int(own) / 1000.0
+    return timings, packages
+
+
+def measure(handler, runs):
+    timings, packages = [], []
+    for _ in range(runs):
+        t, p = probe(handler)
+        timings.append(t)
+        packages.append(p)
+    steps = list(timings[0])
+    out = {"steps_ms": {s: round(statistics.median(t[s] for t in timings), 2) for s in steps}}
+    out["total_ms"] = round(sum(out["steps_ms"].values()), 2)
+    out["packages_ms"] = {}
+    for s in steps:
+        pkgs = {pkg for p in packages for pkg in p.get(s, {})}
+        med = {pkg: round(statistics.median(p.get(s, {}).get(pkg, 0.0) for p in packages), 2) for pkg in pkgs}
+        out["packages_ms"][s] = dict(sorted(med.items(), key=lambda kv: -kv[1]))
+    return out
+
+
+def git_commit():
+    """Short id of the checked-out commit, "<id>-dirty" when the measured tree is not that commit."""
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty", "--abbrev=7"], capture_output=True,
+                              text=True, cwd=ROOT, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def show_history(path, last=20):
+    if not os.path.exists(path):
+        print(f"no history at {path}")
+        return
+    with open(path, encoding="utf-8") as fh:
+        entries = [json.loads(line) for line in fh if line.strip()][-last:]
+    print(f"{'date':>20} {'commit':>13} {'worker import':>14} {'worker total':>13} "
+          f"{'submitter import':>17} {'submitter total':>16}")
+    for e in entries:
+        w, s = e["handlers"].get("worker_lambda", {}), e["handlers"].get("submitter_lambda", {})
+        print(f"{e['date']:>20} {e.get('commit') or '-':>13} {w.get('steps_ms', {}).get('import', 0):>14.1f} "
+              f"{w.get('total_ms', 0):>13.1f} {s.get('steps_ms', {}).get('import', 0):>17.1f} {s.get('total_ms', 0):>16.1f}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--record", action="store_true", help=f"append the medians to {HISTORY_PATH}")
+    ap.add_argument("--history", action="store_true", help="print recorded runs and exit")
+    ap.add_argument("--history-path", default=HISTORY_PATH)
+    args = ap.parse_args(argv)
+
+    if args.history:
+        show_history(args.history_path)
+        return
+
+    result = {"date": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": git_commit(),
+              "python": platform.python_version(), "runs": args.runs, "handlers": {}}
+    for handler in STEPS:
+        m = measure(handler, args.runs)
+        result["handlers"][handler] = m
+        print(f"\n{handler}: {m['total_ms']:.1f} ms to first full use (median of {args.runs})")
+        for step, ms in m["steps_ms"].items():
+            top = ", ".join(f"{pkg} {v:.1f}" for pkg, v in list(m["packages_ms"].get(step, {}).items())[:4])
+            print(f"  {step:>16} {ms:>8.1f} ms   {top}")
+
+    if args.record:
+        with open(args.history_path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(result, sort_keys=True) + "\n")
+        print(f"\nrecorded in {args.history_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Peak and retained memory of the worker per stage, for generated plans of growing size.
+
+For each plan size it reports, under tracemalloc:
+  - the in-memory path stage by stage (read the S3 body, json.loads, parse,
+    contexts, reachability, scoring, results json.dumps): the peak reached
+    during the stage and what is still allocated after it, since the worker
+    keeps every stage's output alive until the scan ends;
+  - the whole scan through worker_lambda.process_scan, once in memory and once
+    forced through the sharded streaming path, on in-memory S3/DynamoDB.
+The ratio of the in-memory peak to the plan size is the PLAN_MEMORY_FACTOR
+the worker's memory budget uses to pick a path (lib/memory_budget.py).
+
+Usage: python benchmarks/bench_memory.py [--sizes 1000,5000,20000] [--user-data-kb 0,16]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "lambdas")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.plan_generator import PlanProfile, write_plan  # noqa: E402
+from benchmarks.local_pipeline import load_handlers  # noqa: E402
+
+MIB = 1024 * 1024
+
+
+def _mib(n):
+    return round(n / MIB, 2)
+
+
+def stage_profile(data):
+    """[(stage, peak MiB, retained MiB)] of the in-memory path over plan bytes."""
+    from lib.parser import parse_iac_plan
+    from lib.resource_context import build_context
+    from lib.resource_graph import reachable_contexts
+    from lib.correlation_engine import correlate_threats
+    from lib.risk_scoring import calculate_risk_score
+    from lib.explanation_builder import build_explanation
+
+    held = {}
+    stages = [
+        ("read", lambda: bytes(memoryview(data))),     # the body read allocates a copy
+        ("decode", lambda: json.loads(held["read"])),
+        ("parse", lambda: parse_iac_plan(held["decode"])),
+        ("contexts", lambda: [build_context(r) for r in held["parse"]]),
+        ("reachability", lambda: reachable_contexts(held["decode"], held["parse"], held["contexts"])),
+        ("score", lambda: [build_explanation(r, correlate_threats(r, [], ctx=c), *calculate_risk_score([]), ctx=c)
+                           for r, c in zip(held["parse"], held["reachability"])]),
+        ("encode", lambda: json.dumps(held["score"])),
+    ]
+    out = []
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        for name, fn in stages:
+            tracemalloc.reset_peak()
+            held[name] = fn()
+            current, peak = tracemalloc.get_traced_memory()
+            out.append((name, _mib(peak - base), _mib(current - base)))
+    finally:
+        tracemalloc.stop()
+    return out
+
+
+def scan_peak(worker, s3, key, sharded):
+    """Peak MiB of worker.process_scan over the stored plan."""
+    from lib.memory_budget import MemoryBudget
+    # a 1 MiB budget sends any plan to the sharded path without triggering shard shrinking
+    memory = MemoryBudget(budget_mb=1.0 if sharded else float("inf"), baseline=lambda: 0.0)
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        worker.process_scan(f"bench-{key}", key, memory=memory)
+        return _mib(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="1000,5000,20000")
+    ap.add_argument("--user-data-kb", default="0,16", help="min,max user_data KiB per instance")
+    ap.add_argument("--seed", type=int, default=9)
+    args = ap.parse_args(argv)
+
+    _, worker = load_handlers("memory")
+    from lib.aws_clients import client
+    s3 = client("s3")
+    user_data = tuple(int(x) for x in args.user_data_kb.split(","))
+
+    for n in (int(x) for x in args.sizes.split(",")):
+        buf = io.StringIO()
+        write_plan(buf, PlanProfile(resources=n, seed=args.seed, user_data_kb=user_data))
+        data = buf.getvalue().encode("utf-8")
+        del buf
+        key = f"iac-scans/bench-{n}.json"
+        s3.put_object(Bucket=worker.S3_BUCKET, Key=key, Body=data)
+
+        print(f"\n{n} resources, plan {_mib(len(data))} MiB")
+        print(f"{'stage':>14} {'peak MiB':>10} {'retained MiB':>13}")
+        stages = stage_profile(data)
+        for name, peak, retained in stages:
+            print(f"{name:>14} {peak:>10.2f} {retained:>13.2f}")
+        full = scan_peak(worker, s3, key, sharded=False)
+        sharded = scan_peak(worker, s3, key, sharded=True)
+        plan_mib = len(data) / MIB
+        print(f"{'process_scan':>14} in memory {full:.2f} MiB ({full / plan_mib:.1f}x plan), "
+              f"sharded {sharded:.2f} MiB ({sharded / plan_mib:.1f}x plan)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks of the worker's hot paths, with a stored baseline.
+
+Times, per resource and at several plan sizes: the worker's JSON decode of
+the plan, parse_iac_plan, build_context, correlate_threats, escalate_risk,
+calculate_risk, build_explanation, and the JSON encode of the results. Plans
+come from plan_generator and findings are seeded, so every run measures the
+same work.
+
+Timings are divided by a fixed pure-Python calibration loop timed in the same
+round, so a baseline recorded on one machine can be checked on another. Each
+case reports the median of several rounds (one noisy round moves nothing).
+--check exits with status 1 when a case is slower than its baseline by more
+than the tolerance (baseline "tolerance", per-case "tolerances", or
+--tolerance) AND by at least "min_slowdown_us" per resource (in baseline
+machine microseconds): the sub-microsecond cases swing by a third on a busy
+machine without any code change.
+
+Usage:
+    python benchmarks/bench_pipeline.py                       # print timings
+    python benchmarks/bench_pipeline.py --check               # compare with benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --update-baseline     # record a new baseline
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "lambdas")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from lib.parser import parse_iac_plan  # noqa: E402
+from lib.resource_context import build_context  # noqa: E402
+from lib.correlation_engine import correlate_threats, escalate_risk  # noqa: E402
+from lib.risk_scoring import calculate_risk, calculate_risk_score  # noqa: E402
+from lib.explanation_builder import build_explanation  # noqa: E402
+from benchmarks.plan_generator import PlanProfile, generate_plan  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+BASELINE_VERSION = 2
+DEFAULT_SIZES = (100, 1000, 5000)
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_MIN_SLOWDOWN_US = 0.25
+DEFAULT_ROUNDS = 5
+CASES = ("json_decode", "parse", "context", "correlate", "escalate", "risk", "explain", "json_encode")
+FEEDS = ("abuseipdb", "greynoise", "shodan", "otx")
+LEVELS = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+
+
+def synthetic_findings(resources, seed=5):
+    """0-6 feed findings per resource."""
+    rng = random.Random(seed)
+    out = []
+    for res in resources:
+        findings = []
+        for _ in range(rng.choice((0, 0, 1, 2, 3, 6))):
+            feed = rng.choice(FEEDS)
+            findings.append({"feed": feed, "ip": f"45.33.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                             "risk": rng.choice(LEVELS), "evidence": f"{feed} score={rng.randint(0, 100)}"})
+        out.append(findings)
+    return out
+
+
+def calibrate(loops=200000):
+    """Seconds for a fixed dict/str/arithmetic loop: the machine speed unit."""
+    best = float("inf")
+    for _ in range(5):
+        t0 = time.perf_counter()
+        d = {}
+        for i in range(loops):
+            d[i & 1023] = d.get(i & 1023, 0) + len(str(i))
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def timed(fn, repeat=5, min_time=0.05):
+    """
+    Best seconds per call of fn() over `repeat` rounds of at least min_time each.
+    The garbage collector is paused while timing, as timeit does.
+    """
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _best(fn, repeat, min_time)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _best(fn, repeat, min_time):
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - t0 >= min_time:
+            break
+        loops *= 2
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / loops)
+    return best
+
+
+def size_cases(n, seed=3):
+    """(resource count, {case: fn}) for a generated plan of n resources."""
+    text = json.dumps(generate_plan(PlanProfile(resources=n, seed=seed, user_data_kb=(0, 4))))
+    plan = json.loads(text)
+    parsed = parse_iac_plan(plan)
+    contexts = [build_context(r) for r in parsed]
+    all_findings = synthetic_findings(parsed)
+    correlated = [correlate_threats(r, f, ctx=c) for r, f, c in zip(parsed, all_findings, contexts)]
+    pairs = [(f["risk"], c.exposure_factor - 1) for fs, c in zip(all_findings, contexts) for f in fs]
+    results = [build_explanation(r, cf, *calculate_risk_score(cf), ctx=c)
+               for r, cf, c in zip(parsed, correlated, contexts)]
+
+    cases = {
+        "json_decode": lambda: json.loads(text),
+        "parse": lambda: parse_iac_plan(plan),
+        "context": lambda: [build_context(r) for r in parsed],
+        "correlate": lambda: [correlate_threats(r, f, ctx=c) for r, f, c in zip(parsed, all_findings, contexts)],
+        "escalate": lambda: [escalate_risk(lvl, factor=x) for lvl, x in pairs],
+        "risk": lambda: [calculate_risk(cf) for cf in correlated],
+        "explain": lambda: [build_explanation(r, cf, "LOW", 0.0, ctx=c)
+                            for r, cf, c in zip(parsed, correlated, contexts)],
+        "json_encode": lambda: json.dumps(results),
+    }
+    return len(parsed), cases
+
+
+def bench_size(n, repeat=5, seed=3):
+    """{case: seconds per resource} for a generated plan of n resources."""
+    count, cases = size_cases(n, seed)
+    return {case: timed(cases[case], repeat) / count for case in CASES}
+
+
+def run(sizes=DEFAULT_SIZES, repeat=5, rounds=DEFAULT_ROUNDS):
+    """
+    {"calibration_s": ..., "results": {"case@size": {"us_per_resource", "normalized"}}}
+    Each round times every case once, normalized by its own calibration; a case
+    reports its median round.
+    """
+    fixtures = {n: size_cases(n) for n in sizes}
+    units, samples = [], {}
+    for _ in range(rounds):
+        unit = calibrate()
+        units.append(unit)
+        for n, (count, cases) in fixtures.items():
+            for case in CASES:
+                seconds = timed(cases[case], repeat) / count
+                samples.setdefault(f"{case}@{n}", []).append((seconds, seconds / unit))
+    results = {key: {"us_per_resource": round(statistics.median(s for s, _ in values) * 1e6, 4),
+                     "normalized": round(statistics.median(x for _, x in values) * 1e6, 4)}
+               for key, values in samples.items()}
+    return {"version": BASELINE_VERSION, "python": platform.python_version(), "rounds": rounds,
+            "calibration_s": round(statistics.median(units), 6), "results": results}
+
+
+def compare(current, baseline, tolerance=None, min_slowdown_us=None):
+    """
+    Returns [(key, ratio, allowed)] for every case slower than its baseline by more than the
+    tolerance and by at least min_slowdown_us per resource (converted to the baseline machine
+    with its calibration; not applied when the baseline has none).
+    ratio is current / baseline normalized time; cases missing from either side are skipped.
+    """
+    default = baseline.get("tolerance", DEFAULT_TOLERANCE) if tolerance is None else tolerance
+    per_case = baseline.get("tolerances", {})
+    if min_slowdown_us is None:
+        min_slowdown_us = baseline.get("min_slowdown_us", DEFAULT_MIN_SLOWDOWN_US)
+    unit = baseline.get("calibration_s")
+    regressions = []
+    for key, base in baseline.get("results", {}).items():
+        cur = current["results"].get(key)
+        if cur is None or not base.get("normalized"):
+            continue
+        allowed = per_case.get(key.split("@")[0], default)
+        ratio = cur["normalized"] / base["normalized"]
+        if unit and (cur["normalized"] - base["normalized"]) * unit < min_slowdown_us:
+            continue
+        if ratio > 1 + allowed:
+            regressions.append((key, round(ratio, 3), allowed))
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES))
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--check", action="store_true", help="exit 1 on a regression beyond the tolerance")
+    ap.add_argument("--tolerance", type=float, default=None, help="override the baseline's default tolerance")
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help="rounds per case, the median is kept")
+    ap.add_argument("--min-slowdown-us", type=float, default=None,
+                    help="override the baseline's minimum slowdown per resource (baseline machine us)")
+    ap.add_argument("--confirm", type=int, default=2,
+                    help="reruns of the sizes with a regression before --check fails")
+    args = ap.parse_args(argv)
+
+    current = run([int(n) for n in args.sizes.split(",")], args.repeat, args.rounds)
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+
+    print(f"{'case':>20} {'us/resource':>12} {'normalized':>11} {'vs baseline':>12}")
+    for key, cur in current["results"].items():
+        base = (baseline or {}).get("results", {}).get(key)
+        delta = f"{cur['normalized'] / base['normalized']:.2f}x" if base and base.get("normalized") else "-"
+        print(f"{key:>20} {cur['us_per_resource']:>12.2f} {cur['normalized']:>11.2f} {delta:>12}")
+
+    if args.update_baseline:
+        if baseline:
+            # keep the agreed tolerances
+            current["tolerance"] = baseline.get("tolerance", DEFAULT_TOLERANCE)
+            current["tolerances"] = baseline.get("tolerances", {})
+            current["min_slowdown_us"] = baseline.get("min_slowdown_us", DEFAULT_MIN_SLOWDOWN_US)
+        else:
+            current["tolerance"], current["tolerances"] = DEFAULT_TOLERANCE, {}
+            current["min_slowdown_us"] = DEFAULT_MIN_SLOWDOWN_US
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(current, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if args.check:
+        if baseline is None:
+            print(f"no baseline at {args.baseline} (run with --update-baseline)", file=sys.stderr)
+            return 1
+        regressions = compare(current, baseline, args.tolerance, args.min_slowdown_us)
+        for _ in range(args.confirm):
+            if not regressions:
+                break
+            # a slow outlier on a busy machine is not a regression: rerun before failing
+            sizes = sorted({int(key.split("@")[1]) for key, _, _ in regressions})
+            rerun = run(sizes, args.repeat, args.rounds)
+            for key, cur in rerun["results"].items():
+                if cur["normalized"] < current["results"][key]["normalized"]:
+                    current["results"][key] = cur
+            regressions = compare(current, baseline, args.tolerance, args.min_slowdown_us)
+        for key, ratio, allowed in regressions:
+            print(f"REGRESSION {key}: {ratio:.2f}x baseline (allowed {1 + allowed:.2f}x)", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Rule-evaluation cost vs. rule count.
+
+Generates N synthetic rules spread over many resource types (plus a few
+type-agnostic ones), compiles them once, and times build_context() over a
+mixed batch of resources. Because rules are indexed by resource type, the
+per-resource cost should track the rules of *its* type, not N.
+
+Usage: python benchmarks/bench_rules.py [--resources 2000] [--counts 10,100,1000,5000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "lambdas")))
+
+from lib.rule_engine import RuleSet, DEFAULT_RULES_PATH  # noqa: E402
+from lib.resource_context import build_context  # noqa: E402
+
+RESOURCE_TYPES = [f"aws_type_{i}" for i in range(200)]
+
+
+def synthetic_spec(rule_count, seed=7):
+    """Default rules plus rule_count keyword rules spread over RESOURCE_TYPES."""
+    rng = random.Random(seed)
+    with open(DEFAULT_RULES_PATH, encoding="utf-8") as fh:
+        spec = json.load(fh)
+    for i in range(rule_count):
+        spec["rules"].append({
+            "id": f"org-rule-{i}",
+            "flag": "sensitive",
+            "types": [rng.choice(RESOURCE_TYPES)],
+            "when": {"attr": "tags", "op": "contains", "value": [f"org-keyword-{i}"], "ignore_case": True}
+        })
+    return spec
+
+
+def synthetic_resources(n, seed=11):
+    rng = random.Random(seed)
+    return [{
+        "type": rng.choice(RESOURCE_TYPES),
+        "attributes": {"tags": {"team": f"team-{i % 17}", "env": "dev"}, "name": f"res-{i}", "port": 8080}
+    } for i in range(n)]
+
+
+def bench(rule_count, resources, repeat=3):
+    t0 = time.perf_counter()
+    ruleset = RuleSet(synthetic_spec(rule_count))
+    compile_ms = (time.perf_counter() - t0) * 1000
+
+    evaluated = sum(len(ruleset.rules_for(r["type"])) for r in resources) / len(resources)
+
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for r in resources:
+            build_context(r, ruleset)
+        best = min(best, time.perf_counter() - t0)
+    return compile_ms, evaluated, best / len(resources) * 1e6
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--resources", type=int, default=2000)
+    ap.add_argument("--counts", default="10,100,1000,5000")
+    args = ap.parse_args(argv)
+
+    resources = synthetic_resources(args.resources)
+    print(f"{'rules':>8} {'compile ms':>12} {'rules/resource':>15} {'us/resource':>12}")
+    for count in (int(c) for c in args.counts.split(",")):
+        compile_ms, evaluated, per_resource_us = bench(count, resources)
+        print(f"{count:>8} {compile_ms:>12.2f} {evaluated:>15.1f} {per_resource_us:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the four threat feeds (AbuseIPDB, GreyNoise, Shodan, OTX).
+
+Serves the endpoints the adapters call, with response bodies shaped like the
+real APIs, under one path prefix per feed:
+
+    /abuseipdb/check, /abuseipdb/check-block
+    /greynoise/v3/community/<ip>, /greynoise/v2/noise/multi/quick
+    /shodan/shodan/host/<ip>[,<ip>...]
+    /otx/indicators/<section>/<indicator>/general
+    /_stats                       (request / injected-error counters per feed)
+
+Each feed has its own profile: a latency distribution, 429, 5xx and 400
+injection rates, the Retry-After sent with them, an optional requests-per-second limit
+(answered with 429 once exceeded), the padding added to each payload, and the
+share of indicators reported as malicious. Verdicts depend only on the
+indicator and the seed, so repeated runs see the same data.
+
+Point the adapters at it with the *_BASE_URL variables (any API key works):
+
+    python benchmarks/feed_emulator.py --port 8099 \\
+        --profile shodan:latency=lognormal:80:0.6,error_429=0.05,retry_after=1 \\
+        --profile otx:latency=uniform:20:200,error_5xx=0.02,payload_kb=32
+    export SHODAN_BASE_URL=http://127.0.0.1:8099/shodan SHODAN_API_KEY=local ...
+
+From Python / pytest:
+    with FeedEmulator({"otx": FeedProfile(error_429=1.0)}) as emu:
+        os.environ.update(emu.environ())
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+FEEDS = ("abuseipdb", "greynoise", "shodan", "otx")
+# feed -> (base URL variable, API key variable) read by lambdas/lib/adapters
+FEED_ENV = {
+    "abuseipdb": ("ABUSEIPDB_BASE_URL", "ABUSEIPDB_API_KEY"),
+    "greynoise": ("GREYNOISE_BASE_URL", "GREYNOISE_API_KEY"),
+    "shodan": ("SHODAN_BASE_URL", "SHODAN_API_KEY"),
+    "otx": ("OTX_BASE_URL", "OTX_API_KEY"),
+}
+
+
+@dataclass
+class FeedProfile:
+    latency: str = "fixed:0"        # fixed:MS | uniform:LO:HI | lognormal:MEDIAN_MS:SIGMA
+    error_429: float = 0.0          # share of requests answered 429
+    error_5xx: float = 0.0          # share of requests answered 500/502/503
+    error_400: float = 0.0          # share of requests answered 400 (not retried by the adapters)
+    retry_after: str = None         # Retry-After value sent with 429/503 (None = no header)
+    rate_limit: float = None        # requests per second before 429s (None = unlimited)
+    payload_kb: int = 0             # padding added to each response body
+    bad_ratio: float = 0.2          # share of indicators reported as malicious
+
+
+def parse_profile(text, base=None):
+    """
+    "shodan:latency=uniform:20:80,error_429=0.1" -> ("shodan", FeedProfile).
+    A feed of "*" applies to every feed.
+    """
+    feed, _, options = text.partition(":")
+    profile = FeedProfile(**vars(base)) if base else FeedProfile()
+    types = {f.name: f.type for f in fields(FeedProfile)}
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        if key not in types:
+            raise ValueError(f"Unknown profile option: {key}")
+        if types[key] is float or types[key] is int:
+            value = types[key](value)
+        setattr(profile, key, value)
+    return feed, profile
+
+
+def sample_latency(spec, rng):
+    """Seconds to wait before answering, drawn from the latency spec."""
+    kind, _, args = spec.partition(":")
+    params = [float(a) for a in args.split(":") if a]
+    if kind == "fixed":
+        ms = params[0] if params else 0.0
+    elif kind == "uniform":
+        ms = rng.uniform(params[0], params[1])
+    elif kind == "lognormal":
+        # median in ms and the sigma of the underlying normal: a long right tail
+        ms = params[0] * rng.lognormvariate(0.0, params[1])
+    else:
+        raise ValueError(f"Unknown latency distribution: {spec}")
+    return max(ms, 0.0) / 1000.0
+
+
+class FeedState:
+    """Per-feed profile, RNG and counters; shared by the server threads."""
+
+    def __init__(self, feed, profile, seed):
+        self.feed = feed
+        self.profile = profile
+        self.seed = seed
+        self.rng = random.Random(f"{seed}:{feed}")
+        self.lock = threading.Lock()
+        self.window = (0, 0)        # (second, requests in that second) for rate_limit
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0, "indicators": 0}
+
+    def score(self, indicator):
+        """Deterministic 0..1 score of an indicator; below bad_ratio means malicious."""
+        digest = hashlib.sha256(f"{self.seed}:{self.feed}:{indicator}".encode()).digest()
+        return int.from_bytes(digest[:4], "big") / 2 ** 32
+
+    def admit(self):
+        """
+        Returns (delay seconds, injected status or None) for one request.
+        """
+        p = self.profile
+        with self.lock:
+            self.stats["requests"] += 1
+            delay = sample_latency(p.latency, self.rng)
+            if p.rate_limit:
+                now = int(time.monotonic())
+                second, count = self.window
+                count = count + 1 if second == now else 1
+                self.window = (now, count)
+                if count > p.rate_limit:
+                    self.stats["throttled"] += 1
+                    return delay, 429
+            roll = self.rng.random()
+            if roll < p.error_429:
+                self.stats["throttled"] += 1
+                return delay, 429
+            if roll < p.error_429 + p.error_5xx:
+                self.stats["errors"] += 1
+                return delay, self.rng.choice((500, 502, 503))
+            if roll < p.error_429 + p.error_5xx + p.error_400:
+                self.stats["errors"] += 1
+                return delay, 400
+        return delay, None
+
+    def padding(self, n):
+        """n filler strings totalling about payload_kb KiB."""
+        size = self.profile.payload_kb * 1024
+        if not size or not n:
+            return []
+        chunk = "x" * max(1, size // n)
+        return [chunk] * n
+
+
+# ==============================
+#   Response bodies
+# ==============================
+
+def abuseipdb_check(state, ip):
+    score = state.score(ip)
+    abuse = int(75 + score * 100) if score < state.profile.bad_ratio else int(score * 30)
+    pad = state.padding(1)
+    return {"data": {
+        "ipAddress": ip, "isPublic": True, "ipVersion": 6 if ":" in ip else 4, "isWhitelisted": False,
+        "abuseConfidenceScore": min(abuse, 100), "countryCode": "US", "usageType": "Data Center/Web Hosting/Transit",
+        "isp": "Example Hosting", "domain": "example.net", "hostnames": [], "isTor": False,
+        "totalReports": abuse, "numDistinctUsers": abuse // 3, "lastReportedAt": "2024-05-01T12:00:00+00:00",
+        **({"reports": [{"comment": c} for c in pad]} if pad else {})
+    }}
+
+
+def abuseipdb_check_block(state, network):
+    reported = []
+    for n in range(8):
+        ip = network.split("/")[0].rsplit(".", 1)[0] + f".{n * 16 + 1}" if "." in network else f"{network}:{n}"
+        score = state.score(ip)
+        if score < state.profile.bad_ratio:
+            reported.append({"ipAddress": ip, "numReports": 3 + n, "mostRecentReport": "2024-05-01T12:00:00+00:00",
+                             "abuseConfidenceScore": int(75 + score * 100) % 101, "countryCode": "US"})
+    return {"data": {"networkAddress": network.split("/")[0], "netmask": network.partition("/")[2] or "32",
+                     "numPossibleHosts": 256, "addressSpaceDesc": "Internet", "reportedAddress": reported,
+                     **({"notes": state.padding(1)} if state.profile.payload_kb else {})}}
+
+
+def greynoise_community(state, ip):
+    noise = state.score(ip) < state.profile.bad_ratio
+    return {"ip": ip, "noise": noise, "riot": False, "classification": "malicious" if noise else "unknown",
+            "name": "unknown", "link": f"https://viz.greynoise.io/ip/{ip}", "last_seen": "2024-05-01",
+            "message": "Success", **({"tags": state.padding(1)} if state.profile.payload_kb else {})}
+
+
+def greynoise_multi(state, ips):
+    pad = state.padding(len(ips))
+    return [{"ip": ip, "noise": state.score(ip) < state.profile.bad_ratio, "riot": False, "code": "0x01",
+             **({"metadata": pad[i]} if pad else {})} for i, ip in enumerate(ips)]
+
+
+def shodan_host(state, ip, pad=""):
+    bad = state.score(ip) < state.profile.bad_ratio
+    banners = [{"port": 80, "transport": "tcp", "product": "Apache httpd" if bad else "nginx",
+                "data": "HTTP/1.1 200 OK\r\nServer: Apache\r\n" + pad}]
+    host = {"ip_str": ip, "ports": [80, 443], "org": "Example Hosting", "isp": "Example Hosting",
+            "os": None, "hostnames": [], "country_code": "US", "last_update": "2024-05-01T12:00:00", "data": banners}
+    if bad:
+        host["vulns"] = [f"CVE-2021-{41773 + n}" for n in range(1 + int(state.score(ip + "#") * 6))]
+    return host
+
+
+def otx_general(state, section, indicator):
+    bad = state.score(indicator) < state.profile.bad_ratio
+    pulses = [{"id": f"{n:024x}", "name": f"Campaign {n}", "tags": ["malware"], "description": d}
+              for n, d in enumerate(state.padding(4 if bad else 1))]
+    return {"indicator": indicator, "type": section, "type_title": section,
+            "sections": ["general", "geo", "reputation", "url_list", "passive_dns"],
+            "reputation": {"malicious": True, "threat_score": 7} if bad else 0,
+            "pulse_info": {"count": len(pulses), "pulses": pulses}, "base_indicator": {"indicator": indicator}}
+
+
+# ==============================
+#   HTTP server
+# ==============================
+
+class EmulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"       # keep-alive, like the real APIs
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        parts = [unquote(p) for p in url.path.strip("/").split("/")]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"null") if length else None
+
+        if parts == ["_stats"]:
+            return self._send(200, {feed: dict(s.stats) for feed, s in self.server.feeds.items()})
+        state = self.server.feeds.get(parts[0])
+        if state is None:
+            return self._send(404, {"error": "unknown feed"})
+
+        delay, injected = state.admit()
+        if delay:
+            time.sleep(delay)
+        if injected:
+            retry_after = state.profile.retry_after
+            headers = {"Retry-After": retry_after} if retry_after is not None and injected in (429, 503) else None
+            return self._send(injected, {"error": f"injected {injected}"}, headers)
+
+        route = parts[1:]
+        body = None
+        if parts[0] == "abuseipdb" and method == "GET":
+            if route == ["check"] and "ipAddress" in query:
+                body = abuseipdb_check(state, query["ipAddress"])
+            elif route == ["check-block"] and "network" in query:
+                body = abuseipdb_check_block(state, query["network"])
+        elif parts[0] == "greynoise":
+            if route[:2] == ["v3", "community"] and len(route) == 3 and method == "GET":
+                body = greynoise_community(state, route[2])
+            elif route == ["v2", "noise", "multi", "quick"] and method == "POST":
+                body = greynoise_multi(state, (payload or {}).get("ips", []))
+        elif parts[0] == "shodan" and route[:2] == ["shodan", "host"] and len(route) == 3 and method == "GET":
+            hosts = route[2].split(",")
+            pad = state.padding(len(hosts))
+            found = [shodan_host(state, h, pad[i] if pad else "") for i, h in enumerate(hosts)]
+            body = found if len(hosts) > 1 else found[0]
+        elif parts[0] == "otx" and len(route) == 4 and route[0] == "indicators" and route[3] == "general":
+            body = otx_general(state, route[1], route[2])
+
+        if body is None:
+            return self._send(404, {"error": "not found"})
+        with state.lock:
+            state.stats["indicators"] += len(body) if isinstance(body, list) else 1
+        self._send(200, body)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+
+class FeedEmulator:
+    """
+    The emulator on a background thread. port=0 picks a free port.
+    profiles maps feed (or "*" for all) -> FeedProfile.
+    """
+
+    def __init__(self, profiles=None, host="127.0.0.1", port=0, seed=42):
+        profiles = dict(profiles or {})
+        default = profiles.pop("*", FeedProfile())
+        self.server = ThreadingHTTPServer((host, port), EmulatorHandler)
+        self.server.daemon_threads = True
+        self.server.feeds = {feed: FeedState(feed, profiles.get(feed, default), seed) for feed in FEEDS}
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def base_urls(self):
+        return {feed: f"{self.url}/{feed}" for feed in FEEDS}
+
+    def environ(self, api_key="local"):
+        """Variables that point every adapter at the emulator."""
+        env = {}
+        for feed, (url_var, key_var) in FEED_ENV.items():
+            env[url_var] = f"{self.url}/{feed}"
+            env[key_var] = api_key
+        return env
+
+    def stats(self):
+        return {feed: dict(s.stats) for feed, s in self.server.feeds.items()}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--profile", action="append", default=[],
+                    help="FEED:option=value,... (FEED may be '*'); repeatable")
+    args = ap.parse_args(argv)
+
+    profiles = {}
+    for text in args.profile:
+        feed, profile = parse_profile(text, profiles.get("*"))
+        if feed != "*" and feed not in FEEDS:
+            ap.error(f"unknown feed: {feed}")
+        profiles[feed] = profile
+
+    emu = FeedEmulator(profiles, host=args.host, port=args.port, seed=args.seed)
+    for var, value in emu.environ().items():
+        print(f"export {var}={value}", file=sys.stderr)
+    try:
+        emu.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emu.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
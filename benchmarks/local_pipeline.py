@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+End-to-end submitter -> SQS -> worker harness on one machine.
+
+Wires submitter_lambda and worker_lambda to in-memory S3, DynamoDB and SQS
+stand-ins through lib.aws_clients (or, with --backend boto3, to whatever
+boto3 resolves: a LocalStack endpoint via AWS_ENDPOINT_URL, or a real
+account). N plans are submitted concurrently through the submitter handler
+while worker threads long-poll the queue and invoke the worker handler with
+SQS-shaped batches, as the event source mapping does.
+
+Reported: throughput, and p50/p90/p99/max of submit latency, queue wait
+(send -> receive), worker processing time, end-to-end latency
+(submit -> scan completed) and each worker stage (lib/metrics.py spans).
+
+Usage:
+    python benchmarks/local_pipeline.py --scans 200 --concurrency 16 --workers 4 --resources 300
+    python benchmarks/local_pipeline.py --emulate-feeds "*:latency=lognormal:40:0.5"
+    python benchmarks/local_pipeline.py --emulate-feeds "*:bad_ratio=0.3" --cassette feeds.cassette --record
+    python benchmarks/local_pipeline.py --cassette feeds.cassette --scans 500     # replayed, no network
+From Python / pytest:
+    report = run_pipeline(scans=10, resources=50)
+"""
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "lambdas")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from botocore.exceptions import ClientError  # noqa: E402
+
+from benchmarks.plan_generator import PlanProfile, generate_plan  # noqa: E402
+
+LOCAL_ENV = {"TABLE_NAME": "ta-iac-scans", "S3_BUCKET": "ta-iac-plans", "QUEUE_URL": "local://ta-iac-queue",
+             "AWS_DEFAULT_REGION": "us-east-1"}
+
+
+def _client_error(code, op):
+    return ClientError({"Error": {"Code": code, "Message": code}}, op)
+
+
+# ==============================
+#   In-memory stand-ins
+# ==============================
+
+class MemoryS3:
+
+    def __init__(self):
+        self.objects = {}
+        self.lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        data = Body.encode("utf-8") if isinstance(Body, str) else bytes(Body)
+        with self.lock:
+            self.objects[(Bucket, Key)] = data
+        return {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        with self.lock:
+            data = self.objects.get((Bucket, Key))
+        if data is None:
+            raise _client_error("NoSuchKey", "GetObject")
+        return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+
+class MemoryDynamoDB:
+    """put_item / get_item / update_item ("SET a = :x, #b = :y REMOVE c", optional "#s = :v" condition) on typed items."""
+
+    def __init__(self):
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(Key):
+        return tuple(sorted((k, json.dumps(v, sort_keys=True)) for k, v in Key.items()))
+
+    def put_item(self, TableName, Item, **kwargs):
+        key_name = next(iter(Item))
+        with self.lock:
+            self.tables.setdefault(TableName, {})[self._key({key_name: Item[key_name]})] = dict(Item)
+        return {}
+
+    def get_item(self, TableName, Key, **kwargs):
+        with self.lock:
+            item = self.tables.get(TableName, {}).get(self._key(Key))
+        return {"Item": dict(item)} if item is not None else {}
+
+    def update_item(self, TableName, Key, UpdateExpression, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ConditionExpression=None, **kwargs):
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        clauses = re.split(r"\b(SET|REMOVE)\b", UpdateExpression.strip(), flags=re.IGNORECASE)
+        if clauses[0].strip() or len(clauses) < 3:
+            raise _client_error("ValidationException", "UpdateItem")
+        with self.lock:
+            table = self.tables.setdefault(TableName, {})
+            item = table.get(self._key(Key), dict(Key))
+            if ConditionExpression:
+                attr, _, placeholder = (p.strip() for p in ConditionExpression.partition("="))
+                if item.get(names.get(attr, attr)) != values[placeholder]:
+                    raise _client_error("ConditionalCheckFailedException", "UpdateItem")
+            for action, body in zip(clauses[1::2], clauses[2::2]):
+                for part in body.split(","):
+                    if action.upper() == "SET":
+                        attr, _, placeholder = (p.strip() for p in part.partition("="))
+                        item[names.get(attr, attr)] = values[placeholder]
+                    else:
+                        item.pop(names.get(part.strip(), part.strip()), None)
+            table[self._key(Key)] = item
+        return {}
+
+
+class MemorySQS:
+    """Standard queue: send_message, receive_message (long poll, batches of up to 10), delete_message."""
+
+    def __init__(self):
+        self.queues = {}
+        self.inflight = {}
+        self.cond = threading.Condition()
+        self._ids = 0
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        with self.cond:
+            self._ids += 1
+            msg_id = f"m-{self._ids}"
+            self.queues.setdefault(QueueUrl, deque()).append((msg_id, MessageBody, int(time.time() * 1000)))
+            self.cond.notify()
+        return {"MessageId": msg_id}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, **kwargs):
+        deadline = time.monotonic() + WaitTimeSeconds
+        with self.cond:
+            queue = self.queues.setdefault(QueueUrl, deque())
+            while not queue and time.monotonic() < deadline:
+                self.cond.wait(deadline - time.monotonic())
+            messages = []
+            while queue and len(messages) < min(MaxNumberOfMessages, 10):
+                msg_id, body, sent = queue.popleft()
+                self.inflight[msg_id] = (QueueUrl, msg_id, body, sent)
+                messages.append({"MessageId": msg_id, "ReceiptHandle": msg_id, "Body": body,
+                                 "Attributes": {"SentTimestamp": str(sent)}})
+        return {"Messages": messages} if messages else {}
+
+    def delete_message(self, QueueUrl, ReceiptHandle, **kwargs):
+        with self.cond:
+            self.inflight.pop(ReceiptHandle, None)
+        return {}
+
+
+def memory_factory():
+    """client factory over one shared set of stand-ins."""
+    services = {"s3": MemoryS3(), "dynamodb": MemoryDynamoDB(), "sqs": MemorySQS()}
+    return lambda service: services[service]
+
+
+# ==============================
+#   Harness
+# ==============================
+
+def percentiles(values, points=(50, 90, 99)):
+    """Nearest-rank percentiles in ms, plus max."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    out = {f"p{p}": round(ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))] * 1000, 2)
+           for p in points}
+    out["max"] = round(ordered[-1] * 1000, 2)
+    return out
+
+
+def load_handlers(backend="memory", environ=None):
+    """
+    Imports both handlers with the harness environment and client factory.
+    The handlers read their environment when first imported, so this runs before any import of them.
+    """
+    for k, v in LOCAL_ENV.items():
+        os.environ.setdefault(k, v)
+    os.environ.update(environ or {})
+    from lib import aws_clients
+    aws_clients.set_client_factory(memory_factory() if backend == "memory" else None)
+    import submitter_lambda
+    import worker_lambda
+    return submitter_lambda, worker_lambda
+
+
+def run_pipeline(scans=20, concurrency=8, workers=2, batch=1, resources=100, seed=1, backend="memory",
+                 environ=None, poll_seconds=1):
+    """Submits `scans` plans and waits until every one has been processed; returns the report."""
+    submitter, worker = load_handlers(backend, environ)
+    from lib.aws_clients import client
+    from lib.metrics import MemoryExporter, set_exporter
+    exporter = set_exporter(MemoryExporter())   # the worker's EMF lines, one per scan
+    sqs = client("sqs")
+    queue_url = submitter.QUEUE_URL
+
+    plans = [json.dumps(generate_plan(PlanProfile(resources=resources, seed=seed + i))) for i in range(scans)]
+    submitted, completed, submit_lat, queue_wait, processing, failed = {}, [], [], [], [], []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def submit(body):
+        t0 = time.monotonic()
+        resp = submitter.handler({"httpMethod": "POST", "body": body}, None)
+        t1 = time.monotonic()
+        scan_id = json.loads(resp["body"]).get("scan_id")
+        with lock:
+            submit_lat.append(t1 - t0)
+            if scan_id:
+                submitted[scan_id] = t0
+            else:
+                failed.append(resp)
+
+    def consume():
+        while not done.is_set():
+            resp = sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=batch,
+                                       WaitTimeSeconds=poll_seconds, AttributeNames=["SentTimestamp"])
+            messages = resp.get("Messages", [])
+            if not messages:
+                continue
+            received = time.time()
+            t0 = time.monotonic()
+            worker.handler({"Records": [{"messageId": m["MessageId"], "body": m["Body"]} for m in messages]}, None)
+            t1 = time.monotonic()
+            for m in messages:
+                sqs.delete_message(QueueUrl=queue_url, ReceiptHandle=m["ReceiptHandle"])
+            with lock:
+                processing.append(t1 - t0)
+                for m in messages:
+                    queue_wait.append(max(0.0, received - int(m["Attributes"]["SentTimestamp"]) / 1000.0))
+                    completed.append((json.loads(m["Body"]).get("scan_id"), t1))
+                if len(completed) + len(failed) >= scans:
+                    done.set()
+
+    consumers = [threading.Thread(target=consume, daemon=True) for _ in range(workers)]
+    for t in consumers:
+        t.start()
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(submit, plans))
+    if len(failed) >= scans:
+        done.set()
+    done.wait()
+    elapsed = time.monotonic() - start
+    for t in consumers:
+        t.join()
+    set_exporter(None)
+    # a scan can finish before its submit call returns; end-to-end is measured from the call's start
+    e2e = [t - submitted[scan_id] for scan_id, t in completed if scan_id in submitted]
+
+    table = worker.TABLE_NAME
+    statuses = {}
+    ddb = client("dynamodb")
+    for scan_id in submitted:
+        item = ddb.get_item(TableName=table, Key={"scan_id": {"S": scan_id}}).get("Item", {})
+        status = item.get("status", {}).get("S", "MISSING")
+        statuses[status] = statuses.get(status, 0) + 1
+
+    return {
+        "scans": scans, "resources_per_scan": resources, "concurrency": concurrency, "workers": workers,
+        "batch": batch, "backend": backend, "elapsed_s": round(elapsed, 3),
+        "throughput_scans_per_s": round(len(e2e) / elapsed, 2) if elapsed else None,
+        "submit_failures": len(failed), "statuses": statuses,
+        "submit_ms": percentiles(submit_lat), "queue_wait_ms": percentiles(queue_wait),
+        "processing_ms": percentiles(processing), "end_to_end_ms": percentiles(e2e),
+        "stage_ms": stage_percentiles(exporter.records),
+    }
+
+
+def stage_percentiles(records):
+    """Per-stage percentiles over the worker's EMF records (scan_ms, parse_ms, feed.shodan_ms, ...)."""
+    stages = {}
+    for rec in records:
+        for name, value in rec.items():
+            if name.endswith("_ms"):
+                stages.setdefault(name[:-3], []).append(value / 1000.0)
+    return {name: percentiles(values) for name, values in sorted(stages.items())}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scans", type=int, default=50)
+    ap.add_argument("--concurrency", type=int, default=8, help="concurrent submitter invocations")
+    ap.add_argument("--workers", type=int, default=2, help="concurrent worker invocations")
+    ap.add_argument("--batch", type=int, default=1, help="SQS batch size per worker invocation")
+    ap.add_argument("--resources", type=int, default=100, help="resources per generated plan")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--backend", choices=["memory", "boto3"], default="memory")
+    ap.add_argument("--emulate-feeds", metavar="PROFILE", default=None,
+                    help="run benchmarks/feed_emulator.py in-process with this profile (e.g. '*:latency=fixed:30')")
+    ap.add_argument("--cassette", metavar="PATH", default=None,
+                    help="replay feed responses from this cassette (lib/adapters/cassette.py)")
+    ap.add_argument("--record", action="store_true", help="record feed responses into --cassette instead")
+    args = ap.parse_args(argv)
+
+    environ, emulator = {}, None
+    if args.emulate_feeds is not None:
+        from benchmarks.feed_emulator import FeedEmulator, parse_profile
+        feed, profile = parse_profile(args.emulate_feeds)
+        emulator = FeedEmulator({feed: profile}).start()
+        environ = emulator.environ()
+    cassette = None
+    if args.cassette:
+        from benchmarks.feed_emulator import FEED_ENV
+        from lib.adapters.cassette import use_cassette
+        cassette = use_cassette(args.cassette, "record" if args.record else "replay")
+        if not args.record:
+            # replay needs no host and no real key: emulator-shaped URLs on an unused address
+            for feed, (url_var, key_var) in FEED_ENV.items():
+                environ.setdefault(url_var, f"http://127.0.0.1:9/{feed}")
+                environ.setdefault(key_var, "replay")
+    try:
+        report = run_pipeline(args.scans, args.concurrency, args.workers, args.batch, args.resources,
+                              args.seed, args.backend, environ)
+        if emulator:
+            report["feeds"] = emulator.stats()
+        if cassette:
+            report["cassette"] = cassette.stats()
+    finally:
+        if emulator:
+            emulator.stop()
+        if cassette:
+            cassette.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Seeded synthetic Terraform plan generator for scale benchmarks.
+
+Emits `terraform show -json` shaped plans with a realistic mix of resource
+types (instances, security groups and rules, buckets, databases, load
+balancers, Route53 records, Lambda functions, subnets, EIPs), resources
+nested in (count-indexed) modules, a share of no-op changes, IPs drawn from
+a small shared pool (the same IP on many resources) or unique per resource,
+security groups with many ingress rules, and large user_data scripts.
+
+The same profile and seed always give the same plan. Resources are produced
+one at a time, so plans can be streamed to disk at any size.
+
+Usage:
+    python benchmarks/plan_generator.py --resources 100000 --out plan-100k.json
+    python benchmarks/plan_generator.py --target-mb 2048 --out plan-2g.json
+From Python / pytest:
+    from benchmarks.plan_generator import PlanProfile, generate_plan
+    plan = generate_plan(PlanProfile(resources=10000, seed=1))
+"""
+import argparse
+import json
+import random
+import sys
+from dataclasses import dataclass
+
+# resource type -> relative frequency
+TYPE_MIX = (
+    ("aws_instance", 30),
+    ("aws_security_group", 12),
+    ("aws_security_group_rule", 10),
+    ("aws_s3_bucket", 12),
+    ("aws_db_instance", 6),
+    ("aws_lb", 4),
+    ("aws_route53_record", 10),
+    ("aws_lambda_function", 8),
+    ("aws_subnet", 5),
+    ("aws_eip", 3),
+)
+# first octets of globally routable space (keeps generated IPs out of private ranges)
+PUBLIC_OCTETS = (3, 13, 18, 23, 34, 45, 52, 54, 66, 81, 91, 104, 142, 151, 185, 199, 212)
+SENSITIVE_PORTS = (22, 80, 443, 3306, 3389, 5432, 6379)
+ENVS = ("dev", "staging", "prod")
+
+
+@dataclass
+class PlanProfile:
+    resources: int = 1000          # None = unbounded (use with write_plan(target_bytes=...))
+    seed: int = 42
+    noop_ratio: float = 0.3         # share of resources whose change is a no-op
+    module_ratio: float = 0.4       # share of resources inside modules
+    max_module_depth: int = 3
+    shared_ip_ratio: float = 0.6    # share of IP attributes drawn from the shared pool
+    ip_pool: int = 500              # size of the shared IP pool
+    sg_rules: tuple = (1, 40)       # ingress rules per security group (min, max)
+    user_data_kb: tuple = (0, 64)   # user_data size per instance in KiB (min, max)
+
+
+class PlanGenerator:
+
+    def __init__(self, profile):
+        self.p = profile
+        self.rng = random.Random(profile.seed)
+        self.types = [t for t, _ in TYPE_MIX]
+        self.weights = [w for _, w in TYPE_MIX]
+        self.pool = [self._unique_ip() for _ in range(max(1, profile.ip_pool))]
+        self.sg_ids = []
+        self.subnet_ids = []
+
+    # ---- value helpers ----
+    def _unique_ip(self):
+        r = self.rng
+        return f"{r.choice(PUBLIC_OCTETS)}.{r.randint(0, 255)}.{r.randint(0, 255)}.{r.randint(1, 254)}"
+
+    def _ip(self):
+        if self.rng.random() < self.p.shared_ip_ratio:
+            # skewed: a few pool IPs appear on very many resources
+            return self.pool[int(len(self.pool) * self.rng.random() ** 3)]
+        return self._unique_ip()
+
+    def _cidr(self):
+        r = self.rng.random()
+        if r < 0.25:
+            return "0.0.0.0/0"
+        if r < 0.6:
+            return f"10.{self.rng.randint(0, 255)}.0.0/16"
+        return f"{self._ip()}/32"
+
+    def _tags(self, i):
+        return {"Name": f"res-{i}", "env": self.rng.choice(ENVS), "team": f"team-{i % 23}"}
+
+    def _user_data(self):
+        lo, hi = self.p.user_data_kb
+        size = self.rng.randint(lo, hi) * 1024
+        lines = ["#!/bin/bash", "set -euo pipefail", f"curl -s http://{self._ip()}/bootstrap.sh | bash"]
+        filler = "echo 'configuring node' >> /var/log/bootstrap.log\n"
+        body = "\n".join(lines) + "\n"
+        return body + filler * max(0, (size - len(body)) // len(filler))
+
+    def _address(self, rtype, i):
+        name = f"r{i}"
+        if self.rng.random() < self.p.module_ratio:
+            depth = self.rng.randint(1, self.p.max_module_depth)
+            mods = []
+            for _ in range(depth):
+                mod = f"module.m{self.rng.randint(0, 20)}"
+                if self.rng.random() < 0.3:
+                    mod += f"[{self.rng.randint(0, 3)}]"
+                mods.append(mod)
+            return ".".join(mods) + f".{rtype}.{name}", name
+        if self.rng.random() < 0.2:
+            return f"{rtype}.{name}[{self.rng.randint(0, 5)}]", name
+        return f"{rtype}.{name}", name
+
+    # ---- per-type attributes ----
+    def _attributes(self, rtype, i):
+        r = self.rng
+        if rtype == "aws_instance":
+            attrs = {"ami": f"ami-{i:08x}", "instance_type": r.choice(["t3.micro", "m5.large", "c5.xlarge"]),
+                     "associate_public_ip_address": r.random() < 0.4, "tags": self._tags(i),
+                     "user_data": self._user_data()}
+            if attrs["associate_public_ip_address"]:
+                attrs["public_ip"] = self._ip()
+            if self.sg_ids:
+                attrs["vpc_security_group_ids"] = r.sample(self.sg_ids, min(len(self.sg_ids), r.randint(1, 3)))
+            if self.subnet_ids:
+                attrs["subnet_id"] = r.choice(self.subnet_ids)
+            return attrs
+        if rtype == "aws_security_group":
+            sg_id = f"sg-{i:012x}"
+            self.sg_ids.append(sg_id)
+            lo, hi = self.p.sg_rules
+            ingress = []
+            for _ in range(r.randint(lo, hi)):
+                port = r.choice(SENSITIVE_PORTS + (8080, 9000))
+                wide = r.random() < 0.1
+                ingress.append({"from_port": 0 if wide else port, "to_port": 65535 if wide else port,
+                                "protocol": "-1" if wide else "tcp", "cidr_blocks": [self._cidr()]})
+            return {"id": sg_id, "name": f"sg-{i}", "ingress": ingress, "tags": self._tags(i)}
+        if rtype == "aws_security_group_rule":
+            port = r.choice(SENSITIVE_PORTS)
+            return {"type": r.choice(["ingress", "egress"]), "from_port": port, "to_port": port + r.choice([0, 0, 100]),
+                    "protocol": "tcp", "cidr_blocks": [self._cidr()],
+                    "security_group_id": r.choice(self.sg_ids) if self.sg_ids else None}
+        if rtype == "aws_s3_bucket":
+            return {"bucket": f"bucket-{i}", "acl": r.choice(["private", "private", "public-read"]),
+                    "tags": self._tags(i)}
+        if rtype == "aws_db_instance":
+            return {"name": r.choice(["orders-db", "analytics", "backup-store"]), "engine": "postgres",
+                    "port": 5432, "publicly_accessible": r.random() < 0.1,
+                    "endpoint": f"{self._ip()}:5432", "tags": self._tags(i)}
+        if rtype == "aws_lb":
+            return {"name": f"lb-{i}", "internal": r.random() < 0.5, "load_balancer_type": "application",
+                    "dns_name": f"lb-{i}.elb.amazonaws.com"}
+        if rtype == "aws_route53_record":
+            return {"name": f"svc{i}.corp-{i % 7}.io", "type": "A", "ttl": 300,
+                    "records": [self._ip() for _ in range(r.randint(1, 4))]}
+        if rtype == "aws_lambda_function":
+            return {"function_name": f"fn-{i}", "runtime": "python3.11",
+                    "environment": [{"variables": {"UPSTREAM": f"https://{self._ip()}/api",
+                                                   "CALLBACK_HOST": f"hooks-{i % 50}.partner-{i % 9}.net"}}]}
+        if rtype == "aws_subnet":
+            subnet_id = f"subnet-{i:012x}"
+            self.subnet_ids.append(subnet_id)
+            return {"id": subnet_id, "cidr_block": f"10.{i % 256}.{(i // 256) % 256}.0/24",
+                    "map_public_ip_on_launch": r.random() < 0.3}
+        # aws_eip
+        return {"public_ip": self._ip(), "domain": "vpc"}
+
+    def resource_change(self, i):
+        rtype = self.rng.choices(self.types, self.weights)[0]
+        address, name = self._address(rtype, i)
+        after = self._attributes(rtype, i)
+        if self.rng.random() < self.p.noop_ratio:
+            actions, before = ["no-op"], after
+        else:
+            actions = self.rng.choice([["create"], ["create"], ["update"], ["delete", "create"]])
+            before = None if actions == ["create"] else dict(after, tags={"stale": "true"})
+        return {"address": address, "type": rtype, "name": name, "mode": "managed",
+                "provider_name": "registry.terraform.io/hashicorp/aws",
+                "change": {"actions": actions, "before": before, "after": after}}
+
+    def __iter__(self):
+        i = 0
+        while self.p.resources is None or i < self.p.resources:
+            yield self.resource_change(i)
+            i += 1
+
+
+def generate_plan(profile=None):
+    """The whole plan as a dict (for tests and in-memory benchmarks)."""
+    profile = profile or PlanProfile()
+    return {"format_version": "1.2", "terraform_version": "1.6.0",
+            "resource_changes": list(PlanGenerator(profile))}
+
+
+def write_plan(fh, profile=None, target_bytes=None):
+    """
+    Streams a plan as JSON to a text file object, one resource at a time.
+    Stops after profile.resources resources or once target_bytes have been written.
+    Returns (resources, bytes written).
+    """
+    profile = profile or PlanProfile()
+    written = fh.write('{"format_version": "1.2", "terraform_version": "1.6.0", "resource_changes": [')
+    count = 0
+    for rc in PlanGenerator(profile):
+        if target_bytes is not None and written >= target_bytes:
+            break
+        written += fh.write(("," if count else "") + "\n" + json.dumps(rc, separators=(",", ":")))
+        count += 1
+    written += fh.write("\n]}\n")
+    return count, written
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--resources", type=int, default=1000)
+    ap.add_argument("--target-mb", type=float, default=None, help="write until the plan reaches this size")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--noop-ratio", type=float, default=0.3)
+    ap.add_argument("--module-ratio", type=float, default=0.4)
+    ap.add_argument("--shared-ip-ratio", type=float, default=0.6)
+    ap.add_argument("--ip-pool", type=int, default=500)
+    ap.add_argument("--sg-rules", default="1,40", help="min,max ingress rules per security group")
+    ap.add_argument("--user-data-kb", default="0,64", help="min,max user_data KiB per instance")
+    ap.add_argument("--out", default="-", help="output path ('-' = stdout)")
+    args = ap.parse_args(argv)
+
+    profile = PlanProfile(
+        resources=None if args.target_mb else args.resources, seed=args.seed, noop_ratio=args.noop_ratio,
+        module_ratio=args.module_ratio, shared_ip_ratio=args.shared_ip_ratio, ip_pool=args.ip_pool,
+        sg_rules=tuple(int(x) for x in args.sg_rules.split(",")),
+        user_data_kb=tuple(int(x) for x in args.user_data_kb.split(",")))
+    target = int(args.target_mb * 1024 * 1024) if args.target_mb else None
+
+    if args.out == "-":
+        count, size = write_plan(sys.stdout, profile, target)
+    else:
+        with open(args.out, "w", encoding="utf-8", buffering=1 << 20) as fh:
+            count, size = write_plan(fh, profile, target)
+    print(f"{count} resources, {size / 1024 / 1024:.1f} MiB", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,9 @@ API_URL = os.environ.get("TA_IAC_API_URL")
 POLL_INTERVAL = int(os.environ.get("TA_IAC_POLL_INTERVAL", "10"))
 MAX_WAIT = int(os.environ.get("TA_IAC_MAX_WAIT", "300"))
 BLOCK_SEVERITY = os.environ.get("TA_IAC_BLOCK_SEVERITY", "HIGH").upper()
+# profile this scan on the worker (cProfile/tracemalloc artifacts next to the plan in S3);
+# honoured only by deployments with PROFILE_ALLOW_REQUESTS set
+PROFILE = os.environ.get("TA_IAC_PROFILE", "").lower() in ("1", "true", "yes")
 
 SEVERITY_ORDER = {"LOW": 1, "MEDIUM": 2, "HIGH": 3, "CRITICAL": 4}
 
@@ -54,7 +57,8 @@ def submit_plan(plan_path="plan.json"):
         plan = json.load(f)
 
     try:
-        resp = requests.post(f"{API_URL}/scans", json=plan, timeout=30)
+        params = {"profile": "true"} if PROFILE else None
+        resp = requests.post(f"{API_URL}/scans", json=plan, params=params, timeout=30)
         resp.raise_for_status()
     except requests.RequestException as e:
         print(f"❌ Failed to submit plan: {e}")
@@ -76,7 +80,8 @@ def poll(scan_id):
 
     while True:
         try:
-            resp = requests.get(f"{API_URL}/scans/{scan_id}", timeout=20)
+            # render=true: the API stores reason codes and renders the report text on request
+            resp = requests.get(f"{API_URL}/scans/{scan_id}", params={"render": "true"}, timeout=20)
             resp.raise_for_status()
         except requests.RequestException as e:
             print(f"⚠️  Polling failed: {e}")
@@ -96,10 +101,36 @@ def poll(scan_id):
         time.sleep(POLL_INTERVAL)
 
 
+def load_field(data, key, default):
+    """Scan record fields may arrive JSON-encoded (DynamoDB strings)."""
+    value = data.get(key, default)
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return default
+    return value
+
+
 def summarize_results(data):
     """Print and summarize findings from scan."""
     print("\n🧩 === Scan Summary ===")
-    results = data.get("results_json", [])
+    summary = load_field(data, "summary_json", None)
+
+    if summary:
+        # Aggregates computed by the worker while scoring: no pass over the results
+        for sev in ("CRITICAL", "HIGH", "MEDIUM", "LOW"):
+            print(f" {color(sev, sev):<20} {summary['histogram'].get(sev, 0)}")
+        if summary.get("top"):
+            print("\nTop resources:")
+            for r in summary["top"]:
+                sev = r["risk_score"]
+                print(f" - {r['resource_id']:<50} [{color(sev, sev)}] {r['risk_value']}")
+        worst = summary.get("worst", "LOW")
+        print(f"\nOverall Severity: {color(worst, worst)} (max score {summary.get('max_value')})")
+        return worst
+
+    results = load_field(data, "results_json", [])
     worst = "LOW"
 
     if not results:
@@ -125,10 +156,10 @@ def generate_report(data, path="scan_report.md"):
         f.write(f"**Status:** `{data.get('status')}`\n\n")
         f.write("## Findings\n\n")
 
-        for r in data.get("results_json", []):
+        for r in load_field(data, "results_json", []):
             f.write(f"### {r.get('resource_id', 'unknown')}\n")
             f.write(f"- **Type:** `{r.get('resource_type', 'unknown')}`\n")
-            f.write(f"- **Risk:** **{r.get('risk_score', 'N/A')}**\n")
+            f.write(f"- **Risk:** **{r.get('risk_score', 'N/A')}** ({r.get('risk_value', 'n/a')})\n")
             f.write(f"- **Details:** {r.get('details', '')}\n")
             if r.get("findings"):
                 f.write(f"- **Threat Feeds:**\n")
@@ -83,7 +83,11 @@ class TAIaCStack(Stack):
             environment={
                 "QUEUE_URL": queue.queue_url,
                 "TABLE_NAME": table.table_name,
-                "S3_BUCKET": bucket.bucket_name
+                "S3_BUCKET": bucket.bucket_name,
+                # e.g. "DEBUG=0,INFO=0.1": share of lines kept per level (WARNING and above always are)
+                "LOG_SAMPLE_RATES": os.getenv("LOG_SAMPLE_RATES", ""),
+                # "true" lets POST /scans?profile=true request profiling (the API has no authorizer)
+                "PROFILE_ALLOW_REQUESTS": os.getenv("PROFILE_ALLOW_REQUESTS", "")
             }
         )
 
@@ -101,13 +105,20 @@ class TAIaCStack(Stack):
                 "OTX_API_KEY": os.getenv("OTX_API_KEY", ""),
                 "SHODAN_API_KEY": os.getenv("SHODAN_API_KEY", ""),
                 "ABUSEIPDB_API_KEY": os.getenv("ABUSEIPDB_API_KEY", ""),
-                "GREYNOISE_API_KEY": os.getenv("GREYNOISE_API_KEY", "")
+                "GREYNOISE_API_KEY": os.getenv("GREYNOISE_API_KEY", ""),
+                # "early_exit" skips feed lookups that cannot change a resource's label
+                "LOOKUP_MODE": os.getenv("LOOKUP_MODE", "full"),
+                # share of scans run under cProfile/tracemalloc, artifacts in iac-scans/<scan_id>.profile.*
+                "PROFILE_SAMPLE_RATE": os.getenv("PROFILE_SAMPLE_RATE", "0"),
+                "PROFILE_ALLOW_REQUESTS": os.getenv("PROFILE_ALLOW_REQUESTS", ""),
+                "LOG_SAMPLE_RATES": os.getenv("LOG_SAMPLE_RATES", "")
             }
         )
 
         # ========== PERMISSIONS ==========
         bucket.grant_put(submitter)
-        bucket.grant_read(worker)
+        # the worker also writes each scan's raw findings (iac-scans/<scan_id>.raw.json) for rescoring
+        bucket.grant_read_write(worker)
         queue.grant_send_messages(submitter)
         queue.grant_consume_messages(worker)
         table.grant_read_write_data(submitter)
@@ -140,6 +151,10 @@ class TAIaCStack(Stack):
         scan_id = scans.add_resource("{scan_id}")
         scan_id.add_method("GET", apigw.LambdaIntegration(submitter))
 
+        # Rescore stored findings with the current weights (no feed calls)
+        rescore = api.root.add_resource("rescore")
+        rescore.add_method("POST", apigw.LambdaIntegration(submitter))
+
         # ========== LOGGING ==========
         logs.LogGroup(
             self, "SubmitterLogGroup",
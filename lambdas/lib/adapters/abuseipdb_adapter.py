@@ -1,27 +1,75 @@
-import requests, os, time
-BASE = 'https://api.abuseipdb.com/api/v2/check'
+import os
+from .transport import Transport, FeedDegraded, degraded_finding, failed_status, pipelined
+# API root; ABUSEIPDB_BASE_URL points the adapter at a stand-in (benchmarks/feed_emulator.py)
+API_ROOT = os.environ.get('ABUSEIPDB_BASE_URL', 'https://api.abuseipdb.com/api/v2').rstrip('/')
+BASE = f'{API_ROOT}/check'
+BLOCK_BASE = f'{API_ROOT}/check-block'
 class AbuseIPDBAdapter:
-    def __init__(self, api_key=None, timeout=5):
+    FEED = 'abuseipdb'
+    INDICATOR_KEY = 'ip'
+    INDICATOR_TYPES = ('ipv4', 'ipv6', 'cidr')
+    def __init__(self, api_key=None, timeout=5, base_url=None):
         self.api_key = api_key
+        root = base_url.rstrip('/') if base_url else API_ROOT
+        self.base, self.block_base = f'{root}/check', f'{root}/check-block'
         self.timeout = timeout
-    def lookup_ip(self, ip):
+        self.transport = Transport('abuseipdb', timeout=timeout)
+    @staticmethod
+    def _risk(abuse_score):
+        if abuse_score >= 75: return 'HIGH'
+        if abuse_score >= 30: return 'MEDIUM'
+        return 'LOW'
+    def lookup_ip(self, ip, budget=None):
         findings = []
         if not ip:
             return findings
         try:
             if not self.api_key:
-                findings.append({'feed':'abuseipdb','ip':ip,'risk':'LOW','evidence':'no-api-key (dev)'})
                 return findings
             headers = {'Key': self.api_key, 'Accept': 'application/json'}
             params = {'ipAddress': ip, 'maxAgeInDays': 90}
-            resp = requests.get(BASE, headers=headers, params=params, timeout=self.timeout)
+            resp = self.transport.get(self.base, budget=budget, headers=headers, params=params)
             if resp.status_code == 200:
                 data = resp.json()
                 abuse_score = data.get('data', {}).get('abuseConfidenceScore', 0)
-                risk = 'LOW'
-                if abuse_score >= 75: risk = 'HIGH'
-                elif abuse_score >= 30: risk = 'MEDIUM'
+                risk = self._risk(abuse_score)
                 findings.append({'feed':'abuseipdb','ip':ip,'risk':risk,'evidence':f'abuse_score={abuse_score}'})
-        except Exception:
-            pass
+            elif failed_status(resp):
+                findings.append(degraded_finding('abuseipdb', 'ip', ip, failed_status(resp)))
+        except FeedDegraded as e:
+            findings.append(degraded_finding('abuseipdb', 'ip', ip, e.reason))
+        except Exception as e:
+            # e.g. an unreadable body or a cassette miss: unchecked, not clean
+            findings.append(degraded_finding('abuseipdb', 'ip', ip, type(e).__name__))
         return findings
+    def check_block(self, network, budget=None):
+        """One check-block call covers every reported address inside a CIDR."""
+        findings = []
+        if not network:
+            return findings
+        try:
+            if not self.api_key:
+                return findings
+            headers = {'Key': self.api_key, 'Accept': 'application/json'}
+            params = {'network': network, 'maxAgeInDays': 90}
+            resp = self.transport.get(self.block_base, budget=budget, headers=headers, params=params)
+            if resp.status_code == 200:
+                reported = resp.json().get('data', {}).get('reportedAddress', [])
+                if reported:
+                    abuse_score = max(r.get('abuseConfidenceScore', 0) for r in reported)
+                    findings.append({'feed':'abuseipdb','ip':network,'risk':self._risk(abuse_score),
+                                     'evidence':f'abuse_score={abuse_score} reported={len(reported)}'})
+            elif failed_status(resp):
+                findings.append(degraded_finding('abuseipdb', 'ip', network, failed_status(resp)))
+        except FeedDegraded as e:
+            findings.append(degraded_finding('abuseipdb', 'ip', network, e.reason))
+        except Exception as e:
+            findings.append(degraded_finding('abuseipdb', 'ip', network, type(e).__name__))
+        return findings
+    def lookup_many(self, indicators, budget=None):
+        # no multi-IP endpoint: CIDRs go through check-block, single IPs are pipelined
+        indicators = [i for i in indicators if i]
+        blocks = [i for i in indicators if '/' in i]
+        ips = [i for i in indicators if '/' not in i]
+        return (pipelined(lambda ip: self.lookup_ip(ip, budget=budget), ips) +
+                pipelined(lambda net: self.check_block(net, budget=budget), blocks))
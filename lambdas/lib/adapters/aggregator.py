@@ -1,43 +1,170 @@
 # Aggregates multiple adapters and normalizes results
-from .otx_adapter import OTXAdapter
-from .shodan_adapter import ShodanAdapter
-from .abuseipdb_adapter import AbuseIPDBAdapter
-from .greynoise_adapter import GreyNoiseAdapter
-import os
+from .registry import FEEDS, resolve_feeds, load_adapter, indicator_source
+from .transport import chunks, degraded_finding
+from .singleflight import SingleFlight
+from ..metrics import span
+from ..correlation_engine import correlate_threats
+from ..resource_context import build_context
+from ..indicator_scanner import scan_resource
+from ..lookup_planner import (
+    plan_feed_order, correlated_level_range, label_is_final, LOOKUP_MODE, MODE_EARLY_EXIT
+)
+from concurrent.futures import ThreadPoolExecutor
+import os, threading
+
+# indicators handed to one adapter.lookup_many() call
+BATCH_SIZE = int(os.environ.get('FEED_BATCH_SIZE', '100'))
 
 class ThreatAggregator:
-    def __init__(self, cache_table=None):
+    def __init__(self, cache_table=None, environ=None):
         self.cache_table = cache_table
-        self.otx = OTXAdapter(os.environ.get('OTX_API_KEY'))
-        self.shodan = ShodanAdapter(os.environ.get('SHODAN_API_KEY'))
-        self.abuse = AbuseIPDBAdapter(os.environ.get('ABUSEIPDB_API_KEY'))
-        self.greynoise = GreyNoiseAdapter(os.environ.get('GREYNOISE_API_KEY'))
-
-    def check_resource(self, resource):
-        attrs = resource.get('attributes', {})
-        findings = []
-        # extract candidate IPs/hosts/ports from common attributes
-        ips = []
-        if 'associate_public_ip_address' in attrs and attrs.get('associate_public_ip_address') is True:
-            if attrs.get('public_ip'): ips.append(attrs.get('public_ip'))
-        if 'cidr_block' in attrs:
-            ips.append(attrs.get('cidr_block'))
-        if 'endpoint' in attrs:
-            ips.append(attrs.get('endpoint'))
-        # dedupe
-        ips = [i for i in set(ips) if i]
-        for ip in ips:
-            # query adapters - adapters should handle normalization/caching
-            try:
-                findings += self.abuse.lookup_ip(ip)
-                findings += self.greynoise.lookup_ip(ip)
-                findings += self.shodan.lookup_host(ip)
-            except Exception:
-                # adapters should use safe timeouts; we continue gracefully
-                continue
-        # OTX may return indicators by domain or IP from resource metadata
+        # only feeds with an API key are imported and queried; the rest are reported per scan
+        enabled, self.skipped_feeds = resolve_feeds(environ)
+        self.adapters = {feed: load_adapter(feed, key) for feed, key in enabled.items()}
+        # shared by every thread using this aggregator (resources, scans in one SQS batch)
+        self.flights = SingleFlight()
+        self._stats_lock = threading.Lock()
+        # resource/feed/indicator lookups the early-exit planner proved unnecessary
+        self.planner_skipped = 0
+
+    @staticmethod
+    def ip_indicators(resource, types=None):
+        # IPs / CIDRs / hostnames anywhere in the resource's allowlisted attributes
+        return scan_resource(resource).select(types)
+
+    def _lookup(self, adapter, indicators, budget=None, metrics=None):
+        """
+        Runs adapter.lookup_many over the indicators in batches; findings keyed by indicator.
+        Indicators already being fetched by another thread are not requested again:
+        this call waits for that thread's result instead.
+        """
+        by_indicator = {}
+        leading, waiting = [], []
+        for i in indicators:
+            fut, is_leader = self.flights.claim((adapter.FEED, i))
+            (leading if is_leader else waiting).append((i, fut))
+
         try:
-            findings += self.otx.search_for_resource(resource)
-        except Exception:
-            pass
-        return findings
+            for batch in chunks([i for i, _ in leading], BATCH_SIZE):
+                found_by = {i: [] for i in batch}
+                try:
+                    with span(metrics, f'feed.{adapter.FEED}'):
+                        batch_findings = adapter.lookup_many(batch, budget=budget)
+                    for f in batch_findings:
+                        found_by.setdefault(f.get(adapter.INDICATOR_KEY), []).append(f)
+                except Exception as e:
+                    # the batch was not checked: degraded markers, never an empty (clean) answer
+                    found_by = {i: [degraded_finding(adapter.FEED, adapter.INDICATOR_KEY, i, type(e).__name__)]
+                                for i in batch}
+                for i in batch:
+                    self.flights.resolve((adapter.FEED, i), found_by[i])
+                by_indicator.update(found_by)
+        finally:
+            # never leave waiters blocked on a key this call claimed
+            for i, _ in leading:
+                self.flights.resolve((adapter.FEED, i), by_indicator.get(i, []))
+
+        for i, fut in waiting:
+            by_indicator[i] = fut.result()
+        return {i: found for i, found in by_indicator.items() if found}
+
+    def _feed_table(self, resources):
+        """feed -> (adapter, per-resource indicator lists) for the enabled feeds, in result order."""
+        scans = None
+        table = {}
+        for feed, adapter in self.adapters.items():
+            if indicator_source(feed) == 'ips':
+                if scans is None:
+                    scans = [scan_resource(r) for r in resources]
+                # each feed only gets the indicator types it can look up
+                types = getattr(adapter, 'INDICATOR_TYPES', None)
+                table[feed] = (adapter, [s.select(types) for s in scans])
+            else:
+                # OTX may return indicators by domain or IP from resource metadata
+                table[feed] = (adapter, [adapter.candidates(r) for r in resources])
+        return table
+
+    def _lookup_all(self, feeds, budget=None, metrics=None):
+        """Full-evidence mode: every feed gets every distinct indicator, feeds in parallel."""
+        if not feeds:
+            return {}
+        jobs = [(adapter, list(dict.fromkeys(i for lst in lists for i in lst if i)))
+                for adapter, lists in feeds.values()]
+        with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+            found = pool.map(lambda job: self._lookup(job[0], job[1], budget, metrics), jobs)
+            return dict(zip(feeds, found))
+
+    def _lookup_planned(self, resources, feeds, budget=None, contexts=None, metrics=None):
+        """
+        Early-exit mode: feeds are queried one at a time in plan_feed_order();
+        a resource drops out once the remaining feeds can no longer change its label.
+        """
+        order = plan_feed_order(feeds)
+        if contexts is None:
+            contexts = [build_context(r) for r in resources]
+        level_ranges = [correlated_level_range(ctx) if ctx is not None else None for ctx in contexts]
+        open_idx = list(range(len(resources)))
+        found = {feed: {} for feed in feeds}
+        skipped = 0
+
+        for pos, feed in enumerate(order):
+            adapter, lists = feeds[feed]
+            wanted = list(dict.fromkeys(i for idx in open_idx for i in lists[idx] if i))
+            found[feed] = self._lookup(adapter, wanted, budget, metrics)
+
+            remaining = order[pos + 1:]
+            still_open = []
+            for idx in open_idx:
+                if contexts[idx] is None:
+                    # no usable context: query every feed for this resource
+                    still_open.append(idx)
+                    continue
+                so_far = [f for done in order[:pos + 1] for i in feeds[done][1][idx]
+                          for f in found[done].get(i, []) if not f.get('degraded')]
+                pending = {f: len(feeds[f][1][idx]) for f in remaining}
+                correlated = correlate_threats(resources[idx], so_far, ctx=contexts[idx])
+                if label_is_final(correlated, pending, level_ranges[idx]):
+                    skipped += sum(pending.values())
+                else:
+                    still_open.append(idx)
+            open_idx = still_open
+
+        with self._stats_lock:
+            self.planner_skipped += skipped
+        return found
+
+    def check_resources(self, resources, budget=None, mode=None, contexts=None, metrics=None):
+        """
+        Looks up the indicators of many resources at once: each distinct indicator
+        is sent to each feed once, in batches, and the findings are mapped back.
+        mode is "full" (default, every feed) or "early_exit" (see lib.lookup_planner);
+        contexts are the resources' precomputed ResourceContexts, reused by the planner;
+        metrics is the scan's ScanMetrics, which gets a feed.<name> span per adapter batch.
+        Returns one findings list per resource, in input order.
+        """
+        feeds = self._feed_table(resources)
+        if (mode or LOOKUP_MODE) == MODE_EARLY_EXIT:
+            found = self._lookup_planned(resources, feeds, budget, contexts, metrics)
+        else:
+            found = self._lookup_all(feeds, budget, metrics)
+
+        ordered = [feed for feed in FEEDS if feed in feeds]
+        results = []
+        for idx in range(len(resources)):
+            findings = []
+            for feed in ordered:
+                for indicator in feeds[feed][1][idx]:
+                    findings += found[feed].get(indicator, [])
+            results.append(findings)
+        return results
+
+    def check_resource(self, resource, budget=None):
+        """
+        Queries every feed for the resource's indicators.
+        budget is the scan's RetryBudget; degraded feeds come back as marker findings.
+        """
+        return self.check_resources([resource], budget=budget)[0]
+
+    def stats(self):
+        """Network calls made, lookups coalesced onto an in-flight call, lookups skipped by the planner."""
+        return dict(self.flights.stats(), planner_skipped=self.planner_skipped)
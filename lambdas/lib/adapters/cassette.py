@@ -0,0 +1,233 @@
+# ==============================
+#   Feed response cassettes (record / replay)
+# ==============================
+# Set FEED_CASSETTE to a file path to route every adapter request through a
+# cassette instead of (replay) or in addition to (record) the network:
+#   FEED_CASSETTE_MODE=record  real responses are appended to the file
+#   FEED_CASSETTE_MODE=replay  responses are served from the file (default)
+# Requests are matched on feed, method, URL path, query params and JSON body;
+# the host is left out so a recording from benchmarks/feed_emulator.py replays
+# whatever port the emulator had.
+# Headers and credential query params (Shodan's ?key=) are not part of the
+# key, so API keys never reach the file and a cassette replays with any (or a
+# dummy) key. A request recorded several times
+# (a 429 then a 200) replays in the recorded order, the last answer repeating.
+#
+# File layout: MAGIC, then one record per response:
+#   <16-byte key digest><status u16><flags u8><headers len u32><body len u32>
+#   <headers JSON><body, zlib-compressed when flags & 1>
+# Replay memory-maps the file and indexes record offsets by digest once;
+# bodies are only read and decompressed when their request comes up.
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from urllib.parse import urlsplit
+
+MAGIC = b'FCASSET1'
+_RECORD = struct.Struct('<16sHBII')
+_ZLIB = 1
+COMPRESS_MIN_BYTES = 256
+# response headers worth keeping: the transport reads Retry-After
+KEPT_HEADERS = ('content-type', 'retry-after')
+SECRET_PARAMS = frozenset(('key', 'api_key', 'apikey', 'token'))
+
+CASSETTE_PATH = os.environ.get('FEED_CASSETTE')
+CASSETTE_MODE = os.environ.get('FEED_CASSETTE_MODE', 'replay')
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode for a request the cassette does not contain."""
+
+
+def request_key(feed, method, url, kwargs):
+    """16-byte digest identifying a request, independent of headers and key order."""
+    params = kwargs.get('params')
+    if isinstance(params, dict):
+        params = {k: v for k, v in params.items() if k.lower() not in SECRET_PARAMS}
+    parts = [feed, method.upper(), urlsplit(url)._replace(scheme='', netloc='').geturl(),
+             json.dumps(params, sort_keys=True, default=str),
+             json.dumps(kwargs.get('json'), sort_keys=True, default=str)]
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).digest()[:16]
+
+
+class _Headers(dict):
+    """Lower-cased header names, case-insensitive get()."""
+
+    def get(self, name, default=None):
+        return super().get(name.lower(), default)
+
+
+class CassetteResponse:
+    """The parts of a requests.Response the adapters and transport use."""
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = _Headers(headers)
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class Cassette:
+    def __init__(self, path, mode='replay'):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Cassette mode must be 'record' or 'replay', got {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._fh = None
+        self._map = None
+        self._index = {}
+        self._cursor = {}
+        if mode == 'record':
+            self._fh = open(path, 'ab')
+            if self._fh.tell() == 0:
+                self._fh.write(MAGIC)
+        else:
+            self._load_index()
+
+    # ---- replay ----
+    def _load_index(self):
+        with open(self.path, 'rb') as fh:
+            if os.fstat(fh.fileno()).st_size <= len(MAGIC):
+                return
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{self.path} is not a feed cassette')
+        pos, size = len(MAGIC), len(self._map)
+        while pos + _RECORD.size <= size:
+            digest, _, _, hlen, blen = _RECORD.unpack_from(self._map, pos)
+            end = pos + _RECORD.size + hlen + blen
+            if end > size:
+                break   # truncated by an interrupted recording
+            self._index.setdefault(digest, []).append(pos)
+            pos = end
+
+    def __len__(self):
+        return sum(len(offsets) for offsets in self._index.values())
+
+    def _read(self, pos):
+        _, status, flags, hlen, blen = _RECORD.unpack_from(self._map, pos)
+        start = pos + _RECORD.size
+        headers = json.loads(self._map[start:start + hlen])
+        body = self._map[start + hlen:start + hlen + blen]
+        if flags & _ZLIB:
+            body = zlib.decompress(body)
+        return CassetteResponse(status, headers, body)
+
+    def replay(self, key):
+        """Next recorded response for key, or None."""
+        with self._lock:
+            offsets = self._index.get(key)
+            if not offsets:
+                self.misses += 1
+                return None
+            n = self._cursor.get(key, 0)
+            self._cursor[key] = n + 1
+            self.hits += 1
+        return self._read(offsets[min(n, len(offsets) - 1)])
+
+    # ---- record ----
+    def record(self, key, resp):
+        headers = {k.lower(): v for k, v in resp.headers.items() if k.lower() in KEPT_HEADERS}
+        raw_headers = json.dumps(headers, separators=(',', ':')).encode('utf-8')
+        body, flags = resp.content or b'', 0
+        if len(body) >= COMPRESS_MIN_BYTES:
+            packed = zlib.compress(body, 6)
+            if len(packed) < len(body):
+                body, flags = packed, _ZLIB
+        record = _RECORD.pack(key, resp.status_code, flags, len(raw_headers), len(body)) + raw_headers + body
+        with self._lock:
+            self._fh.write(record)
+            self._fh.flush()
+            self.recorded += 1
+
+    def session(self, feed, make_session):
+        """Session hook for a Transport: replays, or records around make_session()."""
+        return CassetteSession(feed, self, None if self.mode == 'replay' else make_session())
+
+    def stats(self):
+        return {'mode': self.mode, 'hits': self.hits, 'misses': self.misses, 'recorded': self.recorded}
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CassetteSession:
+    """Stands in for a requests.Session inside Transport."""
+
+    def __init__(self, feed, cassette, session=None):
+        self.feed = feed
+        self.cassette = cassette
+        self.session = session
+
+    def request(self, method, url, **kwargs):
+        key = request_key(self.feed, method, url, kwargs)
+        if self.session is None:
+            resp = self.cassette.replay(key)
+            if resp is None:
+                raise CassetteMiss(f'{self.feed} {method} {url} not in {self.cassette.path}')
+            return resp
+        resp = self.session.request(method, url, **kwargs)
+        self.cassette.record(key, resp)
+        return resp
+
+
+_active = None
+_configured = False
+_active_lock = threading.Lock()
+
+
+def active_cassette():
+    """The cassette transports should use: set by use_cassette(), else FEED_CASSETTE, else None."""
+    global _active, _configured
+    if not _configured:
+        with _active_lock:
+            if not _configured:
+                if CASSETTE_PATH:
+                    _active = Cassette(CASSETTE_PATH, CASSETTE_MODE)
+                _configured = True
+    return _active
+
+
+def use_cassette(path=None, mode='replay'):
+    """
+    Routes transports created from now on through a cassette at path (None: the network).
+    Returns the new cassette; the previous one is closed.
+    """
+    global _active, _configured
+    with _active_lock:
+        if _active is not None:
+            _active.close()
+        _active = Cassette(path, mode) if path else None
+        _configured = True
+        return _active
@@ -1,24 +1,72 @@
-import requests, os, time
-BASE = 'https://api.greynoise.io/v3/community'
+import os
+from .transport import Transport, FeedDegraded, degraded_finding, failed_status, pipelined
+API_ROOT = os.environ.get('GREYNOISE_BASE_URL', 'https://api.greynoise.io').rstrip('/')
+BASE = f'{API_ROOT}/v3/community'
+MULTI_BASE = f'{API_ROOT}/v2/noise/multi/quick'
+MULTI_BATCH_SIZE = 1000
 class GreyNoiseAdapter:
-    def __init__(self, api_key=None, timeout=5):
+    FEED = 'greynoise'
+    INDICATOR_KEY = 'ip'
+    INDICATOR_TYPES = ('ipv4',)
+    def __init__(self, api_key=None, timeout=5, base_url=None):
         self.api_key = api_key
+        root = base_url.rstrip('/') if base_url else API_ROOT
+        self.base, self.multi_base = f'{root}/v3/community', f'{root}/v2/noise/multi/quick'
         self.timeout = timeout
-    def lookup_ip(self, ip):
+        self.transport = Transport('greynoise', timeout=timeout)
+        self.multi_supported = True
+    def lookup_ip(self, ip, budget=None):
         findings = []
         if not ip:
             return findings
         try:
             if not self.api_key:
-                findings.append({'feed':'greynoise','ip':ip,'risk':'LOW','evidence':'no-api-key (dev)'})
                 return findings
-            url = f"https://api.greynoise.io/v3/community/{ip}"
+            url = f"{self.base}/{ip}"
             headers = {'Accept':'application/json','Key': self.api_key}
-            resp = requests.get(url, headers=headers, timeout=self.timeout)
+            resp = self.transport.get(url, budget=budget, headers=headers)
             if resp.status_code == 200:
                 data = resp.json()
                 if data.get('noise') is True:
                     findings.append({'feed':'greynoise','ip':ip,'risk':'MEDIUM','evidence':'noise=true'})
-        except Exception:
-            pass
+            elif failed_status(resp):
+                findings.append(degraded_finding('greynoise', 'ip', ip, failed_status(resp)))
+        except FeedDegraded as e:
+            findings.append(degraded_finding('greynoise', 'ip', ip, e.reason))
+        except Exception as e:
+            # e.g. an unreadable body or a cassette miss: unchecked, not clean
+            findings.append(degraded_finding('greynoise', 'ip', ip, type(e).__name__))
+        return findings
+    def _lookup_multi(self, ips, budget=None):
+        """Multi-IP quick check; returns None when the key's plan has no multi endpoint."""
+        findings = []
+        headers = {'Accept':'application/json','Key': self.api_key}
+        try:
+            resp = self.transport.post(self.multi_base, budget=budget, headers=headers, json={'ips': ips})
+            if resp.status_code in (401, 403, 404):
+                return None
+            if resp.status_code != 200:
+                # a failed batch must not read as a batch of clean IPs
+                return [degraded_finding('greynoise', 'ip', ip, f'http {resp.status_code}') for ip in ips]
+            for row in resp.json() or []:
+                if row.get('noise') is True:
+                    findings.append({'feed':'greynoise','ip':row.get('ip'),'risk':'MEDIUM','evidence':'noise=true'})
+        except FeedDegraded as e:
+            findings += [degraded_finding('greynoise', 'ip', ip, e.reason) for ip in ips]
+        except Exception as e:
+            findings = [degraded_finding('greynoise', 'ip', ip, type(e).__name__) for ip in ips]
+        return findings
+    def lookup_many(self, indicators, budget=None):
+        indicators = [i for i in indicators if i]
+        if not self.api_key or not self.multi_supported or len(indicators) < 2:
+            return pipelined(lambda ip: self.lookup_ip(ip, budget=budget), indicators)
+        findings = []
+        for start in range(0, len(indicators), MULTI_BATCH_SIZE):
+            batch = indicators[start:start + MULTI_BATCH_SIZE]
+            found = self._lookup_multi(batch, budget=budget)
+            if found is None:
+                # community keys have no multi endpoint: remember and fall back to per-IP lookups
+                self.multi_supported = False
+                return findings + pipelined(lambda ip: self.lookup_ip(ip, budget=budget), indicators[start:])
+            findings += found
         return findings
@@ -1,30 +1,55 @@
-import requests, os, time
-OTX_BASE = 'https://otx.alienvault.com/api/v1'
+import os
+from .transport import Transport, FeedDegraded, degraded_finding, failed_status, pipelined
+from ..indicator_scanner import scan_resource, indicator_type
+OTX_BASE = os.environ.get('OTX_BASE_URL', 'https://otx.alienvault.com/api/v1').rstrip('/')
+# indicator type -> OTX indicator section
+OTX_SECTIONS = {'ipv4': 'IPv4', 'ipv6': 'IPv6', 'fqdn': 'hostname'}
 
 class OTXAdapter:
-    def __init__(self, api_key=None, timeout=5):
+    FEED = 'otx'
+    INDICATOR_KEY = 'indicator'
+    INDICATOR_TYPES = ('ipv4', 'ipv6', 'fqdn')
+    def __init__(self, api_key=None, timeout=5, base_url=None):
         self.api_key = api_key
+        self.base = base_url.rstrip('/') if base_url else OTX_BASE
         self.timeout = timeout
-    def search_for_resource(self, resource):
+        self.transport = Transport('otx', timeout=timeout)
+    @staticmethod
+    def candidates(resource):
+        # IPs and hostnames from the resource's scanned attributes (lib.indicator_scanner)
+        return scan_resource(resource).select(OTXAdapter.INDICATOR_TYPES)
+    def lookup_indicator(self, c, budget=None):
+        findings = []
+        try:
+            if not self.api_key:
+                return findings
+            section = OTX_SECTIONS.get(indicator_type(c))
+            if not section:
+                return findings
+            url = f"{self.base}/indicators/{section}/{c}/general"
+            headers = {'X-OTX-API-KEY': self.api_key}
+            resp = self.transport.get(url, budget=budget, headers=headers)
+            if resp.status_code == 200:
+                data = resp.json()
+                if data.get('reputation') and data['reputation'].get('malicious'):
+                    findings.append({'feed':'otx','indicator':c,'risk':'HIGH','evidence':str(data.get('reputation'))})
+            elif failed_status(resp):
+                findings.append(degraded_finding('otx', 'indicator', c, failed_status(resp)))
+        except FeedDegraded as e:
+            findings.append(degraded_finding('otx', 'indicator', c, e.reason))
+        except Exception as e:
+            # e.g. an unreadable body or a cassette miss: unchecked, not clean
+            findings.append(degraded_finding('otx', 'indicator', c, type(e).__name__))
+        return findings
+    def search_for_resource(self, resource, budget=None):
         # resource: dict with attributes. For production, inspect hostnames/ips and query OTX pulses/indicators.
         findings = []
         try:
-            attrs = resource.get('attributes', {})
-            candidates = []
-            if attrs.get('endpoint'): candidates.append(attrs.get('endpoint'))
-            # naive ip extraction from cidr or public_ip
-            if attrs.get('public_ip'): candidates.append(attrs.get('public_ip'))
-            for c in candidates:
-                if not self.api_key: 
-                    findings.append({'feed':'otx','indicator':c,'risk':'LOW','evidence':'no-api-key (dev)'}) 
-                    continue
-                url = f"{OTX_BASE}/indicators/IPv4/{c}/general"
-                headers = {'X-OTX-API-KEY': self.api_key}
-                resp = requests.get(url, headers=headers, timeout=self.timeout)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    if data.get('reputation') and data['reputation'].get('malicious'):
-                        findings.append({'feed':'otx','indicator':c,'risk':'HIGH','evidence':str(data.get('reputation'))})
-        except Exception:
-            pass
+            for c in self.candidates(resource):
+                findings += self.lookup_indicator(c, budget=budget)
+        except Exception as e:
+            findings.append(degraded_finding('otx', 'indicator', None, type(e).__name__))
         return findings
+    def lookup_many(self, indicators, budget=None):
+        # OTX has no batch endpoint: pipeline the per-indicator calls
+        return pipelined(lambda c: self.lookup_indicator(c, budget=budget), [i for i in indicators if i])
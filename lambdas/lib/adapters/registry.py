@@ -0,0 +1,44 @@
+# ==============================
+#   Threat Feed Registry
+# ==============================
+# Resolves once per container which feeds have an API key. Only the adapters
+# of enabled feeds are imported and constructed; the rest are reported per
+# scan in skipped_feeds instead of producing placeholder findings.
+
+import importlib
+import os
+
+# feed -> (adapter module, adapter class, API key variable, indicator source)
+# indicator source "ips": the resource's IP/host indicators; "resource": adapter.candidates(resource)
+FEEDS = {
+    'abuseipdb': ('abuseipdb_adapter', 'AbuseIPDBAdapter', 'ABUSEIPDB_API_KEY', 'ips'),
+    'greynoise': ('greynoise_adapter', 'GreyNoiseAdapter', 'GREYNOISE_API_KEY', 'ips'),
+    'shodan': ('shodan_adapter', 'ShodanAdapter', 'SHODAN_API_KEY', 'ips'),
+    'otx': ('otx_adapter', 'OTXAdapter', 'OTX_API_KEY', 'resource'),
+}
+
+
+def resolve_feeds(environ=None):
+    """
+    Returns (enabled, skipped): enabled maps feed -> API key, skipped lists feeds without a key.
+    """
+    environ = os.environ if environ is None else environ
+    enabled, skipped = {}, []
+    for feed, (_, _, key_var, _) in FEEDS.items():
+        api_key = (environ.get(key_var) or '').strip()
+        if api_key:
+            enabled[feed] = api_key
+        else:
+            skipped.append(feed)
+    return enabled, skipped
+
+
+def load_adapter(feed, api_key):
+    """Imports the feed's adapter module on demand and builds the adapter."""
+    module_name, class_name, _, _ = FEEDS[feed]
+    module = importlib.import_module(f'.{module_name}', __package__)
+    return getattr(module, class_name)(api_key)
+
+
+def indicator_source(feed):
+    return FEEDS[feed][3]
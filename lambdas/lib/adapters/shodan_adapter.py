@@ -1,31 +1,74 @@
-import requests, os, time
-SHODAN_BASE = 'https://api.shodan.io/shodan/host/'
+import os
+from .transport import Transport, FeedDegraded, degraded_finding, failed_status, chunks
+API_ROOT = os.environ.get('SHODAN_BASE_URL', 'https://api.shodan.io').rstrip('/')
+SHODAN_BASE = f'{API_ROOT}/shodan/host/'
+# Shodan.host() accepts a comma-separated list; keep URLs well below proxy limits
+MULTI_BATCH_SIZE = 100
 class ShodanAdapter:
-    def __init__(self, api_key=None, timeout=5):
+    FEED = 'shodan'
+    INDICATOR_KEY = 'host'
+    INDICATOR_TYPES = ('ipv4', 'ipv6')
+    def __init__(self, api_key=None, timeout=5, base_url=None):
         self.api_key = api_key
+        self.base = f"{base_url.rstrip('/')}/shodan/host/" if base_url else SHODAN_BASE
         self.timeout = timeout
-    def lookup_host(self, host):
+        self.transport = Transport('shodan', timeout=timeout)
+    @staticmethod
+    def _finding(host, data):
+        # if port/service exposed with high risk tags, escalate
+        vuln_score = 0
+        if data.get('vulns'): vuln_score += len(data['vulns'])
+        if data.get('data'):
+            for banner in data.get('data', []):
+                if 'apache' in str(banner.get('product','')).lower(): vuln_score += 1
+        risk = 'LOW'
+        if vuln_score > 0: risk = 'MEDIUM' if vuln_score < 5 else 'HIGH'
+        return {'feed':'shodan','host':host,'risk':risk,'evidence':f'vuln_count={vuln_score}'}
+    def lookup_host(self, host, budget=None):
         findings = []
         if not host:
             return findings
         try:
             if not self.api_key:
-                findings.append({'feed':'shodan','host':host,'risk':'LOW','evidence':'no-api-key (dev)'})
                 return findings
-            url = SHODAN_BASE + host
+            url = self.base + host
             params = {'key': self.api_key}
-            resp = requests.get(url, params=params, timeout=self.timeout)
+            resp = self.transport.get(url, budget=budget, params=params)
             if resp.status_code == 200:
+                findings.append(self._finding(host, resp.json()))
+            elif failed_status(resp):
+                findings.append(degraded_finding('shodan', 'host', host, failed_status(resp)))
+        except FeedDegraded as e:
+            findings.append(degraded_finding('shodan', 'host', host, e.reason))
+        except Exception as e:
+            # e.g. an unreadable body or a cassette miss: unchecked, not clean
+            findings.append(degraded_finding('shodan', 'host', host, type(e).__name__))
+        return findings
+    def lookup_many(self, indicators, budget=None):
+        """Same multi-host call as the shodan library's Shodan.host([ip, ...])."""
+        indicators = [i for i in indicators if i]
+        if not self.api_key or len(indicators) < 2:
+            return [f for host in indicators for f in self.lookup_host(host, budget=budget)]
+        findings = []
+        params = {'key': self.api_key}
+        for batch in chunks(indicators, MULTI_BATCH_SIZE):
+            try:
+                resp = self.transport.get(self.base + ','.join(batch), budget=budget, params=params)
+                if resp.status_code == 404:
+                    continue    # no information on any host of the batch
+                if resp.status_code != 200:
+                    # a failed batch must not read as up to 100 clean hosts
+                    findings += [degraded_finding('shodan', 'host', host, f'http {resp.status_code}') for host in batch]
+                    continue
                 data = resp.json()
-                # if port/service exposed with high risk tags, escalate
-                vuln_score = 0
-                if data.get('vulns'): vuln_score += len(data['vulns'])
-                if data.get('data'):
-                    for banner in data.get('data', []):
-                        if 'apache' in str(banner.get('product','')).lower(): vuln_score += 1
-                risk = 'LOW'
-                if vuln_score > 0: risk = 'MEDIUM' if vuln_score < 5 else 'HIGH'
-                findings.append({'feed':'shodan','host':host,'risk':risk,'evidence':f'vuln_count={vuln_score}'})
-        except Exception:
-            pass
+                hosts = data if isinstance(data, list) else [data]
+                wanted = set(batch)
+                for h in hosts:
+                    host = h.get('ip_str')
+                    if host in wanted:
+                        findings.append(self._finding(host, h))
+            except FeedDegraded as e:
+                findings += [degraded_finding('shodan', 'host', host, e.reason) for host in batch]
+            except Exception as e:
+                findings += [degraded_finding('shodan', 'host', host, type(e).__name__) for host in batch]
         return findings
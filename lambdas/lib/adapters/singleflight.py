@@ -0,0 +1,42 @@
+# ==============================
+#   Single-flight request coalescing
+# ==============================
+# Concurrent lookups of the same (feed, indicator) share one network call:
+# the first caller becomes the leader and performs the request, later callers
+# wait on the leader's Future. Keys are released as soon as the call finishes,
+# so this is not a cache.
+
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.counters = {'calls': 0, 'coalesced': 0}
+
+    def claim(self, key):
+        """
+        Returns (future, is_leader). The leader must later call resolve(key, value).
+        """
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                self.counters['coalesced'] += 1
+                return fut, False
+            fut = Future()
+            self._inflight[key] = fut
+            self.counters['calls'] += 1
+            return fut, True
+
+    def resolve(self, key, value):
+        """Publishes the leader's result to every waiter and releases the key."""
+        with self._lock:
+            fut = self._inflight.pop(key, None)
+        if fut is not None and not fut.done():
+            fut.set_result(value)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, inflight=len(self._inflight))
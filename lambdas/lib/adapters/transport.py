@@ -0,0 +1,219 @@
+# ==============================
+#   Shared HTTP transport for threat-feed adapters
+# ==============================
+# Retries 429/5xx and connection errors with decorrelated-jitter backoff,
+# honours Retry-After, and draws every retry from a per-scan RetryBudget so a
+# throttled feed cannot push a scan past its deadline. When a feed gives up
+# the adapter reports a degraded finding instead of an empty list.
+# With FEED_CASSETTE set, sessions record to or replay from a cassette file
+# (cassette.py) instead of going only to the network.
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+from .cassette import active_cassette
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+# answers that mean "nothing known about this indicator": clean, not a failure
+NOT_FOUND_STATUS = (404,)
+PIPELINE_WORKERS = 8
+
+
+class FeedDegraded(Exception):
+    """Raised when a feed could not be queried after retries."""
+
+    def __init__(self, feed, reason):
+        super().__init__(f"{feed} unavailable: {reason}")
+        self.feed = feed
+        self.reason = reason
+
+
+class RetryBudget:
+    """
+    Per-scan allowance shared by every adapter call of one scan.
+    deadline is an absolute time.monotonic() value (None = no deadline).
+    """
+
+    def __init__(self, max_retries=20, deadline=None):
+        self.max_retries = max_retries
+        self.deadline = deadline
+        self.retries_used = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_lambda_context(cls, context, max_retries=20, reserve_seconds=10.0):
+        """Builds a budget that stops retrying reserve_seconds before the Lambda timeout."""
+        deadline = None
+        if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+            remaining = context.get_remaining_time_in_millis() / 1000.0
+            deadline = time.monotonic() + max(remaining - reserve_seconds, 0.0)
+        return cls(max_retries=max_retries, deadline=deadline)
+
+    def remaining_time(self):
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def try_spend(self, delay):
+        """Reserves one retry that sleeps for delay seconds; False if it does not fit."""
+        with self._lock:
+            if self.retries_used >= self.max_retries:
+                return False
+            remaining = self.remaining_time()
+            if remaining is not None and delay >= remaining:
+                return False
+            self.retries_used += 1
+            return True
+
+
+class RetryPolicy:
+    """
+    Decorrelated-jitter backoff: sleep = min(max_delay, uniform(base, prev * 3)).
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.2, max_delay=10.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def next_delay(self, previous):
+        previous = max(previous or self.base_delay, self.base_delay)
+        return min(self.max_delay, random.uniform(self.base_delay, previous * 3))
+
+
+def parse_retry_after(value, now=None):
+    """
+    Parses a Retry-After header (delta-seconds or HTTP-date) into seconds.
+    Returns None when the header is missing or malformed.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    now = time.time() if now is None else now
+    return max(when.timestamp() - now, 0.0)
+
+
+def _requests():
+    # imported by the first feed call rather than at cold start (rescoring never needs it)
+    import requests
+    return requests
+
+
+class Transport:
+    """HTTP client used by the adapters; one instance (and keep-alive session) per feed."""
+
+    def __init__(self, feed, timeout=5, policy=None, session=None, sleep=time.sleep):
+        self.feed = feed
+        self.timeout = timeout
+        self.policy = policy or RetryPolicy()
+        self._session = session
+        self.sleep = sleep
+
+    @property
+    def session(self):
+        if self._session is None:
+            cassette = active_cassette()
+            if cassette is None:
+                self._session = _requests().Session()
+            else:
+                self._session = cassette.session(self.feed, lambda: _requests().Session())
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
+    def request(self, method, url, budget=None, **kwargs):
+        """
+        Sends a request, retrying transient failures.
+        Returns the final response for non-retryable statuses; raises FeedDegraded otherwise.
+        """
+        requests = _requests()
+        kwargs.setdefault('timeout', self.timeout)
+        delay = 0.0
+        reason = 'no attempt made'
+        for attempt in range(1, self.policy.max_attempts + 1):
+            retry_after = None
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                reason = type(e).__name__
+            else:
+                if resp.status_code not in RETRYABLE_STATUS:
+                    return resp
+                reason = f'http {resp.status_code}'
+                retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+
+            if attempt == self.policy.max_attempts:
+                reason += f' after {attempt} attempts'
+                break
+            delay = self.policy.next_delay(delay)
+            if retry_after is not None:
+                if retry_after > self.policy.max_delay:
+                    reason += f' (Retry-After {retry_after:.0f}s exceeds max delay)'
+                    break
+                delay = max(delay, retry_after)
+            if budget is not None and not budget.try_spend(delay):
+                reason += ' (retry budget exhausted)'
+                break
+            self.sleep(delay)
+
+        raise FeedDegraded(self.feed, reason)
+
+    def get(self, url, budget=None, **kwargs):
+        return self.request('GET', url, budget=budget, **kwargs)
+
+    def post(self, url, budget=None, **kwargs):
+        return self.request('POST', url, budget=budget, **kwargs)
+
+
+def degraded_finding(feed, key, indicator, reason):
+    """Marker finding for an indicator that could not be checked."""
+    return {'feed': feed, key: indicator, 'degraded': True, 'evidence': str(reason)}
+
+
+def failed_status(resp):
+    """Degraded reason for an answer that is neither usable (200) nor 'not found', else None."""
+    if resp.status_code == 200 or resp.status_code in NOT_FOUND_STATUS:
+        return None
+    return f'http {resp.status_code}'
+
+
+def split_degraded(findings):
+    """Separates real findings from degraded markers."""
+    ok, degraded = [], []
+    for f in findings:
+        (degraded if f.get('degraded') else ok).append(f)
+    return ok, degraded
+
+
+def chunks(items, size):
+    """Yields consecutive slices of at most size items."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def pipelined(lookup, indicators, max_workers=PIPELINE_WORKERS):
+    """
+    Fallback for feeds without a batch API: runs the single-indicator lookup
+    for every indicator over a small thread pool, keeping input order.
+    """
+    indicators = list(indicators)
+    if len(indicators) <= 1:
+        return [f for i in indicators for f in lookup(i)]
+    findings = []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(indicators))) as pool:
+        for result in pool.map(lookup, indicators):
+            findings += result
+    return findings
@@ -0,0 +1,52 @@
+# ==============================
+#   AWS Client Factory
+# ==============================
+# The handlers get their S3 / DynamoDB / SQS clients from here rather than
+# creating boto3 clients at import time. A client is created on first use and
+# cached for the container. set_client_factory() swaps in other clients (the
+# in-memory stand-ins of benchmarks/local_pipeline.py, test doubles); local
+# emulators such as LocalStack need no factory, boto3 honours AWS_ENDPOINT_URL.
+
+import threading
+
+_factory = None
+_clients = {}
+_lock = threading.Lock()
+
+
+def default_factory(service):
+    import boto3
+    return boto3.client(service)
+
+
+def set_client_factory(factory=None):
+    """
+    factory(service) -> client for every later client() call; None restores boto3.
+    Clients created by the previous factory are dropped.
+    """
+    global _factory
+    with _lock:
+        _factory = factory
+        _clients.clear()
+
+
+def client(service):
+    c = _clients.get(service)
+    if c is None:
+        with _lock:
+            c = _clients.get(service)
+            if c is None:
+                c = (_factory or default_factory)(service)
+                _clients[service] = c
+    return c
+
+
+class LazyClient:
+    """Module-level handle for a service; the client is resolved by client() on each call."""
+    __slots__ = ('service',)
+
+    def __init__(self, service):
+        self.service = service
+
+    def __getattr__(self, name):
+        return getattr(client(self.service), name)
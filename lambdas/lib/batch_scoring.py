@@ -0,0 +1,155 @@
+# ==============================
+#   Vectorized Batch Correlation & Scoring
+# ==============================
+# Scan-wide equivalent of correlate_threats + calculate_risk. Severities, feed
+# confidences and per-resource exposure factors are encoded once into flat
+# arrays; escalation, weights and per-resource weighted averages are then a
+# handful of vector operations. NumPy is used when available, otherwise
+# `array` module arrays with plain loops.
+#
+# Results are bit-for-bit identical to the per-item path: rounding is
+# half-to-even like round(), and each resource's sums are accumulated in the
+# same left-to-right order as calculate_risk (one vector add per finding
+# position rather than a pairwise reduction).
+
+from array import array
+
+from .correlation_engine import RISK_ORDER, RISK_LEVEL_BY_WEIGHT, correlated_finding
+from .risk_scoring import SEVERITY_WEIGHTS, FEED_CONFIDENCE
+
+# NumPy is imported by the first batch rather than at cold start (it is most of the import cost)
+np = None
+_numpy_checked = False
+
+
+def load_numpy():
+    """The numpy module, imported on first use; None when it is not installed."""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:  # optional: the Lambda layer does not ship NumPy
+            np = None
+        _numpy_checked = True
+    return np
+
+MAX_LEVEL = max(RISK_ORDER.values())
+# Level code 0 = a level name outside RISK_ORDER
+LEVEL_NAMES = [None] + [RISK_LEVEL_BY_WEIGHT[w] for w in range(1, MAX_LEVEL + 1)]
+SEVERITY_BY_CODE = [1] + [SEVERITY_WEIGHTS.get(RISK_LEVEL_BY_WEIGHT[w], 1) for w in range(1, MAX_LEVEL + 1)]
+
+LABELS = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+LABEL_THRESHOLDS = (2, 5, 8)
+
+
+def encode(findings_lists, contexts):
+    """
+    Flattens a scan into parallel arrays: resource row, position within the
+    resource, level code, feed confidence, and escalation amount (factor - 1).
+    Also returns the upper-cased input level names (needed for unknown levels).
+    """
+    rows, cols, codes, conf, fac = array("l"), array("l"), array("l"), array("d"), array("d")
+    names = []
+    order_get = RISK_ORDER.get
+    conf_get = FEED_CONFIDENCE.get
+    for r, (findings, ctx) in enumerate(zip(findings_lists, contexts)):
+        factor = ctx.exposure_factor - 1 if ctx.exposure_factor > 1.0 else 0.0
+        for c, f in enumerate(findings):
+            lvl = f.get("risk", f.get("risk_level", "LOW")).upper()
+            names.append(lvl)
+            rows.append(r)
+            cols.append(c)
+            codes.append(order_get(lvl, 0))
+            conf.append(conf_get(f.get("feed", "").lower(), 0.5))
+            fac.append(factor)
+    return rows, cols, codes, conf, fac, names
+
+
+def _score_numpy(n_resources, rows, cols, codes, conf, fac):
+    rows, cols, codes = (np.asarray(a, dtype=np.int_) for a in (rows, cols, codes))
+    conf, fac = (np.asarray(a, dtype=np.float64) for a in (conf, fac))
+
+    # escalate_risk: min(round(current + factor), MAX_LEVEL), unknown levels count as 1
+    escalate = fac > 0.0
+    current = np.where(codes == 0, 1, codes)
+    escalated = np.minimum(np.rint(current + fac), MAX_LEVEL).astype(np.int_)
+    new_codes = np.where(escalate, escalated, codes)
+
+    weighted = np.array(SEVERITY_BY_CODE, dtype=np.float64)[new_codes] * conf
+
+    weighted_sum = np.zeros(n_resources)
+    total_weight = np.zeros(n_resources)
+    if len(cols):
+        # one add per finding position keeps calculate_risk's summation order
+        order = np.argsort(cols, kind="stable")
+        bounds = np.cumsum(np.bincount(cols))
+        start = 0
+        for end in bounds:
+            idx = order[start:end]
+            weighted_sum[rows[idx]] += weighted[idx]
+            total_weight[rows[idx]] += conf[idx]
+            start = end
+
+    avg = weighted_sum / np.maximum(total_weight, 1)
+    label_idx = np.searchsorted(np.array(LABEL_THRESHOLDS, dtype=np.float64), avg, side="right")
+    return new_codes.tolist(), avg.tolist(), label_idx.tolist()
+
+
+def _score_array(n_resources, rows, cols, codes, conf, fac):
+    new_codes = array("l", codes)
+    weighted_sum = array("d", bytes(8 * n_resources))
+    total_weight = array("d", bytes(8 * n_resources))
+    for i in range(len(codes)):
+        code = codes[i]
+        if fac[i] > 0.0:
+            code = min(round((code or 1) + fac[i]), MAX_LEVEL)
+            new_codes[i] = code
+        r = rows[i]
+        weighted_sum[r] += SEVERITY_BY_CODE[code] * conf[i]
+        total_weight[r] += conf[i]
+
+    avg, label_idx = [], []
+    for r in range(n_resources):
+        a = weighted_sum[r] / max(total_weight[r], 1)
+        avg.append(a)
+        label_idx.append(sum(1 for t in LABEL_THRESHOLDS if a >= t))
+    return new_codes.tolist(), avg, label_idx
+
+
+def score_batch(findings_lists, contexts, use_numpy=None):
+    """
+    Correlated levels and risk labels for every resource of a scan.
+
+    findings_lists[i] are resource i's raw feed findings, contexts[i] its ResourceContext.
+    Returns (levels, labels, scores): levels[i] lists the correlated level of each finding
+    (as correlate_threats' risk_level), labels[i] equals calculate_risk of those findings
+    and scores[i] is the underlying weighted average.
+    """
+    numpy = load_numpy()
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    rows, cols, codes, conf, fac, names = encode(findings_lists, contexts)
+    score = _score_numpy if use_numpy else _score_array
+    new_codes, avg, label_idx = score(len(findings_lists), rows, cols, codes, conf, fac)
+
+    levels = [[] for _ in findings_lists]
+    for i, code in enumerate(new_codes):
+        levels[rows[i]].append(LEVEL_NAMES[code] if code else names[i])
+    labels = [LABELS[i] for i in label_idx]
+    return levels, labels, avg
+
+
+def correlate_scan(findings_lists, contexts, use_numpy=None):
+    """
+    Batch counterpart of per-resource correlate_threats + calculate_risk_score.
+    Returns (correlated_lists, labels, scores) with the same finding dicts, labels and values.
+    """
+    levels, labels, scores = score_batch(findings_lists, contexts, use_numpy=use_numpy)
+    correlated_lists = []
+    for findings, ctx, lvls in zip(findings_lists, contexts, levels):
+        correlated_lists.append([
+            correlated_finding(f, f.get("risk", f.get("risk_level", "LOW")).upper(), new_lvl, ctx.exposure_factor)
+            for f, new_lvl in zip(findings, lvls)
+        ])
+    return correlated_lists, labels, scores
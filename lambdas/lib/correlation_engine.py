@@ -2,6 +2,8 @@
 #   Dynamic Context-Aware Correlation Engine
 # ==============================
 
+from .resource_context import build_context
+
 RISK_ORDER = {
     "LOW": 1,
     "MEDIUM": 2,
@@ -11,6 +13,11 @@ RISK_ORDER = {
 
 RISK_LEVEL_BY_WEIGHT = {v: k for k, v in RISK_ORDER.items()}
 
+# Reason codes stored on correlated findings; the text is rendered at read time
+# (explanation_builder.render_explanation).
+REASON_ESCALATED = "ESC"     # ["ESC", input level, exposure factor]
+REASON_NO_ESCALATION = "NONE"  # ["NONE"]
+
 
 def escalate_risk(level, factor=1.0):
     """
@@ -23,75 +30,43 @@ def escalate_risk(level, factor=1.0):
     return RISK_LEVEL_BY_WEIGHT[new_weight]
 
 
-def correlate_threats(resource, findings):
+def correlate_threats(resource, findings, ctx=None):
     """
     Dynamically correlates findings using context like exposure, sensitivity, and ports.
+    ctx is the resource's precomputed ResourceContext (built here if omitted).
     """
-    attrs = resource.get("attributes", {})
+    if ctx is None:
+        ctx = build_context(resource)
+
+    exposure_factor = ctx.exposure_factor
     correlated_findings = []
 
-    # --- Context detection ---
-    public = any([
-        attrs.get("public") is True,
-        attrs.get("associate_public_ip_address") is True,
-        attrs.get("acl") in ("public-read", "public-read-write"),
-        "0.0.0.0/0" in str(attrs)
-    ])
-
-    sensitive = any([
-        "prod" in str(attrs.get("tags", [])).lower(),
-        "critical" in str(attrs.get("tags", [])).lower(),
-        "db" in str(attrs.get("name", "")).lower(),
-        "backup" in str(attrs.get("name", "")).lower()
-    ])
-
-    # Check if resource exposes sensitive ports
-    exposed_ports = []
-    ports = attrs.get("port")
-    if ports:
-        if isinstance(ports, (int, str)):
-            ports = [ports]
-        for p in ports:
-            try:
-                if int(p) in [22, 80, 443, 3389, 3306]:
-                    exposed_ports.append(int(p))
-            except ValueError:
-                continue
-
-    # --- Determine context intensity ---
-    exposure_factor = 1.0
-    if public:
-        exposure_factor += 0.7
-    if sensitive:
-        exposure_factor += 0.4
-    if exposed_ports:
-        exposure_factor += 0.3
-
-    context_flags = []
-    if public:
-        context_flags.append("public")
-    if sensitive:
-        context_flags.append("sensitive")
-    if exposed_ports:
-        context_flags.append("exposed_ports")
+    # Escalation depends only on the input level: resolve each level once per resource
+    escalated = {}
 
     # --- Apply escalation per finding ---
     for f in findings:
-        correlated_f = f.copy()
         lvl = f.get("risk", f.get("risk_level", "LOW")).upper()
 
-        if exposure_factor > 1.0:
-            new_lvl = escalate_risk(lvl, factor=exposure_factor - 1)
-            correlated_f["risk_level"] = new_lvl
-            correlated_f["details"] = (
-                f"Escalated {lvl}→{new_lvl} due to {', '.join(context_flags)} "
-                f"(factor={exposure_factor:.2f}). Evidence: {f.get('evidence', 'N/A')}"
-            )
-        else:
-            correlated_f["risk_level"] = lvl
-            correlated_f["details"] = f"No escalation. Evidence: {f.get('evidence', 'N/A')}"
+        new_lvl = escalated.get(lvl)
+        if new_lvl is None:
+            new_lvl = escalate_risk(lvl, factor=exposure_factor - 1) if exposure_factor > 1.0 else lvl
+            escalated[lvl] = new_lvl
 
-        correlated_f["context_flags"] = context_flags
-        correlated_findings.append(correlated_f)
+        correlated_findings.append(correlated_finding(f, lvl, new_lvl, exposure_factor))
 
     return correlated_findings
+
+
+def correlated_finding(f, lvl, new_lvl, exposure_factor):
+    """
+    Copy of finding f carrying its correlated level and reason code.
+    The resource's context flags are stored once on its explanation, not per finding.
+    """
+    correlated_f = f.copy()
+    correlated_f["risk_level"] = new_lvl
+    if exposure_factor > 1.0:
+        correlated_f["reason"] = [REASON_ESCALATED, lvl, round(exposure_factor, 2)]
+    else:
+        correlated_f["reason"] = [REASON_NO_ESCALATION]
+    return correlated_f
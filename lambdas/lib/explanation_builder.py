@@ -1,8 +1,49 @@
-def build_explanation(resource, correlated_findings, score):
-    return {
+from .correlation_engine import REASON_ESCALATED
+
+
+def build_explanation(resource, correlated_findings, score, value=None, ctx=None):
+    # Stored form: reason codes only, prose is added by render_explanation() at read time
+    explain = {
         'resource_id': resource.get('resource_id'),
         'resource_type': resource.get('type'),
         'risk_score': score,
-        'details': f"{len(correlated_findings)} correlated finding(s)",
         'findings': correlated_findings
     }
+    if value is not None:
+        explain['risk_value'] = round(value, 3)
+    if ctx is not None:
+        explain['context_flags'] = ctx.flags
+        if ctx.data_classes:
+            explain['data_classes'] = ctx.data_classes
+        if ctx.reachable_via:
+            explain['reachable_via'] = ctx.reachable_via
+    return explain
+
+
+def render_finding(finding, context_flags=()):
+    reason = finding.get('reason') or []
+    evidence = finding.get('evidence', 'N/A')
+    if reason and reason[0] == REASON_ESCALATED:
+        _, lvl, factor = reason
+        return (f"Escalated {lvl}→{finding.get('risk_level')} due to {', '.join(context_flags)} "
+                f"(factor={factor:.2f}). Evidence: {evidence}")
+    return f"No escalation. Evidence: {evidence}"
+
+
+def render_explanation(explain):
+    """
+    Copy of a stored result with the human-readable `details` of the result and its findings.
+    Results stored before reason codes already carry their text and are returned as is.
+    """
+    flags = explain.get('context_flags', [])
+    findings = explain.get('findings', [])
+    rendered = dict(explain)
+    rendered.setdefault('details', f"{len(findings)} correlated finding(s)")
+    rendered['findings'] = [
+        f if 'details' in f else dict(f, details=render_finding(f, flags)) for f in findings
+    ]
+    return rendered
+
+
+def render_results(results):
+    return [render_explanation(r) for r in results]
@@ -0,0 +1,166 @@
+# ==============================
+#   Attribute Indicator Scanner
+# ==============================
+# Finds the IPs, CIDRs and hostnames a resource exposes to the threat feeds,
+# wherever they sit in its attributes: user_data scripts, ingress cidr_blocks,
+# Route53 records, listener actions, Lambda environment variables, ...
+#
+# Only the fields allowlisted for the resource type are walked (iteratively,
+# no recursion), and each string leaf is scanned by precompiled patterns that
+# only run when a cheap character check says they can match. String, node and
+# indicator limits bound the work per resource, so a plan is scanned in time
+# linear in its size. Candidates are validated with `ipaddress`; private,
+# reserved and catch-all addresses (0.0.0.0/0) are dropped.
+
+import ipaddress
+import re
+from functools import lru_cache
+
+IPV4, IPV6, CIDR, FQDN = 'ipv4', 'ipv6', 'cidr', 'fqdn'
+INDICATOR_TYPES = (IPV4, IPV6, CIDR, FQDN)
+
+MAX_STRING_CHARS = 256 * 1024       # a longer leaf is scanned up to this length
+MAX_NODES = 50000                   # attribute nodes walked per resource
+MAX_INDICATORS = 200                # indicators returned per resource
+
+# loose shapes; octets and prefixes are validated by ipaddress
+IPV4_RE = re.compile(r'(?<![\d.])\d{1,3}(?:\.\d{1,3}){3}(?:/\d{1,2})?(?!\d|\.\d)')
+IPV6_RE = re.compile(r'(?<![\w:])(?:[0-9A-Fa-f]{0,4}:){2,7}[0-9A-Fa-f]{0,4}(?:/\d{1,3})?(?![\w:])')
+FQDN_RE = re.compile(r'(?<![\w.-])(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.){1,126}[A-Za-z]{2,63}(?![\w-])')
+# prechecks: a full IPv4 scan costs several times this search
+DIGIT_DOT_RE = re.compile(r'\d\.\d')
+
+# hostnames that carry no threat-intel value or are file names, not hosts
+FQDN_IGNORE_SUFFIXES = ('.amazonaws.com', '.internal', '.local', '.localdomain', '.localhost', '.example.com')
+FQDN_IGNORE_TLDS = frozenset([
+    'sh', 'py', 'txt', 'json', 'tf', 'tfvars', 'html', 'js', 'conf', 'cfg', 'ini', 'log', 'yaml', 'yml',
+    'md', 'zip', 'gz', 'tar', 'tgz', 'pem', 'key', 'crt', 'service', 'd', 'rpm', 'deb', 'jar', 'war'
+])
+
+# resource type -> top-level attribute fields scanned; types not listed use "*".
+# Tags are free-form labels ("web.prod", "team.payments"), not hosts, so they are never scanned.
+FIELD_ALLOWLIST = {
+    '*': ('public_ip', 'cidr_block', 'endpoint', 'user_data', 'environment', 'records', 'ingress'),
+    'aws_instance': ('public_ip', 'public_dns', 'user_data'),
+    'aws_launch_template': ('user_data',),
+    'aws_eip': ('public_ip',),
+    'aws_security_group': ('ingress',),
+    'aws_security_group_rule': ('cidr_blocks', 'ipv6_cidr_blocks'),
+    'aws_vpc_security_group_ingress_rule': ('cidr_ipv4', 'cidr_ipv6'),
+    'aws_route53_record': ('records', 'name'),
+    'aws_lb': ('dns_name',),
+    'aws_lb_listener': ('default_action',),
+    'aws_lb_listener_rule': ('action', 'condition'),
+    'aws_lambda_function': ('environment',),
+    'aws_ecs_task_definition': ('container_definitions',),
+    'aws_db_instance': ('endpoint', 'address'),
+    'aws_rds_cluster': ('endpoint', 'reader_endpoint'),
+    'aws_vpc': ('cidr_block',),
+    'aws_subnet': ('cidr_block',),
+    'aws_customer_gateway': ('ip_address',),
+    'aws_vpn_connection': ('tunnel1_address', 'tunnel2_address'),
+}
+
+
+@lru_cache(maxsize=8192)
+def _ip(candidate):
+    """(type, normalized value) of a global IP / CIDR candidate, or None."""
+    try:
+        if '/' in candidate:
+            net = ipaddress.ip_network(candidate, strict=False)
+            if net.prefixlen == 0 or not net.is_global:
+                return None
+            if net.num_addresses == 1:
+                return (IPV4 if net.version == 4 else IPV6), str(net.network_address)
+            return CIDR, str(net)
+        addr = ipaddress.ip_address(candidate)
+    except ValueError:
+        return None
+    if not addr.is_global:
+        return None
+    return (IPV4 if addr.version == 4 else IPV6), str(addr)
+
+
+@lru_cache(maxsize=8192)
+def _fqdn(candidate):
+    host = candidate.lower()
+    if host.rsplit('.', 1)[-1] in FQDN_IGNORE_TLDS or host.endswith(FQDN_IGNORE_SUFFIXES):
+        return None
+    return FQDN, host
+
+
+def scan_text(text, add):
+    """Calls add(type, value) for every indicator in text."""
+    if len(text) > MAX_STRING_CHARS:
+        text = text[:MAX_STRING_CHARS]
+    if '.' in text:
+        if DIGIT_DOT_RE.search(text):
+            for m in IPV4_RE.finditer(text):
+                found = _ip(m.group())
+                if found:
+                    add(*found)
+        for m in FQDN_RE.finditer(text):
+            found = _fqdn(m.group())
+            if found:
+                add(*found)
+    if '::' in text or text.count(':') >= 2:
+        for m in IPV6_RE.finditer(text):
+            found = _ip(m.group())
+            if found:
+                add(*found)
+
+
+def indicator_type(value):
+    """Type of a single indicator value, or None."""
+    try:
+        if '/' in value:
+            ipaddress.ip_network(value, strict=False)
+            return CIDR
+        return IPV4 if ipaddress.ip_address(value).version == 4 else IPV6
+    except ValueError:
+        return FQDN if FQDN_RE.fullmatch(value) else None
+
+
+class Indicators:
+    """Distinct indicators of one resource by type, in order of discovery."""
+    __slots__ = ('by_type', 'count')
+
+    def __init__(self):
+        self.by_type = {t: {} for t in INDICATOR_TYPES}
+        self.count = 0
+
+    def add(self, kind, value):
+        seen = self.by_type[kind]
+        if value not in seen and self.count < MAX_INDICATORS:
+            seen[value] = None
+            self.count += 1
+
+    def select(self, types=None):
+        """Indicators of the given types (all if None), grouped in INDICATOR_TYPES order."""
+        return [v for t in INDICATOR_TYPES if types is None or t in types for v in self.by_type[t]]
+
+
+def scan_resource(resource, allowlist=None):
+    """
+    Indicators found in the resource's allowlisted attribute fields.
+    """
+    allowlist = FIELD_ALLOWLIST if allowlist is None else allowlist
+    attrs = resource.get('attributes') or {}
+    fields = allowlist.get(resource.get('type'), allowlist.get('*', ()))
+    found = Indicators()
+    if not isinstance(attrs, dict):
+        return found
+
+    # reversed pushes keep discovery in attribute order
+    stack = [attrs[f] for f in reversed(fields) if attrs.get(f) is not None]
+    nodes = 0
+    while stack and nodes < MAX_NODES and found.count < MAX_INDICATORS:
+        v = stack.pop()
+        nodes += 1
+        if isinstance(v, str):
+            scan_text(v, found.add)
+        elif isinstance(v, dict):
+            stack.extend(reversed(list(v.values())))
+        elif isinstance(v, (list, tuple)):
+            stack.extend(reversed(v))
+    return found
@@ -0,0 +1,168 @@
+# ==============================
+#   Sensitivity Keyword Matcher (Aho-Corasick)
+# ==============================
+# All sensitivity keywords (data classes, business units, compliance scopes)
+# are compiled once per container into a single Aho-Corasick automaton, so a
+# string is scanned in one pass regardless of how many keywords there are:
+# O(len(text) + matches) instead of O(keywords x text).
+#
+# Keyword file format (lib/rules/sensitivity_keywords.json):
+#   {"classes": {"<class>": {"keywords": ["...", ...], "fields": ["tags", ...]}}}
+# "fields" scopes a class to some attributes; omitted = every scanned field.
+# Matching is case-insensitive substring matching over every string key and
+# leaf below a field (the same strings contains_text looks at), except that
+# keywords of BOUNDED_KEYWORD_CHARS characters or fewer ("ssn", "kyc", "db")
+# only match as whole tokens: between delimiters (-_./: etc.), case changes
+# (customerSSN, PIIData) or letter/digit changes. Otherwise "classname"
+# would match ssn and "feedback" db.
+
+import json
+import os
+from collections import deque
+
+DEFAULT_KEYWORDS_PATH = os.path.join(os.path.dirname(__file__), "rules", "sensitivity_keywords.json")
+KEYWORDS_PATH = os.environ.get("SENSITIVITY_KEYWORDS_PATH", DEFAULT_KEYWORDS_PATH)
+BOUNDED_KEYWORD_CHARS = 4
+
+
+def iter_strings(value):
+    """Every string key and leaf of a nested structure."""
+    stack = [value]
+    while stack:
+        v = stack.pop()
+        if isinstance(v, str):
+            yield v
+        elif isinstance(v, dict):
+            stack.extend(v.keys())
+            stack.extend(v.values())
+        elif isinstance(v, (list, tuple, set)):
+            stack.extend(v)
+
+
+def is_boundary(text, left, right):
+    """True if a token boundary lies between text[left] and text[right] (either may be out of range)."""
+    if left < 0 or right >= len(text):
+        return True
+    a, b = text[left], text[right]
+    if not (a.isalnum() and b.isalnum()) or a.isdigit() != b.isdigit():
+        return True
+    if a.islower() and b.isupper():
+        return True     # camelCase
+    # end of an acronym: "PIIData" splits before the "D"
+    return a.isupper() and b.isupper() and right + 1 < len(text) and text[right + 1].islower()
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over the keywords of every class.
+    Keywords of bounded_chars characters or fewer only match whole tokens (0 = pure substrings).
+    """
+
+    def __init__(self, spec, bounded_chars=BOUNDED_KEYWORD_CHARS):
+        self.classes = tuple(spec.get("classes", {}))
+        self.keyword_count = 0
+        # state -> {char: state}; state 0 is the root
+        self._goto = [{}]
+        self._fail = [0]
+        # state -> ((class, fields or None, bound), ...) for every keyword ending here (fail chain
+        # included); bound = (length, check start, check end) for whole-token keywords, else None
+        self._out = [()]
+
+        for cls, entry in spec.get("classes", {}).items():
+            fields = frozenset(entry["fields"]) if entry.get("fields") else None
+            for kw in entry.get("keywords", []):
+                kw = kw.lower()
+                bound = None
+                if len(kw) <= bounded_chars:
+                    # a keyword ending in a delimiter ("nda-") carries that boundary itself
+                    bound = (len(kw), kw[0].isalnum(), kw[-1].isalnum())
+                self._add(kw, (cls, fields, bound))
+                self.keyword_count += 1
+        self._link()
+
+    def _add(self, keyword, output):
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[state][ch] = nxt
+            state = nxt
+        if output not in self._out[state]:
+            self._out[state] += (output,)
+
+    def _link(self):
+        # breadth-first so a state's fail target is final before its children use it
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += tuple(o for o in self._out[self._fail[nxt]] if o not in self._out[nxt])
+
+    def scan(self, text, field=None, found=None):
+        """
+        Adds to `found` (returned) the classes with a keyword in text that apply to field.
+        """
+        found = set() if found is None else found
+        goto, fail, out = self._goto, self._fail, self._out
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            text = lowered      # rare case-folding that changes length: no case-change boundaries
+        state = 0
+        for end, ch in enumerate(lowered):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for cls, fields, bound in out[state]:
+                if fields is not None and field not in fields:
+                    continue
+                if bound is not None:
+                    length, check_start, check_end = bound
+                    start = end - length + 1
+                    if check_start and not is_boundary(text, start - 1, start):
+                        continue
+                    if check_end and not is_boundary(text, end, end + 1):
+                        continue
+                found.add(cls)
+        return found
+
+    def match(self, attrs, fields):
+        """
+        Classes matched by the strings below the given attribute fields.
+        """
+        found = set()
+        if not isinstance(attrs, dict):
+            return frozenset()
+        for field in fields:
+            for text in iter_strings(attrs.get(field)):
+                self.scan(text, field, found)
+                if len(found) == len(self.classes):
+                    return frozenset(found)
+        return frozenset(found)
+
+
+def load_matcher(path=None):
+    with open(path or KEYWORDS_PATH, encoding="utf-8") as fh:
+        return KeywordMatcher(json.load(fh))
+
+
+_default_matcher = None
+
+
+def default_matcher():
+    """
+    The container-wide keyword automaton, built on first use (cold start).
+    """
+    global _default_matcher
+    if _default_matcher is None:
+        _default_matcher = load_matcher()
+    return _default_matcher
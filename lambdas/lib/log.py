@@ -0,0 +1,186 @@
+# ==============================
+#   Structured Logging
+# ==============================
+# Both handlers log one JSON object per line through StructuredLogger:
+#   logger.info('📥 Fetching IaC plan', s3_key=key)
+#   -> {"level":"INFO","logger":"worker","msg":"📥 Fetching IaC plan","scan_id":"api-…","s3_key":"…"}
+# - Nothing is formatted for a line that is not emitted: the level and the
+#   sample are checked first, %-args and callable field values (lambda: ...)
+#   are only evaluated when a handler writes the line.
+# - log_context(scan_id=...) adds correlation fields to every line logged
+#   inside it (per thread / task, through a contextvar).
+# - LOG_SAMPLE_RATES ("DEBUG=0,INFO=0.1") keeps that share of lines below
+#   WARNING; with a scan_id in context the draw is a hash of it, so a scan's
+#   lines are kept or dropped together. WARNING and above are always kept.
+# - Values are bounded: strings are cut at LOG_MAX_CHARS, and dicts/lists are
+#   rendered by preview(), which stops walking the value once the limit is
+#   reached (an API Gateway event carrying a whole plan is never serialized
+#   in full just to log its first few hundred characters).
+
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import traceback
+import zlib
+from contextlib import contextmanager
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_MAX_CHARS = int(os.environ.get('LOG_MAX_CHARS', '2000'))
+EVENT_PREVIEW_CHARS = int(os.environ.get('LOG_EVENT_PREVIEW_CHARS', '300'))
+ELLIPSIS = '…'
+
+_context = contextvars.ContextVar('log_context', default={})
+
+
+def parse_sample_rates(spec):
+    """'DEBUG=0,INFO=0.1' -> {10: 0.0, 20: 0.1}; malformed entries are ignored."""
+    rates = {}
+    for part in (spec or '').split(','):
+        name, _, value = part.partition('=')
+        level = logging.getLevelName(name.strip().upper())
+        try:
+            if isinstance(level, int):
+                rates[level] = min(max(float(value), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+
+LOG_SAMPLE_RATES = parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES'))
+
+
+@contextmanager
+def log_context(**fields):
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+# ---- bounded rendering ----
+def _scalar(value, limit):
+    if value is None or isinstance(value, (bool, int, float)):
+        return json.dumps(value)
+    text = value if isinstance(value, str) else str(value)
+    # only the part that can be shown is encoded
+    return json.dumps(text[:limit + 1], ensure_ascii=False)
+
+
+def _pieces(value, limit):
+    if isinstance(value, dict):
+        yield '{'
+        for n, (k, v) in enumerate(value.items()):
+            yield (',' if n else '') + _scalar(str(k), limit) + ':'
+            yield from _pieces(v, limit)
+        yield '}'
+    elif isinstance(value, (list, tuple)):
+        yield '['
+        for n, v in enumerate(value):
+            if n:
+                yield ','
+            yield from _pieces(v, limit)
+        yield ']'
+    else:
+        yield _scalar(value, limit)
+
+
+def preview(value, limit=EVENT_PREVIEW_CHARS):
+    """Compact JSON text of value, cut at limit chars (+ '…'); the walk stops at the limit."""
+    out, size = [], 0
+    for piece in _pieces(value, limit):
+        out.append(piece)
+        size += len(piece)
+        if size > limit:
+            return ''.join(out)[:limit] + ELLIPSIS
+    return ''.join(out)
+
+
+def _bounded(value, limit):
+    if callable(value):
+        value = value()
+    if isinstance(value, str):
+        return value if len(value) <= limit else value[:limit] + ELLIPSIS
+    if isinstance(value, (dict, list, tuple)):
+        return preview(value, limit)
+    return value
+
+
+class _Line:
+    """The JSON line, built when (and only if) a handler formats the record."""
+    __slots__ = ('level', 'name', 'msg', 'args', 'fields', 'exc', 'limit')
+
+    def __init__(self, level, name, msg, args, fields, exc, limit):
+        self.level, self.name, self.msg, self.args = level, name, msg, args
+        self.fields, self.exc, self.limit = fields, exc, limit
+
+    def __str__(self):
+        msg = self.msg % self.args if self.args else self.msg
+        line = {'level': logging.getLevelName(self.level), 'logger': self.name, 'msg': _bounded(msg, self.limit)}
+        for k, v in self.fields.items():
+            line[k] = _bounded(v, self.limit)
+        if self.exc is not None:
+            tb = ''.join(traceback.format_exception(*self.exc))
+            # the end of a traceback says what failed
+            line['exc'] = tb if len(tb) <= self.limit else ELLIPSIS + tb[-self.limit:]
+        return json.dumps(line, ensure_ascii=False, default=str)
+
+
+class StructuredLogger:
+    """
+    Drop-in for the handlers' logging.Logger calls (msg, *args) plus keyword fields.
+    Lines go through the stdlib logger of the same name, so Lambda's handler
+    (and pytest's caplog) receive them as before.
+    """
+
+    def __init__(self, name, level=LOG_LEVEL, sample_rates=None, max_chars=LOG_MAX_CHARS, draw=random.random):
+        self.name = name
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(level)
+        self.sample_rates = LOG_SAMPLE_RATES if sample_rates is None else sample_rates
+        self.max_chars = max_chars
+        self.draw = draw
+
+    def _sampled(self, level, ctx):
+        rate = 1.0 if level >= logging.WARNING else self.sample_rates.get(level, 1.0)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        key = ctx.get('scan_id')
+        if key is not None:
+            return zlib.crc32(str(key).encode('utf-8')) / 2**32 < rate
+        return self.draw() < rate
+
+    def log(self, level, msg, *args, exc_info=None, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        ctx = _context.get()
+        if not self._sampled(level, ctx):
+            return
+        if exc_info is True:
+            exc_info = sys.exc_info()
+        exc = exc_info if exc_info and exc_info[0] is not None else None
+        self.logger.log(level, _Line(level, self.name, msg, args, {**ctx, **fields}, exc, self.max_chars))
+
+    def debug(self, msg, *args, **fields):
+        self.log(logging.DEBUG, msg, *args, **fields)
+
+    def info(self, msg, *args, **fields):
+        self.log(logging.INFO, msg, *args, **fields)
+
+    def warning(self, msg, *args, **fields):
+        self.log(logging.WARNING, msg, *args, **fields)
+
+    def error(self, msg, *args, **fields):
+        self.log(logging.ERROR, msg, *args, **fields)
+
+    def exception(self, msg, *args, **fields):
+        self.log(logging.ERROR, msg, *args, exc_info=True, **fields)
+
+
+def get_logger(name):
+    return StructuredLogger(name)
@@ -0,0 +1,92 @@
+# ==============================
+#   Scoring-Aware Feed Lookup Planner
+# ==============================
+# Orders feed queries by confidence per unit of cost and decides, after each
+# feed has answered, whether the remaining feeds could still change a
+# resource's final label. If they cannot, those lookups are skipped.
+#
+# Opt-in: LOOKUP_MODE=early_exit. The default "full" mode queries every feed
+# so audits keep the complete evidence set.
+
+import itertools
+import os
+
+from .correlation_engine import escalate_risk
+from .risk_scoring import FEED_CONFIDENCE, SEVERITY_WEIGHTS, weighted_totals, risk_label
+
+MODE_FULL = "full"
+MODE_EARLY_EXIT = "early_exit"
+LOOKUP_MODE = os.environ.get("LOOKUP_MODE", MODE_FULL)
+
+# Relative cost of one lookup (latency and quota); Shodan host lookups burn query credits
+FEED_COST = {
+    "otx": 1.0,
+    "abuseipdb": 1.0,
+    "greynoise": 1.0,
+    "shodan": 1.5
+}
+
+# Beyond this many outcome combinations the planner does not try to prove a label is final
+MAX_OUTCOMES = 512
+
+# Label thresholds of risk_label(); hypothetical averages this close to one are
+# treated as undecided so float summation order can never flip a skipped result
+LABEL_THRESHOLDS = (2, 5, 8)
+THRESHOLD_EPSILON = 1e-9
+
+
+def plan_feed_order(feeds):
+    """
+    Sorts feed names by confidence / cost, best value first.
+    """
+    return sorted(
+        feeds,
+        key=lambda feed: -FEED_CONFIDENCE.get(feed, 0.5) / FEED_COST.get(feed, 1.0)
+    )
+
+
+def correlated_level_range(ctx):
+    """
+    Lowest and highest level any finding can have after correlation, given the
+    resource's ResourceContext.
+    """
+    if ctx.exposure_factor > 1.0:
+        return escalate_risk("LOW", factor=ctx.exposure_factor - 1), "CRITICAL"
+    return "LOW", "CRITICAL"
+
+
+def label_is_final(correlated_findings, pending, level_range):
+    """
+    True when no outcome of the pending lookups can change the resource's label.
+
+    pending maps feed -> number of indicators still to query for this resource;
+    each lookup yields at most one finding at a level within level_range.
+    """
+    pending = [(feed, n) for feed, n in pending.items() if n > 0]
+    base_sum, base_weight = weighted_totals(correlated_findings)
+    current = risk_label(base_sum, base_weight)
+    if not pending:
+        return True
+
+    outcomes = 1
+    for _, n in pending:
+        outcomes *= n + 1
+    if outcomes > MAX_OUTCOMES:
+        return False
+
+    lo, hi = (SEVERITY_WEIGHTS[lvl] for lvl in level_range)
+    confidences = [FEED_CONFIDENCE.get(feed, 0.5) for feed, _ in pending]
+
+    # The label is monotonic in every finding's level, so for each possible
+    # number of findings per feed only the all-lowest and all-highest cases matter.
+    for counts in itertools.product(*(range(n + 1) for _, n in pending)):
+        added_weight = sum(k * c for k, c in zip(counts, confidences))
+        for sev in (lo, hi):
+            total_sum = base_sum + sev * added_weight
+            total_weight = base_weight + added_weight
+            avg = total_sum / max(total_weight, 1)
+            if any(abs(avg - t) < THRESHOLD_EPSILON for t in LABEL_THRESHOLDS):
+                return False
+            if risk_label(total_sum, total_weight) != current:
+                return False
+    return True
@@ -0,0 +1,121 @@
+# ==============================
+#   Worker Memory Budget
+# ==============================
+# A Lambda has a fixed memory size and is killed, not slowed, when a scan
+# exceeds it. Decoding a plan into Python objects takes several times its
+# JSON size (PLAN_MEMORY_FACTOR, measured by benchmarks/bench_memory.py), and
+# the in-memory path holds the raw bytes, the plan dict, the parsed resources
+# and the results at once. Before reading a plan the worker checks the
+# estimate against the budget left and, if it does not fit, processes the
+# plan as a stream in shards (worker_lambda.process_scan_sharded).
+#
+# With MAX_PARALLEL_SCANS > 1 several scans share the process: each in-memory
+# scan reserves its estimate while it holds the plan, and the headroom seen by
+# every other scan excludes those reservations, so two plans that each fit
+# alone cannot both be read at once.
+#
+# Headroom is the budget minus the process baseline and those reservations,
+# not minus the current RSS: CPython and the allocator keep freed arenas, so
+# after one large scan the RSS stays near its peak and every later scan in the
+# warm container would be sharded. The baseline is the RSS when the first
+# scan's budget is built (interpreter, handler modules, clients).
+
+import os
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+LAMBDA_MEMORY_MB = int(os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', '0')) or None
+# explicit budget, else this share of the function's memory
+MEMORY_BUDGET_MB = float(os.environ.get('MEMORY_BUDGET_MB', '0')) or None
+MEMORY_BUDGET_SHARE = float(os.environ.get('MEMORY_BUDGET_SHARE', '0.75'))
+PLAN_MEMORY_FACTOR = float(os.environ.get('PLAN_MEMORY_FACTOR', '8'))
+SHARD_RESOURCES = int(os.environ.get('SHARD_RESOURCES', '500'))
+MIN_SHARD_RESOURCES = 25
+
+
+def current_rss_mb():
+    """Resident memory of this process in MiB (Linux), or None when unknown."""
+    try:
+        with open('/proc/self/statm') as fh:
+            pages = int(fh.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+@lru_cache(maxsize=None)
+def baseline_rss_mb():
+    """RSS of this process before its first scan, measured once."""
+    return current_rss_mb() or 0.0
+
+
+def default_budget_mb():
+    if MEMORY_BUDGET_MB:
+        return MEMORY_BUDGET_MB
+    if LAMBDA_MEMORY_MB:
+        return LAMBDA_MEMORY_MB * MEMORY_BUDGET_SHARE
+    return None
+
+
+class Reservations:
+    """Estimates (MiB) held by the in-memory scans of this process."""
+
+    def __init__(self):
+        self.mb = 0.0
+        self.lock = threading.Lock()
+
+
+RESERVATIONS = Reservations()
+
+
+class MemoryBudget:
+    """
+    budget_mb=None means no limit is known (local runs): every plan fits.
+    """
+
+    def __init__(self, budget_mb=None, factor=PLAN_MEMORY_FACTOR, baseline=baseline_rss_mb,
+                 reservations=RESERVATIONS):
+        self.budget_mb = default_budget_mb() if budget_mb is None else budget_mb
+        self.factor = factor
+        self.baseline = baseline
+        self.reservations = reservations
+        if self.budget_mb is not None:
+            self.baseline()     # measured before this scan allocates anything
+
+    def estimate_mb(self, plan_bytes):
+        """Peak memory of processing a plan of plan_bytes in memory."""
+        return plan_bytes * self.factor / (1024 * 1024)
+
+    def headroom_mb(self):
+        if self.budget_mb is None:
+            return None
+        return self.budget_mb - self.baseline() - self.reservations.mb
+
+    def fits(self, plan_bytes):
+        headroom = self.headroom_mb()
+        return headroom is None or plan_bytes is None or self.estimate_mb(plan_bytes) <= headroom
+
+    @contextmanager
+    def reserve(self, plan_bytes):
+        """
+        with budget.reserve(size) as fits: ... -- when the plan fits, its estimate is held
+        against every other scan's headroom until the block exits.
+        """
+        held = 0.0
+        with self.reservations.lock:
+            fits = self.fits(plan_bytes)
+            if fits and self.budget_mb is not None and plan_bytes is not None:
+                held = self.estimate_mb(plan_bytes)
+                self.reservations.mb += held
+        try:
+            yield fits
+        finally:
+            if held:
+                with self.reservations.lock:
+                    self.reservations.mb -= held
+
+    def under_pressure(self):
+        """True when the in-memory scans running beside this one hold the rest of the budget."""
+        headroom = self.headroom_mb()
+        return headroom is not None and headroom <= 0
@@ -0,0 +1,132 @@
+# ==============================
+#   Worker Metrics
+# ==============================
+# One ScanMetrics per scan collects timed spans (s3_download, parse, context,
+# feeds, feed.<name>, score, store_raw, ddb_write) and counters. Spans of the
+# same name add up, so a sharded scan reports one total per stage. Adapter
+# spans run on the aggregator's threads and overlap: feed.* can sum to more
+# than the wall-clock `feeds` stage.
+#
+# At the end of a scan the worker stores breakdown() on the scan record and
+# emits one CloudWatch Embedded Metric Format line through the exporter:
+# stdout in Lambda (CloudWatch Logs turns it into metrics), MemoryExporter in
+# tests and local runs.
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'TA-IaC')
+FUNCTION_NAME = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'worker')
+
+
+class StdoutExporter:
+    def export(self, record):
+        sys.stdout.write(json.dumps(record, separators=(',', ':')) + '\n')
+        sys.stdout.flush()
+
+
+class MemoryExporter:
+    """Keeps emitted EMF records in .records."""
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def export(self, record):
+        with self._lock:
+            self.records.append(record)
+
+
+_exporter = StdoutExporter()
+
+
+def set_exporter(exporter=None):
+    """Routes every later emit() to exporter; None restores stdout."""
+    global _exporter
+    _exporter = exporter or StdoutExporter()
+    return _exporter
+
+
+class ScanMetrics:
+    def __init__(self, scan_id=None, clock=time.perf_counter, observer=None):
+        self.scan_id = scan_id
+        self.clock = clock
+        # observer(name) runs as each span ends (lib/profiling.py checkpoints memory there)
+        self.observer = observer
+        self.started = clock()
+        self.spans = {}      # name -> [count, total ms]
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name):
+        t0 = self.clock()
+        try:
+            yield
+        finally:
+            self.add_timing(name, (self.clock() - t0) * 1000.0)
+            if self.observer is not None:
+                self.observer(name)
+
+    def add_timing(self, name, ms):
+        with self._lock:
+            entry = self.spans.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += ms
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def elapsed_ms(self):
+        return (self.clock() - self.started) * 1000.0
+
+    def breakdown(self):
+        """{'total_ms', 'stages': {name: {'count', 'ms'}}, 'counters'} for the scan record."""
+        with self._lock:
+            stages = {name: {'count': c, 'ms': round(ms, 2)} for name, (c, ms) in self.spans.items()}
+            counters = dict(self.counters)
+        return {'total_ms': round(self.elapsed_ms(), 2), 'stages': stages, 'counters': counters}
+
+    def emf(self, namespace=METRICS_NAMESPACE, function=FUNCTION_NAME):
+        """One EMF record: <stage>_ms and <feed>_calls per span, counters, resources per second."""
+        data = self.breakdown()
+        values = {'scan_ms': data['total_ms']}
+        units = {'scan_ms': 'Milliseconds'}
+        for name, s in data['stages'].items():
+            values[f'{name}_ms'] = s['ms']
+            units[f'{name}_ms'] = 'Milliseconds'
+            if name.startswith('feed.'):
+                values[f'{name}_calls'] = s['count']
+                units[f'{name}_calls'] = 'Count'
+        for name, n in data['counters'].items():
+            values[name] = n
+            units[name] = 'Count'
+        if data['total_ms'] > 0 and 'resources' in data['counters']:
+            values['resources_per_second'] = round(data['counters']['resources'] / (data['total_ms'] / 1000.0), 2)
+            units['resources_per_second'] = 'Count/Second'
+        return {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': namespace,
+                    'Dimensions': [['Function']],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, unit in units.items()],
+                }],
+            },
+            'Function': function,
+            'scan_id': self.scan_id,
+            **values,
+        }
+
+    def emit(self, exporter=None):
+        (exporter or _exporter).export(self.emf())
+
+
+def span(metrics, name):
+    """metrics.span(name), or a no-op when the caller has no ScanMetrics."""
+    return nullcontext() if metrics is None else metrics.span(name)
@@ -1,16 +1,17 @@
+def parse_resource_change(rc):
+    rtype = rc.get('type') or rc.get('address')
+    name = rc.get('name') or rc.get('address')
+    change = rc.get('change') or {}
+    after = change.get('after') or rc.get('after') or {}
+    return {
+        'resource_id': rc.get('address') or f"{rtype}.{name}",
+        'type': rtype,
+        'name': name,
+        'attributes': after
+    }
+
 def parse_iac_plan(plan_json):
-    parsed = []
-    for rc in plan_json.get('resource_changes', []):
-        rtype = rc.get('type') or rc.get('address')
-        name = rc.get('name') or rc.get('address')
-        change = rc.get('change') or {}
-        after = change.get('after') or rc.get('after') or {}
-        parsed.append({
-            'resource_id': rc.get('address') or f"{rtype}.{name}",
-            'type': rtype,
-            'name': name,
-            'attributes': after
-        })
+    parsed = [parse_resource_change(rc) for rc in plan_json.get('resource_changes', [])]
     # fallback scan for simple maps
     if not parsed:
         for k,v in plan_json.items():
@@ -0,0 +1,193 @@
+# ==============================
+#   Streaming Plan Reader
+# ==============================
+# Reads a `terraform show -json` document from a file-like object (an S3
+# StreamingBody) without materializing it: resource_changes are decoded and
+# yielded one at a time, the sections asked for (e.g. `configuration`) are
+# kept, and every other top-level value (planned_values, prior_state, ...) is
+# skipped by a bracket scan that never builds its objects. Memory is bounded
+# by the read buffer plus the largest single resource change.
+#
+# A Spool wrapped around the body keeps a copy of what is read on local disk,
+# so a second pass over the plan re-reads the copy instead of downloading it
+# again.
+
+import codecs
+import json
+import re
+import tempfile
+
+CHUNK_SIZE = 1 << 20
+_decoder = json.JSONDecoder()
+_WS = re.compile(r"[ \t\n\r]*")
+# a string token (possibly cut off at the end of the buffer) or a bracket
+_SKIP_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*(")?|[\[\]{}]')
+
+
+class PlanReader:
+    """
+    for rc in PlanReader(fh).resource_changes(): ...
+    After the iteration, .sections holds the kept top-level values.
+    """
+
+    def __init__(self, fh, keep=("configuration",), chunk_size=CHUNK_SIZE):
+        self.fh = fh
+        self.keep = frozenset(keep)
+        self.chunk_size = chunk_size
+        self.sections = {}
+        self.bytes_read = 0
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    # ---- buffer ----
+    def _fill(self, at_least=None):
+        """Appends at least one chunk (or at_least chars) to the buffer; False at end of input."""
+        if self._eof:
+            return False
+        if self._pos > self.chunk_size:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        want = max(self.chunk_size, at_least or 0)
+        data = self.fh.read(want)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.bytes_read += len(data)
+        if not data:
+            self._eof = True
+            self._buf += self._text.decode(b"", final=True)
+            return False
+        self._buf += self._text.decode(data)
+        return True
+
+    def _skip_ws(self):
+        while True:
+            self._pos = _WS.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf) or not self._fill():
+                return
+
+    def _peek(self):
+        self._skip_ws()
+        if self._pos >= len(self._buf):
+            raise ValueError("Unexpected end of plan JSON")
+        return self._buf[self._pos]
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.bytes_read - len(self._buf) + self._pos}")
+        self._pos += 1
+
+    def _value(self):
+        """Decodes the next complete JSON value, reading more input until it is whole."""
+        self._skip_ws()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                # incomplete: read at least as much again, so large values cost linear time
+                if not self._fill(len(self._buf) - self._pos):
+                    raise
+                continue
+            if end == len(self._buf) and self._fill():
+                continue    # a number may continue in the next chunk
+            self._pos = end
+            return value
+
+    def _skip_value(self):
+        if self._peek() not in "[{":
+            self._value()
+            return
+        depth = 0
+        while True:
+            cut = False
+            for m in _SKIP_TOKEN.finditer(self._buf, self._pos):
+                token = m.group()
+                if token[0] == '"':
+                    if m.group(1) is None:
+                        self._pos, cut = m.start(), True
+                        break   # string cut off by the buffer end
+                    continue
+                depth += 1 if token in "[{" else -1
+                if depth == 0:
+                    self._pos = m.end()
+                    return
+            else:
+                self._pos = len(self._buf)
+            # a long string is rescanned from its start: grow the buffer geometrically
+            if not self._fill(len(self._buf) - self._pos if cut else None):
+                raise ValueError("Unexpected end of plan JSON")
+
+    # ---- document ----
+    def resource_changes(self):
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key == "resource_changes":
+                yield from self._array_items()
+            elif key in self.keep:
+                self.sections[key] = self._value()
+            else:
+                self._skip_value()
+            sep = self._peek()
+            self._pos += 1
+            if sep == "}":
+                return
+            if sep != ",":
+                raise ValueError(f"Expected ',' or '}}' in plan JSON, got {sep!r}")
+
+    def _array_items(self):
+        if self._peek() != "[":
+            self._value()   # not a list: nothing to yield
+            return
+        self._pos += 1
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            sep = self._peek()
+            self._pos += 1
+            if sep == "]":
+                return
+            if sep != ",":
+                raise ValueError(f"Expected ',' or ']' in resource_changes, got {sep!r}")
+
+
+class Spool:
+    """
+    with Spool(body) as spool: PlanReader(spool)...; PlanReader(spool.replay())...
+    Reads through to fh and copies every chunk to a temporary file (TMPDIR, /tmp on Lambda).
+    """
+
+    def __init__(self, fh, chunk_size=CHUNK_SIZE):
+        self.fh = fh
+        self.chunk_size = chunk_size
+        self.copy = tempfile.TemporaryFile()
+
+    def read(self, size=-1):
+        data = self.fh.read(size)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.copy.write(data)
+        return data
+
+    def replay(self):
+        """Copies what the first pass left unread, then returns the copy from its start."""
+        while self.read(self.chunk_size):
+            pass
+        self.copy.seek(0)
+        return self.copy
+
+    def close(self):
+        self.copy.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
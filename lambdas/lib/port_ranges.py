@@ -0,0 +1,114 @@
+# ==============================
+#   Security Group Port Ranges (interval sets)
+# ==============================
+# Ingress rules open port *ranges* (from_port..to_port, or every port for
+# protocol "-1"). The ranges of a resource that are reachable from an open
+# CIDR are sorted and merged, then intersected with the sorted sensitive-port
+# set in a single merge pass: O(n log n) in the number of rules and ports,
+# independent of how wide the ranges are. Ranges are never expanded.
+#
+# Handled shapes (Terraform plan "after" attributes):
+#   aws_security_group                  ingress = [{from_port, to_port, protocol, cidr_blocks, ipv6_cidr_blocks}]
+#   aws_security_group_rule             type = "ingress", from_port, to_port, protocol, cidr_blocks, ...
+#   aws_vpc_security_group_ingress_rule cidr_ipv4 / cidr_ipv6, from_port, to_port, ip_protocol
+
+from bisect import bisect_left
+
+MIN_PORT, MAX_PORT = 0, 65535
+OPEN_CIDRS = ("0.0.0.0/0", "::/0")
+ALL_PROTOCOLS = ("-1", "all")
+# from_port/to_port carry ICMP type/code for these, not ports
+NON_PORT_PROTOCOLS = ("icmp", "icmpv6", "1", "58")
+
+
+def merge_ranges(ranges):
+    """
+    Sorted, non-overlapping (lo, hi) ranges covering the same ports; adjacent ranges are joined.
+    """
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1] + 1:
+            if hi > merged[-1][1]:
+                merged[-1][1] = hi
+        else:
+            merged.append([lo, hi])
+    return [(lo, hi) for lo, hi in merged]
+
+
+def ports_in_ranges(merged, ports):
+    """
+    Ports of the sorted sequence `ports` that fall inside the merged ranges, ascending.
+    """
+    matched = []
+    i, n = 0, len(ports)
+    for lo, hi in merged:
+        i = bisect_left(ports, lo, i)
+        while i < n and ports[i] <= hi:
+            matched.append(ports[i])
+            i += 1
+        if i == n:
+            break
+    return matched
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return value
+    return [value]
+
+
+def _port_range(rule, protocol_key):
+    """(lo, hi) opened by one rule, or None for ICMP / malformed rules."""
+    protocol = str(rule.get(protocol_key, "") or "").lower()
+    if protocol in ALL_PROTOCOLS:
+        return MIN_PORT, MAX_PORT
+    if protocol in NON_PORT_PROTOCOLS:
+        return None
+    to_port = rule.get("to_port")
+    try:
+        lo = int(rule.get("from_port"))
+        hi = lo if to_port is None else int(to_port)
+    except (TypeError, ValueError):
+        return None
+    lo, hi = max(lo, MIN_PORT), min(hi, MAX_PORT)
+    return (lo, hi) if lo <= hi else None
+
+
+def _is_open(rule, cidr_keys, open_cidrs):
+    for key in cidr_keys:
+        for cidr in _as_list(rule.get(key)):
+            if cidr in open_cidrs:
+                return True
+    return False
+
+
+def open_ingress_ranges(attrs, open_cidrs=OPEN_CIDRS):
+    """
+    Port ranges that the resource's ingress rules open to any of open_cidrs (unmerged).
+    """
+    if not isinstance(attrs, dict):
+        return []
+    ranges = []
+
+    def add(rule, cidr_keys, protocol_key):
+        if isinstance(rule, dict) and _is_open(rule, cidr_keys, open_cidrs):
+            r = _port_range(rule, protocol_key)
+            if r:
+                ranges.append(r)
+
+    for block in _as_list(attrs.get("ingress")):
+        add(block, ("cidr_blocks", "ipv6_cidr_blocks"), "protocol")
+    if attrs.get("type") == "ingress":
+        add(attrs, ("cidr_blocks", "ipv6_cidr_blocks"), "protocol")
+    if "cidr_ipv4" in attrs or "cidr_ipv6" in attrs:
+        add(attrs, ("cidr_ipv4", "cidr_ipv6"), "ip_protocol")
+    return ranges
+
+
+def exposed_ports(attrs, sensitive_ports, open_cidrs=OPEN_CIDRS):
+    """
+    Sensitive ports (sorted sequence) reachable from an open CIDR through the resource's ingress rules.
+    """
+    return ports_in_ranges(merge_ranges(open_ingress_ranges(attrs, open_cidrs)), sensitive_ports)
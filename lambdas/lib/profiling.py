@@ -0,0 +1,163 @@
+# ==============================
+#   Per-scan Profiling
+# ==============================
+# A scan runs under cProfile and tracemalloc when its submission asked for it
+# (POST /scans?profile=true, honoured only where PROFILE_ALLOW_REQUESTS is set:
+# the API has no authorizer, and a profiled scan is several times slower and
+# larger) or when it is drawn at PROFILE_SAMPLE_RATE (0 = never, the default).
+# The artifacts go next to the plan in S3:
+#   iac-scans/<scan_id>.profile.pstats  cProfile stats (python -m pstats, snakeviz)
+#   iac-scans/<scan_id>.profile.txt     top functions by cumulative time
+#   iac-scans/<scan_id>.memory.txt      traced memory after each stage, top
+#                                       allocation sites where it was highest
+#
+# Safe to leave on at a low rate: one scan per container is profiled at a
+# time (others run unprofiled), setup or upload failures never fail the scan,
+# and nothing is imported or traced for scans that are not drawn. The memory
+# budget of a profiled scan uses PROFILE_MEMORY_FACTOR times the plan estimate
+# (tracemalloc's per-block records; about 2.4x on a decoded plan). cProfile
+# only sees the scan's own thread; feed calls made on the aggregator's pool
+# appear as time waiting on their futures (lib/metrics.py times them per feed).
+
+import io
+import marshal
+import os
+import random
+import threading
+
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_ALLOW_REQUESTS = os.environ.get('PROFILE_ALLOW_REQUESTS', '').lower() in ('1', 'true', 'yes')
+PROFILE_MEMORY_FACTOR = float(os.environ.get('PROFILE_MEMORY_FACTOR', '2.5'))
+# frames kept per traced allocation; more frames cost more time and memory
+TRACEMALLOC_FRAMES = int(os.environ.get('PROFILE_TRACEMALLOC_FRAMES', '1'))
+TOP_FUNCTIONS = 60
+TOP_ALLOCATIONS = 40
+# a new snapshot is taken only when traced memory grew by this share (snapshots are not free)
+SNAPSHOT_GROWTH = 1.1
+
+_busy = threading.Lock()
+
+
+def profile_keys(scan_id):
+    base = f'iac-scans/{scan_id}'
+    return {
+        'pstats': f'{base}.profile.pstats',
+        'profile': f'{base}.profile.txt',
+        'memory': f'{base}.memory.txt',
+    }
+
+
+def profile_requested(flag, allow=None):
+    """A submission's profile flag ('true', True, ...), honoured only when PROFILE_ALLOW_REQUESTS is set."""
+    allow = PROFILE_ALLOW_REQUESTS if allow is None else allow
+    return bool(allow) and str(flag).lower() in ('1', 'true', 'yes')
+
+
+def should_profile(requested=False, rate=None, draw=random.random, allow_requests=None):
+    rate = PROFILE_SAMPLE_RATE if rate is None else rate
+    return profile_requested(requested, allow_requests) or (rate > 0 and draw() < rate)
+
+
+class ScanProfiler:
+    """
+    if profiler.start(): try: ... finally: profiler.stop()
+    then profiler.artifacts() -> {name: bytes} for profile_keys().
+    checkpoint(stage) is the ScanMetrics observer: it records traced memory as
+    each stage ends and keeps the snapshot of the largest one.
+    """
+
+    def __init__(self, scan_id, frames=TRACEMALLOC_FRAMES):
+        self.scan_id = scan_id
+        self.frames = frames
+        self.profile = None
+        self.snapshot = None
+        self.snapshot_stage = None
+        self.stages = []     # (stage, current bytes, peak bytes since the previous checkpoint)
+        self.peak_bytes = None
+        self._owns_tracing = False
+        self._running = False
+        self._thread = None
+        self._snapshot_bytes = 0
+
+    def start(self):
+        """False when another scan in this container is being profiled (or profiling is unavailable)."""
+        if not _busy.acquire(blocking=False):
+            return False
+        try:
+            import cProfile
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self._owns_tracing = True
+            tracemalloc.reset_peak()
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        except Exception:
+            # e.g. another profiler already installed
+            self._stop_tracing()
+            _busy.release()
+            return False
+        self._thread = threading.current_thread()
+        self._running = True
+        return True
+
+    def checkpoint(self, stage):
+        if not self._running or stage.startswith('feed.') or threading.current_thread() is not self._thread:
+            return      # per-feed spans end on the aggregator's threads
+        import tracemalloc
+        self.profile.disable()      # the snapshot is not part of the scan's profile
+        try:
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak_bytes = max(self.peak_bytes or 0, peak)
+            self.stages.append((stage, current, peak))
+            if self.snapshot is None or current > self._snapshot_bytes * SNAPSHOT_GROWTH:
+                self.snapshot, self.snapshot_stage, self._snapshot_bytes = tracemalloc.take_snapshot(), stage, current
+            tracemalloc.reset_peak()
+        except Exception:
+            pass    # profiling must never fail the scan
+        finally:
+            self.profile.enable()
+
+    def stop(self):
+        if not self._running:
+            return
+        import tracemalloc
+        try:
+            self.profile.disable()
+            self.peak_bytes = max(self.peak_bytes or 0, tracemalloc.get_traced_memory()[1])
+            if self.snapshot is None:
+                self.snapshot, self.snapshot_stage = tracemalloc.take_snapshot(), 'end of scan'
+        finally:
+            self._stop_tracing()
+            self._running = False
+            _busy.release()
+
+    def _stop_tracing(self):
+        if self._owns_tracing:
+            import tracemalloc
+            tracemalloc.stop()
+            self._owns_tracing = False
+
+    def artifacts(self):
+        import pstats
+        self.profile.create_stats()
+        raw = marshal.dumps(self.profile.stats)     # what Profile.dump_stats writes; Stats() below empties it
+        text = io.StringIO()
+        text.write(f'scan {self.scan_id}\n')
+        pstats.Stats(self.profile, stream=text).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+
+        mib = 1024 * 1024
+        memory = io.StringIO()
+        memory.write(f'scan {self.scan_id}\npeak traced memory: {self.peak_bytes / mib:.1f} MiB\n'
+                     f'(other threads of the process are traced too)\n\n'
+                     f'{"stage":>14} {"held MiB":>9} {"peak MiB":>9}\n')
+        for stage, current, peak in self.stages:
+            memory.write(f'{stage:>14} {current / mib:>9.1f} {peak / mib:>9.1f}\n')
+        memory.write(f'\ntop {TOP_ALLOCATIONS} allocation sites held after {self.snapshot_stage}:\n')
+        for stat in self.snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+            memory.write(f'{stat}\n')
+        return {
+            'pstats': raw,
+            'profile': text.getvalue().encode('utf-8'),
+            'memory': memory.getvalue().encode('utf-8'),
+        }
@@ -0,0 +1,71 @@
+# ==============================
+#   Raw Scan Records & Rescoring
+# ==============================
+# Before scoring, the worker stores the inputs of a scan next to its plan in S3:
+# resource identities, ResourceContexts and the raw feed findings (degraded
+# ones included). Rescoring reads that record back and reruns correlation and
+# scoring with the weights currently deployed. There is no plan parsing and no
+# feed call, so scans can be rescored after a weight change in bulk.
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from .resource_context import context_from_dict
+
+RAW_VERSION = 1
+RESCORE_WORKERS = int(os.environ.get('RESCORE_WORKERS', '8'))
+
+
+def raw_key(scan_id):
+    return f'iac-scans/{scan_id}.raw.json'
+
+
+def raw_record(scan_id, resources, contexts, all_findings, skipped_feeds=()):
+    """
+    The scoring inputs of a scan. Resources without a context failed before scoring and are left out.
+    """
+    stored = []
+    for res, ctx, findings in zip(resources, contexts, all_findings):
+        if ctx is None:
+            continue
+        stored.append({
+            'resource_id': res.get('resource_id'),
+            'type': res.get('type'),
+            'name': res.get('name'),
+            'context': ctx.to_dict(),
+            'findings': findings
+        })
+    return {'version': RAW_VERSION, 'scan_id': scan_id, 'skipped_feeds': list(skipped_feeds), 'resources': stored}
+
+
+def load_raw(record, ruleset=None):
+    """
+    Returns (resources, contexts, all_findings, skipped_feeds) from a stored record.
+    Exposure factors are recomputed from the stored flags with the current weights.
+    """
+    if record.get('version') != RAW_VERSION:
+        raise ValueError(f"Unsupported raw record version: {record.get('version')!r}")
+    resources, contexts, all_findings = [], [], []
+    for entry in record.get('resources', []):
+        resources.append({'resource_id': entry.get('resource_id'), 'type': entry.get('type'),
+                          'name': entry.get('name'), 'attributes': {}})
+        contexts.append(context_from_dict(entry['context'], ruleset))
+        all_findings.append(entry.get('findings', []))
+    return resources, contexts, all_findings, record.get('skipped_feeds', [])
+
+
+def rescore_many(scan_ids, rescore, max_workers=RESCORE_WORKERS):
+    """
+    Runs rescore(scan_id) for every scan in parallel; returns {scan_id: error message or None}.
+    """
+    def run(scan_id):
+        try:
+            rescore(scan_id)
+            return scan_id, None
+        except Exception as e:
+            return scan_id, str(e)
+
+    if not scan_ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(scan_ids)))) as pool:
+        return dict(pool.map(run, scan_ids))
@@ -0,0 +1,89 @@
+# ==============================
+#   Resource Context (computed once per resource)
+# ==============================
+# The public / sensitive / exposed-port flags and the exposure factor that
+# drive escalation. Flags are raised by the compiled correlation rules (see
+# lib.rule_engine), whose predicates walk the attribute structure and stop at
+# the first match instead of stringifying the whole attribute map. The
+# context is then shared by correlation and the lookup planner. Exposure
+# propagated from other resources (lib.resource_graph) adds internet_reachable.
+
+from .rule_engine import default_ruleset
+
+REACHABLE_FLAG = "internet_reachable"
+
+# Flag -> exposure increment, applied in this order (overridden by the rule file's "flags")
+EXPOSURE_WEIGHTS = (
+    ("public", 0.7),
+    ("sensitive", 0.4),
+    ("exposed_ports", 0.3),
+    (REACHABLE_FLAG, 0.3)
+)
+
+
+class ResourceContext:
+    __slots__ = ("public", "sensitive", "exposed_ports", "exposure_factor", "flags", "reachable_via",
+                 "data_classes")
+
+    def __init__(self, flags=(), exposed_ports=(), weights=EXPOSURE_WEIGHTS, reachable_via=None,
+                 data_classes=()):
+        raised = set(flags)
+        # canonical flag order is the weight table order
+        self.flags = [flag for flag, _ in weights if flag in raised]
+        self.public = "public" in raised
+        self.sensitive = "sensitive" in raised
+        self.exposed_ports = list(exposed_ports)
+        self.exposure_factor = exposure_factor(self.flags, weights)
+        # entry point (resource_id) this resource is reachable from, if any
+        self.reachable_via = reachable_via
+        # sensitivity keyword classes matched (lib.keyword_matcher)
+        self.data_classes = sorted(data_classes)
+
+    def to_dict(self):
+        return {
+            "public": self.public,
+            "sensitive": self.sensitive,
+            "exposed_ports": self.exposed_ports,
+            "exposure_factor": self.exposure_factor,
+            "flags": self.flags,
+            "reachable_via": self.reachable_via,
+            "data_classes": self.data_classes
+        }
+
+
+def exposure_factor(flags, weights=EXPOSURE_WEIGHTS):
+    """
+    1.0 plus the increment of every flag present.
+    """
+    factor = 1.0
+    for flag, weight in weights:
+        if flag in flags:
+            factor += weight
+    return factor
+
+
+def build_context(resource, ruleset=None):
+    """
+    Evaluates the rules that apply to the resource's type and builds its context.
+    """
+    ruleset = ruleset or default_ruleset()
+    flags, ports, classes = ruleset.evaluate(resource)
+    return ResourceContext(flags, ports, weights=ruleset.weights, data_classes=classes)
+
+
+def mark_reachable(ctx, via, ruleset=None):
+    """
+    Copy of ctx with the internet_reachable flag raised, reached from entry point `via`.
+    """
+    ruleset = ruleset or default_ruleset()
+    return ResourceContext(ctx.flags + [REACHABLE_FLAG], ctx.exposed_ports,
+                           weights=ruleset.weights, reachable_via=via, data_classes=ctx.data_classes)
+
+
+def context_from_dict(data, ruleset=None):
+    """
+    Rebuilds a context stored with to_dict(); the exposure factor is recomputed with the current weights.
+    """
+    ruleset = ruleset or default_ruleset()
+    return ResourceContext(data.get("flags", ()), data.get("exposed_ports", ()), weights=ruleset.weights,
+                           reachable_via=data.get("reachable_via"), data_classes=data.get("data_classes", ()))
@@ -0,0 +1,392 @@
+# ==============================
+#   Plan Resource Graph & Internet Reachability
+# ==============================
+# Links the resources of a plan so exposure can propagate between them, e.g.
+# an aws_instance attached to an open security group or launched into a
+# public subnet. Edges come from two sources, resolved through address and
+# id/arn indexes (no pairwise comparison of resources):
+#   - the plan's `configuration` expression references (root module and
+#     module calls, with count / for_each instances mapped by index)
+#   - attribute cross-references (security_group_ids, subnet_id,
+#     target_group_arn, ...) whose value is the id or arn of a known resource
+#
+# Only network references carry traffic: a configuration reference becomes
+# an edge when its attribute path goes through NETWORK_REFERENCE_KEYS (an IAM
+# policy naming a public bucket does not make the policy reachable).
+# An edge A -> B means traffic that reaches A can reach B. By default a
+# resource inherits from what it references (instance -> its SG / subnet);
+# FORWARD_REFERENCES lists the references that point downstream instead
+# (listener -> target group -> target, route -> route table -> subnet).
+# References from count / for_each instances resolve through a per-address
+# index keyed by (module instance, index key), so linking is linear in the
+# number of references.
+#
+# Reachability is one BFS from the public entry points, O(V + E), with two
+# gates: a resource placed in subnets (or given an EIP) and attached to
+# security groups is reached only when a reachable placement AND an open
+# security group lead to it (an open SG in a private subnet, or a public
+# subnet behind a closed SG, is not reachable). Other edges (load balancer
+# -> target group -> target, routes) pass traffic on directly. Route tables,
+# routes and NACLs are never entry points by their CIDRs: a 0.0.0.0/0 route
+# to a NAT gateway is the normal private default route; only routes to an
+# internet gateway (in the plan, or an igw- id) expose what they serve.
+
+import re
+from collections import deque
+
+from .port_ranges import open_ingress_ranges
+from .resource_context import mark_reachable
+
+SECURITY_GROUP_TYPES = ("aws_security_group", "aws_security_group_rule", "aws_vpc_security_group_ingress_rule")
+LOAD_BALANCER_TYPES = ("aws_lb", "aws_alb", "aws_elb")
+GATEWAY_TYPES = ("aws_internet_gateway", "aws_eip")
+# egress-only paths: never reachable from the internet through them
+BARRIER_TYPES = ("aws_nat_gateway", "aws_egress_only_internet_gateway")
+# routing and network ACL resources: public only through an internet gateway route
+ROUTING_TYPES = ("aws_route", "aws_route_table", "aws_default_route_table", "aws_route_table_association",
+                 "aws_main_route_table_association", "aws_network_acl", "aws_default_network_acl",
+                 "aws_network_acl_rule")
+INTERNET_ROUTES = ("0.0.0.0/0", "::/0")
+
+# edge kinds by the type of the resource traffic comes from; a resource with
+# incoming edges of both gate kinds needs a reachable predecessor of each
+GATE_FIREWALL, GATE_PLACEMENT = "firewall", "placement"
+GATE_KINDS = {t: GATE_FIREWALL for t in SECURITY_GROUP_TYPES}
+GATE_KINDS.update({"aws_subnet": GATE_PLACEMENT, "aws_eip": GATE_PLACEMENT, "aws_eip_association": GATE_PLACEMENT})
+
+# (referencing type or "*", attribute path) whose traffic flows from the referencer to the target
+FORWARD_REFERENCES = frozenset([
+    ("*", "target_id"),
+    ("*", "default_action.target_group_arn"),
+    ("*", "default_action.forward.target_group.arn"),
+    ("*", "action.target_group_arn"),
+    ("aws_security_group_rule", "security_group_id"),
+    ("aws_vpc_security_group_ingress_rule", "security_group_id"),
+    ("aws_route", "route_table_id"),
+    ("aws_route_table_association", "subnet_id"),
+    ("aws_eip", "instance"),
+    ("aws_eip", "network_interface"),
+    ("aws_eip_association", "instance_id"),
+    ("aws_eip_association", "network_interface_id"),
+])
+
+# attributes whose values are ids / arns of other resources
+CROSS_REF_KEYS = frozenset([
+    "security_group_ids", "vpc_security_group_ids", "security_groups", "security_group_id",
+    "subnet_id", "subnet_ids", "subnets", "target_group_arn", "target_id", "load_balancer_arn",
+    "network_interface_id", "instance", "instance_id", "route_table_id", "gateway_id",
+])
+
+# attribute path components along which configuration references carry traffic
+NETWORK_REFERENCE_KEYS = CROSS_REF_KEYS | frozenset([
+    "vpc_zone_identifier", "target_group_arns", "load_balancers", "target_group", "launch_template",
+    "network_interfaces", "network_interface", "allocation_id", "nat_gateway_id", "transit_gateway_id",
+    "vpc_peering_connection_id", "egress_only_gateway_id", "vpc_endpoint_id",
+])
+
+# reference roots that are not managed resources
+NON_RESOURCE_ROOTS = ("var", "local", "module", "data", "each", "count", "self", "path", "terraform")
+
+ADDRESS_RE = re.compile(r"^(.*?)((?:data\.)?[^.\[]+\.[^.\[]+)(\[[^\]]*\])?$")
+REFERENCE_RE = re.compile(r"^([A-Za-z][\w-]*)\.([\w-]+)(\[[^\]]*\])?")
+INDEX_RE = re.compile(r"\[[^\]]*\]")
+
+
+def strip_index(address):
+    """Configuration address of a resource instance address (all [..] indexes removed)."""
+    return INDEX_RE.sub("", address)
+
+
+def split_address(address):
+    """(module instance prefix, resource address without index, index or None)."""
+    m = ADDRESS_RE.match(address or "")
+    if not m:
+        return "", address, None
+    return m.group(1), m.group(2), m.group(3)
+
+
+class ResourceGraph:
+    """
+    Directed graph over resource addresses; an edge src -> dst means traffic reaching src reaches dst.
+    types (address -> resource type) decide the gate kind of each edge (GATE_KINDS).
+    """
+
+    def __init__(self, addresses=(), types=None):
+        self.edges = {addr: set() for addr in addresses}
+        self.types = types or {}
+
+    def add_flow(self, src, dst):
+        if src != dst and src in self.edges and dst in self.edges:
+            self.edges[src].add(dst)
+
+    def edge_count(self):
+        return sum(len(d) for d in self.edges.values())
+
+    def gates(self):
+        """address -> gate kinds of its incoming edges (only for resources that have any)."""
+        gates = {}
+        for src, dsts in self.edges.items():
+            kind = GATE_KINDS.get(self.types.get(src))
+            if kind:
+                for dst in dsts:
+                    gates.setdefault(dst, set()).add(kind)
+        return gates
+
+    def reachable_from(self, entries, barriers=()):
+        """
+        Maps every resource reachable from an entry point to the entry it was reached from.
+        Barrier resources are neither marked nor traversed. A resource with incoming firewall
+        and placement edges is reached once both kinds have a reachable predecessor; any other
+        reachable predecessor reaches it directly.
+        """
+        gates = self.gates()
+        opened = {}     # address -> gate kinds with a reachable predecessor so far
+        via = {}
+        queue = deque()
+        for entry in entries:
+            if entry in self.edges and entry not in via and entry not in barriers:
+                via[entry] = entry
+                queue.append(entry)
+        while queue:
+            node = queue.popleft()
+            kind = GATE_KINDS.get(self.types.get(node))
+            for nxt in self.edges[node]:
+                if nxt in via or nxt in barriers:
+                    continue
+                needed = gates.get(nxt)
+                if kind and needed and len(needed) > 1:
+                    have = opened.setdefault(nxt, set())
+                    have.add(kind)
+                    if have != needed:
+                        continue
+                via[nxt] = via[node]
+                queue.append(nxt)
+        return via
+
+
+def _carries_traffic(path):
+    return any(part in NETWORK_REFERENCE_KEYS for part in path.split("."))
+
+
+def _flows_forward(rtype, path):
+    return (rtype, path) in FORWARD_REFERENCES or ("*", path) in FORWARD_REFERENCES
+
+
+def _add_reference(graph, rtype, path, src, dst):
+    if _flows_forward(rtype, path):
+        graph.add_flow(src, dst)
+    else:
+        graph.add_flow(dst, src)
+
+
+def _expression_refs(expressions, path=()):
+    """(attribute path, reference) pairs of a configuration `expressions` map, nested blocks included."""
+    for key, expr in expressions.items():
+        p = path + (key,)
+        if isinstance(expr, list):
+            for block in expr:
+                if isinstance(block, dict):
+                    yield from _expression_refs(block, p)
+        elif isinstance(expr, dict):
+            refs = expr.get("references")
+            if refs is not None:
+                for ref in refs:
+                    yield ".".join(p), ref
+            elif "constant_value" not in expr:
+                yield from _expression_refs(expr, p)
+
+
+def _config_resources(module, prefix=""):
+    """(module prefix, configuration resource) for the root module and every module call below it."""
+    for res in module.get("resources", []):
+        yield prefix, res
+    for name, call in (module.get("module_calls") or {}).items():
+        yield from _config_resources(call.get("module") or {}, f"{prefix}module.{name}.")
+
+
+class _InstanceIndex:
+    """The instances of one configuration address, by module instance and index key."""
+
+    __slots__ = ("all", "by_prefix", "by_key")
+
+    def __init__(self):
+        self.all = []
+        self.by_prefix = {}
+        # (module instance prefix or None for any, index or None) -> instances
+        self.by_key = {}
+
+    def add(self, address, prefix, index):
+        self.all.append(address)
+        self.by_prefix.setdefault(prefix, []).append(address)
+        self.by_key.setdefault((prefix, index), []).append(address)
+        self.by_key.setdefault((None, index), []).append(address)
+
+
+def _reference_targets(index, module_prefix, ref, ref_prefix, ref_index):
+    """
+    Instance addresses a reference resolves to, from the referencing instance's point of view
+    (ref_prefix / ref_index: its module instance prefix and index key). Dict lookups only.
+    """
+    m = REFERENCE_RE.match(ref)
+    if not m or m.group(1) in NON_RESOURCE_ROOTS:
+        return []
+    target = index.get(module_prefix + f"{m.group(1)}.{m.group(2)}")
+    if target is None:
+        return []
+    # stay within the referencing module instance
+    scope = ref_prefix if ref_prefix in target.by_prefix else None
+    candidates = target.by_prefix[ref_prefix] if scope is not None else target.all
+    key = m.group(3)
+    if key and "." not in key:
+        # literal index, e.g. aws_subnet.public[0]
+        return target.by_key.get((scope, key), [])
+    if ref_index:
+        # aws_subnet.public[count.index] / [each.key] from an instance with the same key
+        same = target.by_key.get((scope, ref_index))
+        if same:
+            return same
+    return candidates
+
+
+def _cross_refs(value, path=()):
+    """(attribute path, string value) for CROSS_REF_KEYS attributes, nested blocks included."""
+    if isinstance(value, dict):
+        for key, v in value.items():
+            p = path + (key,)
+            if key in CROSS_REF_KEYS:
+                for item in (v if isinstance(v, list) else [v]):
+                    if isinstance(item, str):
+                        yield ".".join(p), item
+            elif isinstance(v, (dict, list)):
+                yield from _cross_refs(v, p)
+    elif isinstance(value, list):
+        for v in value:
+            yield from _cross_refs(v, path)
+
+
+def build_graph(plan, resources):
+    """
+    Resource graph of a parsed plan; nodes are resource_ids (plan addresses).
+    """
+    addresses = [r.get("resource_id") for r in resources]
+    types = {r.get("resource_id"): r.get("type") for r in resources}
+    graph = ResourceGraph(addresses, types)
+
+    index = {}
+    split = {}
+    for addr in addresses:
+        prefix, _, key = split[addr] = split_address(addr)
+        index.setdefault(strip_index(addr), _InstanceIndex()).add(addr, prefix, key)
+
+    # configuration references
+    root = ((plan or {}).get("configuration") or {}).get("root_module") or {}
+    for prefix, res in _config_resources(root):
+        target = index.get(prefix + res.get("address", ""))
+        if target is None:
+            continue
+        refs = [(path, ref) for path, ref in _expression_refs(res.get("expressions") or {}) if _carries_traffic(path)]
+        if not refs:
+            continue
+        for src in target.all:
+            rtype = types[src]
+            src_prefix, _, src_index = split[src]
+            for path, ref in refs:
+                for dst in _reference_targets(index, prefix, ref, src_prefix, src_index):
+                    _add_reference(graph, rtype, path, src, dst)
+
+    # attribute cross-references by id / arn
+    by_id = {}
+    for r in resources:
+        attrs = r.get("attributes") or {}
+        for key in ("id", "arn"):
+            if isinstance(attrs.get(key), str):
+                by_id[attrs[key]] = r.get("resource_id")
+    if by_id:
+        for r in resources:
+            src = r.get("resource_id")
+            for path, value in _cross_refs(r.get("attributes") or {}):
+                dst = by_id.get(value)
+                if dst:
+                    _add_reference(graph, r.get("type"), path, src, dst)
+    return graph
+
+
+def graph_skeleton(resource):
+    """
+    Copy of a parsed resource with only the attributes build_graph() reads (id, arn and
+    cross-reference values), for plans processed as a stream.
+    """
+    attrs = resource.get("attributes") or {}
+    slim = {key: attrs[key] for key in ("id", "arn") if isinstance(attrs.get(key), str)}
+    for path, value in _cross_refs(attrs):
+        node = slim
+        *parents, leaf = path.split(".")
+        for p in parents:
+            if not isinstance(node.get(p), dict):
+                node[p] = {}
+            node = node[p]
+        if not isinstance(node.get(leaf), list):
+            node[leaf] = []
+        node[leaf].append(value)
+    return {"resource_id": resource.get("resource_id"), "type": resource.get("type"), "attributes": slim}
+
+
+def _routes_to_internet_gateway(attrs):
+    """A 0.0.0.0/0 or ::/0 route (top level or inline `route` blocks) whose gateway_id is an igw- id."""
+    routes = [attrs] + [r for r in attrs.get("route") or [] if isinstance(r, dict)]
+    for route in routes:
+        gateway = route.get("gateway_id")
+        if not (isinstance(gateway, str) and gateway.startswith("igw-")):
+            continue
+        if route.get("destination_cidr_block") in INTERNET_ROUTES or \
+                route.get("cidr_block") in INTERNET_ROUTES or \
+                route.get("destination_ipv6_cidr_block") in INTERNET_ROUTES or \
+                route.get("ipv6_cidr_block") in INTERNET_ROUTES:
+            return True
+    return False
+
+
+def is_entry_point(resource, ctx):
+    """True if the resource is directly reachable from the internet."""
+    rtype = resource.get("type")
+    attrs = resource.get("attributes") or {}
+    if rtype in ROUTING_TYPES:
+        # not by the generic "public" flag: 0.0.0.0/0 is also every private subnet's NAT route
+        return _routes_to_internet_gateway(attrs)
+    if rtype in SECURITY_GROUP_TYPES:
+        return bool(open_ingress_ranges(attrs))
+    if rtype in GATEWAY_TYPES:
+        return True
+    if rtype in LOAD_BALANCER_TYPES:
+        return attrs.get("internal") is not True
+    if rtype == "aws_subnet" and attrs.get("map_public_ip_on_launch") is True:
+        return True
+    return bool(ctx is not None and ctx.public)
+
+
+def internet_reachability(plan, resources, contexts, entries=None):
+    """
+    Maps the resource_id of every resource reachable from a public entry point to that entry point.
+    entries: precomputed entry point ids (for graph_skeleton resources, which lack the attributes).
+    """
+    graph = build_graph(plan, resources)
+    if entries is None:
+        entries = [r.get("resource_id") for r, ctx in zip(resources, contexts) if is_entry_point(r, ctx)]
+    barriers = {r.get("resource_id") for r in resources if r.get("type") in BARRIER_TYPES}
+    return graph.reachable_from(entries, barriers)
+
+
+def reachable_contexts(plan, resources, contexts, ruleset=None, entries=None):
+    """
+    Contexts with the internet_reachable flag raised on resources reached through another
+    resource. Entry points keep their own context; missing contexts stay None.
+    """
+    via = internet_reachability(plan, resources, contexts, entries)
+    out = []
+    for res, ctx in zip(resources, contexts):
+        rid = res.get("resource_id")
+        entry = via.get(rid)
+        if ctx is not None and entry is not None and entry != rid:
+            ctx = mark_reachable(ctx, entry, ruleset)
+        out.append(ctx)
+    return out
@@ -17,14 +17,10 @@ FEED_CONFIDENCE = {
 }
 
 
-def calculate_risk(correlated_findings):
+def weighted_totals(correlated_findings):
     """
-    Aggregates findings from multiple feeds into one unified severity.
-    Uses confidence weighting to normalize feed influence.
+    Returns (weighted_sum, total_weight) of the confidence-weighted severities.
     """
-    if not correlated_findings:
-        return "LOW"
-
     weighted_sum = 0
     total_weight = 0
 
@@ -36,7 +32,21 @@ def calculate_risk(correlated_findings):
         weighted_sum += SEVERITY_WEIGHTS.get(lvl, 1) * confidence
         total_weight += confidence
 
-    avg_score = weighted_sum / max(total_weight, 1)
+    return weighted_sum, total_weight
+
+
+def risk_value(weighted_sum, total_weight):
+    """
+    The numeric score: confidence-weighted average severity.
+    """
+    return weighted_sum / max(total_weight, 1)
+
+
+def risk_label(weighted_sum, total_weight):
+    """
+    Maps weighted totals to a severity label.
+    """
+    avg_score = risk_value(weighted_sum, total_weight)
 
     # Adaptive normalization thresholds
     if avg_score >= 8:
@@ -47,3 +57,25 @@ def calculate_risk(correlated_findings):
         return "MEDIUM"
     else:
         return "LOW"
+
+
+def calculate_risk(correlated_findings):
+    """
+    Aggregates findings from multiple feeds into one unified severity.
+    Uses confidence weighting to normalize feed influence.
+    """
+    if not correlated_findings:
+        return "LOW"
+
+    return risk_label(*weighted_totals(correlated_findings))
+
+
+def calculate_risk_score(correlated_findings):
+    """
+    Returns (label, value): calculate_risk's label and the numeric score behind it.
+    """
+    if not correlated_findings:
+        return "LOW", 0.0
+
+    totals = weighted_totals(correlated_findings)
+    return risk_label(*totals), risk_value(*totals)
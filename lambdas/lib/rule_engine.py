@@ -0,0 +1,234 @@
+# ==============================
+#   Declarative Correlation Rule Engine
+# ==============================
+# Context rules (what makes a resource public, sensitive, port-exposed, ...)
+# live in a JSON rule file. It is compiled once per container into closures
+# indexed by resource type, so a resource only evaluates the rules that apply
+# to its type plus the type-agnostic ones.
+#
+# Rule file format:
+#   {
+#     "flags": {"<flag>": <exposure increment>, ...},    # order = flag order
+#     "rules": [
+#       {"id": "...", "flag": "<flag>", "types": ["aws_s3_bucket", ...],   # omit for all types
+#        "when": <condition>}
+#     ]
+#   }
+# Conditions:
+#   {"attr": "a.b", "op": "is_true" | "exists" | "equals" | "in" | "contains" | "port_in" | "ingress_exposes",
+#    "value": ...}
+#   {"op": "keywords", "fields": ["tags", "name", ...], "classes": [...], "path": "..."}
+#   {"any": [<condition>, ...]}, {"all": [<condition>, ...]}, {"not": <condition>}
+# "attr" is a dotted path into the resource attributes; omitted = all attributes.
+# "contains" matches substrings in any string key/leaf below attr ("ignore_case": true to lowercase).
+# "port_in" matches a port or list of ports against "value" and records the matching ports.
+# "ingress_exposes" intersects the security-group ingress port ranges open to "cidrs" (default
+# 0.0.0.0/0 and ::/0) with the ports in "value" and records the exposed ones (see lib.port_ranges).
+# "keywords" scans the listed attribute fields with the sensitivity keyword automaton ("path" = keyword
+# file, default lib.keyword_matcher's) and records the data classes matched ("classes" restricts them).
+
+import json
+import os
+
+from .keyword_matcher import default_matcher, load_matcher
+from .port_ranges import OPEN_CIDRS, exposed_ports
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "rules", "correlation_rules.json")
+RULES_PATH = os.environ.get("CORRELATION_RULES_PATH", DEFAULT_RULES_PATH)
+
+WILDCARD = "*"
+
+
+def contains_text(value, needles, lower=False):
+    """
+    True if any needle occurs in a string leaf or key of a nested structure.
+    Equivalent to `any(n in str(value))` for JSON data, without building the string.
+    """
+    stack = [value]
+    while stack:
+        v = stack.pop()
+        if isinstance(v, str):
+            if lower:
+                v = v.lower()
+            for n in needles:
+                if n in v:
+                    return True
+        elif isinstance(v, dict):
+            stack.extend(v.keys())
+            stack.extend(v.values())
+        elif isinstance(v, (list, tuple, set)):
+            stack.extend(v)
+    return False
+
+
+def ports_in(ports, allowed):
+    """
+    Ports from a port / list of ports that are in allowed, in order of appearance.
+    """
+    matched = []
+    if ports:
+        if isinstance(ports, (int, str)):
+            ports = [ports]
+        for p in ports:
+            try:
+                if int(p) in allowed:
+                    matched.append(int(p))
+            except ValueError:
+                continue
+    return matched
+
+
+def _getter(path):
+    if path is None:
+        return lambda attrs: attrs
+    keys = path.split(".")
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda attrs: attrs.get(key)
+
+    def get(attrs):
+        v = attrs
+        for k in keys:
+            if not isinstance(v, dict):
+                return None
+            v = v.get(k)
+        return v
+    return get
+
+
+def compile_condition(cond):
+    """
+    Turns a condition dict into a predicate attrs -> truthy value.
+    port_in predicates return the matched ports, keywords predicates the matched classes.
+    """
+    if "any" in cond:
+        subs = [compile_condition(c) for c in cond["any"]]
+
+        def any_of(attrs):
+            for s in subs:
+                r = s(attrs)
+                if r:
+                    return r
+            return False
+        return any_of
+    if "all" in cond:
+        subs = [compile_condition(c) for c in cond["all"]]
+
+        def all_of(attrs):
+            r = True
+            for s in subs:
+                r = s(attrs)
+                if not r:
+                    return False
+            return r
+        return all_of
+    if "not" in cond:
+        sub = compile_condition(cond["not"])
+        return lambda attrs: not sub(attrs)
+
+    op = cond.get("op")
+    get = _getter(cond.get("attr"))
+    value = cond.get("value")
+
+    if op == "is_true":
+        return lambda attrs: get(attrs) is True
+    if op == "exists":
+        return lambda attrs: get(attrs) is not None
+    if op == "equals":
+        return lambda attrs: get(attrs) == value
+    if op == "in":
+        values = tuple(value)
+        return lambda attrs: get(attrs) in values
+    if op == "contains":
+        lower = bool(cond.get("ignore_case"))
+        needles = tuple(n.lower() if lower else n for n in value)
+        return lambda attrs: contains_text(get(attrs), needles, lower=lower)
+    if op == "port_in":
+        allowed = frozenset(int(p) for p in value)
+        return lambda attrs: ports_in(get(attrs), allowed)
+    if op == "ingress_exposes":
+        sensitive = sorted({int(p) for p in value})
+        cidrs = tuple(cond.get("cidrs", OPEN_CIDRS))
+        return lambda attrs: exposed_ports(get(attrs), sensitive, cidrs)
+    if op == "keywords":
+        matcher = load_matcher(cond["path"]) if cond.get("path") else default_matcher()
+        fields = tuple(cond.get("fields") or ("tags", "name", "description"))
+        if cond.get("classes"):
+            wanted = frozenset(cond["classes"])
+            return lambda attrs: matcher.match(attrs, fields) & wanted
+        return lambda attrs: matcher.match(attrs, fields)
+    raise ValueError(f"Unknown rule op: {op!r}")
+
+
+class RuleSet:
+    """
+    Compiled rules, indexed by resource type.
+    """
+
+    def __init__(self, spec):
+        flags = spec.get("flags", {})
+        self.weights = tuple(flags.items())
+        self.rule_count = 0
+        self._by_type = {}
+        self._wildcard = []
+        self._cache = {}
+
+        for rule in spec.get("rules", []):
+            flag = rule["flag"]
+            if flag not in flags:
+                raise ValueError(f"Rule {rule.get('id')!r} uses undeclared flag {flag!r}")
+            compiled = (rule.get("id"), flag, compile_condition(rule["when"]))
+            types = rule.get("types") or [WILDCARD]
+            for t in types:
+                if t == WILDCARD:
+                    self._wildcard.append(compiled)
+                else:
+                    self._by_type.setdefault(t, []).append(compiled)
+            self.rule_count += 1
+
+    def rules_for(self, rtype):
+        rules = self._cache.get(rtype)
+        if rules is None:
+            rules = self._by_type.get(rtype, []) + self._wildcard
+            self._cache[rtype] = rules
+        return rules
+
+    def evaluate(self, resource):
+        """
+        Returns (flags, ports, classes): the set of flags raised, the ports matched by port rules
+        and the data classes matched by keyword rules. Once a flag is raised, its remaining rules
+        are skipped.
+        """
+        attrs = resource.get("attributes", {})
+        raised = set()
+        ports = []
+        classes = set()
+        for _, flag, predicate in self.rules_for(resource.get("type")):
+            if flag in raised:
+                continue
+            result = predicate(attrs)
+            if result:
+                raised.add(flag)
+                if isinstance(result, list):
+                    ports += result
+                elif isinstance(result, frozenset):
+                    classes |= result
+        return raised, ports, classes
+
+
+def load_rules(path=None):
+    with open(path or RULES_PATH, encoding="utf-8") as fh:
+        return RuleSet(json.load(fh))
+
+
+_default_ruleset = None
+
+
+def default_ruleset():
+    """
+    The container-wide rule set, compiled on first use (cold start).
+    """
+    global _default_ruleset
+    if _default_ruleset is None:
+        _default_ruleset = load_rules()
+    return _default_ruleset
@@ -0,0 +1,80 @@
+# ==============================
+#   Streaming Scan Aggregates
+# ==============================
+# Updated once per resource result as the worker produces it, so the scan
+# summary (label histogram, worst label and max score, top-K resources,
+# per-feed contribution) never needs a second pass over the results. The
+# top-K is a bounded min-heap: O(log K) per result.
+
+import heapq
+import os
+
+from .risk_scoring import SEVERITY_WEIGHTS, FEED_CONFIDENCE
+
+TOP_K = int(os.environ.get('SCAN_TOP_K', '10'))
+LABELS = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+
+
+class ScanAggregates:
+
+    def __init__(self, top_k=TOP_K):
+        self.top_k = top_k
+        self.count = 0
+        self.histogram = {label: 0 for label in LABELS}
+        self.max_value = 0.0
+        self.degraded = 0
+        # feed -> [findings, confidence-weighted severity]
+        self.feeds = {}
+        self._top = []
+        self._seq = 0
+
+    def add(self, explanation):
+        """
+        Folds one build_explanation() result into the aggregates.
+        """
+        label = explanation.get('risk_score', 'LOW')
+        value = explanation.get('risk_value', 0.0)
+        self.count += 1
+        self.histogram[label] = self.histogram.get(label, 0) + 1
+        if value > self.max_value:
+            self.max_value = value
+        if explanation.get('degraded'):
+            self.degraded += 1
+
+        for f in explanation.get('findings', []):
+            feed = f.get('feed', '').lower()
+            lvl = f.get('risk_level', f.get('risk', 'LOW')).upper()
+            stats = self.feeds.setdefault(feed, [0, 0.0])
+            stats[0] += 1
+            stats[1] += SEVERITY_WEIGHTS.get(lvl, 1) * FEED_CONFIDENCE.get(feed, 0.5)
+
+        if self.top_k > 0:
+            # ties keep the earlier resource
+            entry = (value, -self._seq, explanation.get('resource_id'), label)
+            self._seq += 1
+            if len(self._top) < self.top_k:
+                heapq.heappush(self._top, entry)
+            elif entry > self._top[0]:
+                heapq.heapreplace(self._top, entry)
+
+    def worst(self):
+        for label in reversed(LABELS):
+            if self.histogram.get(label):
+                return label
+        return "LOW"
+
+    def summary(self):
+        total = sum(weighted for _, weighted in self.feeds.values()) or 1.0
+        return {
+            'resources': self.count,
+            'worst': self.worst(),
+            'max_value': round(self.max_value, 3),
+            'histogram': dict(self.histogram),
+            'degraded': self.degraded,
+            'top': [{'resource_id': rid, 'risk_score': label, 'risk_value': round(value, 3)}
+                    for value, _, rid, label in sorted(self._top, reverse=True)],
+            'feed_contribution': {
+                feed: {'findings': n, 'weighted': round(weighted, 3), 'share': round(weighted / total, 3)}
+                for feed, (n, weighted) in sorted(self.feeds.items())
+            }
+        }
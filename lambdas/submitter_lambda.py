@@ -1,18 +1,25 @@
-import os, json, uuid, time, logging
-import boto3
+import os, json, uuid, time
 from botocore.exceptions import ClientError
 from decimal import Decimal
 
-s3 = boto3.client('s3')
-sqs = boto3.client('sqs')
-ddb = boto3.client('dynamodb')
+from lib.aws_clients import LazyClient
+from lib.explanation_builder import render_results
+from lib.log import get_logger, log_context, preview
+from lib.profiling import profile_requested
 
-QUEUE_URL = os.environ['QUEUE_URL']
-TABLE_NAME = os.environ['TABLE_NAME']
-S3_BUCKET = os.environ['S3_BUCKET']
+# clients are created on first use (lib.aws_clients.set_client_factory swaps them locally)
+s3 = LazyClient('s3')
+sqs = LazyClient('sqs')
+ddb = LazyClient('dynamodb')
 
-logger = logging.getLogger('submitter')
-logger.setLevel(logging.INFO)
+QUEUE_URL = os.environ.get('QUEUE_URL')
+TABLE_NAME = os.environ.get('TABLE_NAME')
+S3_BUCKET = os.environ.get('S3_BUCKET')
+# scan ids per rescore message; the worker rescores one message's scans in parallel
+RESCORE_BATCH_SIZE = int(os.environ.get('RESCORE_BATCH_SIZE', '25'))
+
+# JSON lines, see lib.log; POST lines carry the new scan_id
+logger = get_logger('submitter')
 
 # --- ADDED HELPER FUNCTION ---
 def _create_response(status_code, body_dict):
@@ -66,11 +73,43 @@ def _get_scan(scan_id):
         return None
 
 
+def _queue_rescore(event):
+    """
+    POST /rescore {"scan_ids": [...]}: rescore stored findings without calling the threat feeds.
+    """
+    try:
+        body = event.get('body') or '{}'
+        if isinstance(body, str):
+            body = json.loads(body)
+        scan_ids = body.get('scan_ids')
+        if not isinstance(scan_ids, list) or not scan_ids or not all(isinstance(s, str) for s in scan_ids):
+            return _create_response(400, {'error': 'scan_ids must be a non-empty list of scan ids'})
+    except Exception:
+        logger.exception('Bad request JSON')
+        return _create_response(400, {'error': 'Invalid JSON'})
+
+    try:
+        for i in range(0, len(scan_ids), RESCORE_BATCH_SIZE):
+            sqs.send_message(
+                QueueUrl=QUEUE_URL,
+                MessageBody=json.dumps({'action': 'rescore', 'scan_ids': scan_ids[i:i + RESCORE_BATCH_SIZE]})
+            )
+    except ClientError:
+        logger.exception('AWS error')
+        return _create_response(500, {'error': 'internal'})
+
+    logger.info('Queued rescore', scans=len(scan_ids))
+    return _create_response(202, {'queued': len(scan_ids)})
+
+
 def handler(event, context):
     """
-    Handles both POST /scans and GET /scans/{scan_id}
+    Handles POST /scans (?profile=true profiles the scan where PROFILE_ALLOW_REQUESTS is set),
+    GET /scans/{scan_id} and POST /rescore
     """
-    logger.info(f"Incoming event: {json.dumps(event)[:300]}")
+    # the body of POST /scans is the whole plan: only the preview is ever serialized
+    logger.info('Incoming event', method=event.get('httpMethod'), path=event.get('path'),
+                event=lambda: preview(event))
 
     method = event.get('httpMethod', 'POST').upper()
 
@@ -87,9 +126,21 @@ def handler(event, context):
             # --- USE HELPER FUNCTION ---
             return _create_response(404, {'error': 'Scan not found'})
 
+        # Results are stored as reason codes; ?render=true adds the human-readable details
+        query = event.get('queryStringParameters') or {}
+        if str(query.get('render', '')).lower() in ('1', 'true', 'yes') and item.get('results_json'):
+            try:
+                item['results_json'] = json.dumps(render_results(json.loads(item['results_json'])))
+            except ValueError:
+                logger.exception('Could not render results', scan_id=scan_id)
+
         # --- USE HELPER FUNCTION ---
         return _create_response(200, item)
 
+    # === POST /rescore ===
+    if (event.get('resource') or event.get('path') or '').rstrip('/').endswith('/rescore'):
+        return _queue_rescore(event)
+
     # === POST /scans ===
     try:
         body = event.get('body')
@@ -105,30 +156,36 @@ def handler(event, context):
     scan_id = 'api-' + str(uuid.uuid4())
     s3_key = f'iac-scans/{scan_id}.json'
     timestamp = int(time.time())
+    message = {'scan_id': scan_id, 's3_key': s3_key}
+    # the worker uploads cProfile/tracemalloc artifacts next to the plan (lib/profiling.py)
+    query = event.get('queryStringParameters') or {}
+    if profile_requested(query.get('profile', '')):
+        message['profile'] = True
+
+    with log_context(scan_id=scan_id):
+        try:
+            # Upload plan to S3
+            s3.put_object(
+                Bucket=S3_BUCKET,
+                Key=s3_key,
+                Body=json.dumps(body).encode('utf-8'),
+                ServerSideEncryption='AES256'
+            )
+
+            # Write initial record
+            _write_ddb(scan_id, timestamp)
+
+            # Send to SQS
+            sqs.send_message(
+                QueueUrl=QUEUE_URL,
+                MessageBody=json.dumps(message)
+            )
+
+            logger.info('Submitted scan')
+            # --- USE HELPER FUNCTION ---
+            return _create_response(200, {'scan_id': scan_id})
 
-    try:
-        # Upload plan to S3
-        s3.put_object(
-            Bucket=S3_BUCKET,
-            Key=s3_key,
-            Body=json.dumps(body).encode('utf-8'),
-            ServerSideEncryption='AES256'
-        )
-
-        # Write initial record
-        _write_ddb(scan_id, timestamp)
-
-        # Send to SQS
-        sqs.send_message(
-            QueueUrl=QUEUE_URL,
-            MessageBody=json.dumps({'scan_id': scan_id, 's3_key': s3_key})
-        )
-
-        logger.info('Submitted scan %s', scan_id)
-        # --- USE HELPER FUNCTION ---
-        return _create_response(200, {'scan_id': scan_id})
-
-    except ClientError:
-        logger.exception('AWS error')
-        # --- USE HELPER FUNCTION ---
-        return _create_response(500, {'error': 'internal'})
\ No newline at end of file
+        except ClientError:
+            logger.exception('AWS error')
+            # --- USE HELPER FUNCTION ---
+            return _create_response(500, {'error': 'internal'})
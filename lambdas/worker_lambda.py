@@ -1,40 +1,70 @@
-import os, json, logging, time, traceback
-import boto3
+import os, gc, json, threading, time, traceback
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from botocore.exceptions import ClientError
 
-# ==== Initialize AWS clients ====
-s3 = boto3.client('s3')
-ddb = boto3.client('dynamodb')
+from lib.aws_clients import LazyClient
+from lib.log import get_logger, log_context, preview
+
+# ==== AWS clients (created on first use, see lib.aws_clients) ====
+s3 = LazyClient('s3')
+ddb = LazyClient('dynamodb')
 
 # ==== Environment variables ====
-TABLE_NAME = os.environ['TABLE_NAME']
-S3_BUCKET = os.environ['S3_BUCKET']
+TABLE_NAME = os.environ.get('TABLE_NAME')
+S3_BUCKET = os.environ.get('S3_BUCKET')
 CACHE_TABLE = os.environ.get('CACHE_TABLE_NAME', None)
+MAX_FEED_RETRIES = int(os.environ.get('MAX_FEED_RETRIES_PER_SCAN', '20'))
+MAX_PARALLEL_SCANS = int(os.environ.get('MAX_PARALLEL_SCANS', '1'))
+# scans with at least this many findings are correlated and scored in one vectorized batch
+BATCH_SCORING_THRESHOLD = int(os.environ.get('BATCH_SCORING_THRESHOLD', '5000'))
 
-# ==== Logging ====
-logger = logging.getLogger('worker')
-logger.setLevel(logging.INFO)
+# ==== Logging (JSON lines with the scan_id of the record being handled, see lib.log) ====
+logger = get_logger('worker')
 
 # ==== Safe imports of local libs ====
 try:
-    from lib.parser import parse_iac_plan
+    from lib.parser import parse_iac_plan, parse_resource_change
+    from lib.plan_stream import PlanReader, Spool
+    from lib.memory_budget import MemoryBudget, PLAN_MEMORY_FACTOR, SHARD_RESOURCES, MIN_SHARD_RESOURCES
+    from lib.metrics import ScanMetrics
+    from lib.profiling import ScanProfiler, should_profile, profile_keys, PROFILE_MEMORY_FACTOR
     from lib.correlation_engine import correlate_threats
-    from lib.risk_scoring import calculate_risk
+    from lib.resource_context import build_context
+    from lib.resource_graph import reachable_contexts, graph_skeleton, is_entry_point
+    from lib.risk_scoring import calculate_risk_score
+    from lib.batch_scoring import correlate_scan
     from lib.explanation_builder import build_explanation
+    from lib.scan_aggregates import ScanAggregates
     from lib.adapters.aggregator import ThreatAggregator
+    from lib.adapters.transport import RetryBudget, split_degraded
+    from lib.rescore import raw_key, raw_record, load_raw, rescore_many
 except Exception as imp_err:
-    logger.error(f"❌ Failed to import one or more TA-IaC libs: {imp_err}")
+    logger.error("❌ Failed to import one or more TA-IaC libs", error=str(imp_err))
     raise
 
-# ==== Aggregator ====
-try:
-    agg = ThreatAggregator(cache_table=CACHE_TABLE)
-except Exception as e:
-    logger.error(f"❌ Failed to initialize ThreatAggregator: {e}")
-    raise
+# ==== Aggregator (built by the first scan: rescoring never loads the feed adapters) ====
+_agg = None
+_agg_lock = threading.Lock()
+
+def get_aggregator():
+    global _agg
+    if _agg is None:
+        with _agg_lock:
+            if _agg is None:
+                try:
+                    agg = ThreatAggregator(cache_table=CACHE_TABLE)
+                    if agg.skipped_feeds:
+                        logger.info("ℹ️ Feeds without API key (skipped)", feeds=agg.skipped_feeds)
+                except Exception as e:
+                    logger.error("❌ Failed to initialize ThreatAggregator", error=str(e))
+                    raise
+                _agg = agg
+    return _agg
 
 # ==== DynamoDB update helper ====
-def update_status(scan_id, status, results=None, error=None):
+def update_status(scan_id, status, results=None, error=None, skipped_feeds=None, summary=None, timings=None,
+                  rescored_at=None, expect_status=None):
     try:
         expr = 'SET #s = :s'
         ean = {'#s': 'status'}
@@ -46,69 +76,329 @@ def update_status(scan_id, status, results=None, error=None):
         if error is not None:
             expr += ', error_message = :e'
             eav[':e'] = {'S': str(error)}
+        if skipped_feeds is not None:
+            expr += ', skipped_feeds = :k'
+            eav[':k'] = {'S': json.dumps(skipped_feeds)}
+        if summary is not None:
+            expr += ', summary_json = :m'
+            eav[':m'] = {'S': json.dumps(summary)}
+        if timings is not None:
+            expr += ', timings_json = :t'
+            eav[':t'] = {'S': json.dumps(timings)}
+        if rescored_at is not None:
+            # the stored timings describe the original run, not the results written now
+            expr += ', rescored_at = :a REMOVE timings_json'
+            eav[':a'] = {'N': str(rescored_at)}
+
+        kwargs = {}
+        if expect_status is not None:
+            # only moves a scan that is still in the expected state
+            kwargs['ConditionExpression'] = '#s = :x'
+            eav[':x'] = {'S': expect_status}
 
         ddb.update_item(
             TableName=TABLE_NAME,
             Key={'scan_id': {'S': scan_id}},
             UpdateExpression=expr,
             ExpressionAttributeNames=ean,
-            ExpressionAttributeValues=eav
+            ExpressionAttributeValues=eav,
+            **kwargs
         )
-        logger.info(f"✅ Updated scan {scan_id} → {status}")
+        logger.info("✅ Updated scan status", scan_id=scan_id, status=status)
     except Exception as e:
-        logger.error(f"❌ DynamoDB update failed for {scan_id}: {e}")
+        logger.error("❌ DynamoDB update failed", scan_id=scan_id, status=status, error=str(e))
         raise
 
 # ==== Main worker logic ====
-def process_scan(scan_id, s3_key):
-    logger.info(f"📥 Fetching IaC plan from s3://{S3_BUCKET}/{s3_key}")
+def _safe_context(res):
+    # A resource whose context cannot be built is reported by the per-resource loop below
+    try:
+        return build_context(res)
+    except Exception:
+        return None
+
+def process_scan(scan_id, s3_key, budget=None, memory=None, metrics=None):
+    logger.info("📥 Fetching IaC plan", bucket=S3_BUCKET, s3_key=s3_key)
+    if budget is None:
+        budget = RetryBudget(max_retries=MAX_FEED_RETRIES)
+    memory = memory or MemoryBudget()
+    metrics = metrics or ScanMetrics(scan_id)
     try:
-        obj = s3.get_object(Bucket=S3_BUCKET, Key=s3_key)
-        plan = json.loads(obj['Body'].read())
+        with metrics.span('s3_download'):
+            obj = s3.get_object(Bucket=S3_BUCKET, Key=s3_key)
     except Exception as e:
-        logger.error(f"❌ Failed to read S3 object {s3_key}: {e}")
+        logger.error("❌ Failed to read S3 object", s3_key=s3_key, error=str(e))
         raise
+    size = obj.get('ContentLength')
+    # the estimate stays reserved while the plan is in memory (parallel scans share the headroom)
+    with memory.reserve(size) as fits:
+        if fits:
+            return process_plan(scan_id, s3_key, obj, budget, metrics)
+    # raw bytes + plan dict + parsed list + results would not fit: stream the plan instead
+    logger.info("🧩 Plan does not fit the memory budget, processing in shards",
+                plan_mb=round(size / 2**20, 1), estimate_mb=round(memory.estimate_mb(size)),
+                headroom_mb=round(memory.headroom_mb()))
+    return process_scan_sharded(scan_id, s3_key, budget, memory, body=obj['Body'], metrics=metrics)
 
-    logger.info(f"🔍 Parsing and analyzing {scan_id}")
+def process_plan(scan_id, s3_key, obj, budget, metrics):
     try:
-        parsed = parse_iac_plan(plan)
+        with metrics.span('s3_download'):
+            data = obj['Body'].read()
+        with metrics.span('parse'):
+            plan = json.loads(data)
+        del data
     except Exception as e:
-        logger.error(f"❌ Failed to parse IaC plan: {e}")
+        logger.error("❌ Failed to read S3 object", s3_key=s3_key, error=str(e))
         raise
 
+    logger.info("🔍 Parsing and analyzing")
+    try:
+        with metrics.span('parse'):
+            parsed = parse_iac_plan(plan)
+    except Exception as e:
+        logger.error("❌ Failed to parse IaC plan", error=str(e))
+        raise
+
+    with metrics.span('context'):
+        # Context flags are computed once per resource and shared by planner and correlation
+        contexts = [_safe_context(res) for res in parsed]
+        try:
+            # Exposure propagates along the plan's references (open SG / public subnet -> instance)
+            contexts = reachable_contexts(plan, parsed, contexts)
+        except Exception as e:
+            logger.warning("⚠️ Resource graph failed, resources are scored independently", error=str(e))
+
+    # Feed lookups for the whole plan are batched across resources
+    agg = get_aggregator()
+    with metrics.span('feeds'):
+        all_findings = agg.check_resources(parsed, budget=budget, contexts=contexts, metrics=metrics)
+    with metrics.span('store_raw'):
+        store_raw(scan_id, parsed, contexts, all_findings)
+
+    with metrics.span('score'):
+        results, summary = score_results(parsed, contexts, all_findings)
+
+    metrics.count('resources', len(parsed))
+    finish_scan(scan_id, results, summary, agg.skipped_feeds, metrics)
+    logger.info("✅ Completed scan", results=len(results), ms=round(metrics.elapsed_ms()))
+    return results
+
+def process_scan_sharded(scan_id, s3_key, budget, memory, body=None, metrics=None):
+    """
+    Two streaming passes over the plan, never holding it whole:
+    1. contexts, entry points and a graph skeleton per resource, then reachability;
+    2. shards of SHARD_RESOURCES resources through feeds and scoring.
+    Only the contexts, the skeleton and the (small) results outlive a shard.
+    The plan is downloaded once, as pass 1 reads it, so S3 time is inside `context`;
+    pass 2 reads the copy pass 1 spooled to local disk.
+    """
+    metrics = metrics or ScanMetrics(scan_id)
+    with Spool(body or s3.get_object(Bucket=S3_BUCKET, Key=s3_key)['Body']) as spool:
+        with metrics.span('context'):
+            reader = PlanReader(spool)
+            contexts, skeleton, entries = [], [], []
+            for rc in reader.resource_changes():
+                res = parse_resource_change(rc)
+                ctx = _safe_context(res)
+                contexts.append(ctx)
+                skeleton.append(graph_skeleton(res))
+                try:
+                    if is_entry_point(res, ctx):
+                        entries.append(res['resource_id'])
+                except Exception:
+                    pass
+            try:
+                contexts = reachable_contexts(reader.sections, skeleton, contexts, entries=entries)
+            except Exception as e:
+                logger.warning("⚠️ Resource graph failed, resources are scored independently", error=str(e))
+            del skeleton, reader
+
+        if not contexts:
+            # the simple resource maps parse_iac_plan falls back to have no resource_changes to stream
+            logger.warning("⚠️ Plan has no resource_changes to shard, parsing it in memory")
+            return process_plan(scan_id, s3_key, {'Body': spool.replay()}, budget, metrics)
+
+        agg = get_aggregator()
+        aggregates = ScanAggregates()
+        record = raw_record(scan_id, [], [], [], agg.skipped_feeds)
+        results, summary = [], aggregates.summary()
+        shard_size, offset, shards = SHARD_RESOURCES, 0, 0
+        stream = PlanReader(spool.replay(), keep=()).resource_changes()
+        while True:
+            with metrics.span('parse'):
+                shard = [parse_resource_change(rc) for rc in islice(stream, shard_size)]
+            if not shard:
+                break
+            ctxs = contexts[offset:offset + len(shard)]
+            offset += len(shard)
+            with metrics.span('feeds'):
+                findings = agg.check_resources(shard, budget=budget, contexts=ctxs, metrics=metrics)
+            with metrics.span('store_raw'):
+                record['resources'] += raw_record(scan_id, shard, ctxs, findings)['resources']
+            with metrics.span('score'):
+                shard_results, summary = score_results(shard, ctxs, findings, aggregates)
+            results += shard_results
+            shards += 1
+            del shard, findings
+            if memory.under_pressure() and shard_size > MIN_SHARD_RESOURCES:
+                gc.collect()
+                shard_size = max(MIN_SHARD_RESOURCES, shard_size // 2)
+                logger.warning("⚠️ Memory budget reached, shard size lowered", shard_size=shard_size)
+
+    with metrics.span('store_raw'):
+        put_raw(scan_id, record)
+    metrics.count('resources', offset)
+    metrics.count('shards', shards)
+    finish_scan(scan_id, results, summary, agg.skipped_feeds, metrics)
+    logger.info("✅ Completed scan", results=len(results), shards=shards, ms=round(metrics.elapsed_ms()))
+    return results
+
+def finish_scan(scan_id, results, summary, skipped_feeds, metrics):
+    # the timings stored on the scan record cannot include their own write; the EMF line does
+    metrics.count('results', len(results))
+    with metrics.span('ddb_write'):
+        update_status(scan_id, 'COMPLETED', results=results, skipped_feeds=skipped_feeds, summary=summary,
+                      timings=metrics.breakdown())
+    try:
+        metrics.emit()
+    except Exception as e:
+        logger.warning("⚠️ Could not emit metrics", error=str(e))
+
+def store_raw(scan_id, parsed, contexts, all_findings):
+    # Scoring inputs, kept apart from the derived scores so the scan can be rescored later
+    put_raw(scan_id, raw_record(scan_id, parsed, contexts, all_findings, get_aggregator().skipped_feeds))
+
+def put_raw(scan_id, record):
+    try:
+        s3.put_object(
+            Bucket=S3_BUCKET,
+            Key=raw_key(scan_id),
+            Body=json.dumps(record).encode('utf-8'),
+            ServerSideEncryption='AES256'
+        )
+    except Exception as e:
+        logger.warning("⚠️ Could not store raw findings (rescore unavailable)", error=str(e))
+
+def score_results(parsed, contexts, all_findings, aggregates=None):
+    split = [split_degraded(f) for f in all_findings]
+
+    batched = {}
+    if sum(len(findings) for findings, _ in split) >= BATCH_SCORING_THRESHOLD:
+        idx = [i for i, ctx in enumerate(contexts) if ctx is not None]
+        try:
+            correlated_lists, labels, values = correlate_scan([split[i][0] for i in idx], [contexts[i] for i in idx])
+            batched = dict(zip(idx, zip(correlated_lists, labels, values)))
+        except Exception as e:
+            # a malformed finding: fall back to per-resource scoring, which isolates it
+            logger.warning("⚠️ Batch scoring failed, scoring per resource", error=str(e))
+
+    # Scan-level aggregates are updated as results are produced (no second pass);
+    # sharded scans pass one ScanAggregates for all their shards
+    if aggregates is None:
+        aggregates = ScanAggregates()
     results = []
-    for res in parsed:
+    for i, (res, ctx) in enumerate(zip(parsed, contexts)):
         try:
-            findings = agg.check_resource(res)
-            correlated = correlate_threats(res, findings)
-            score = calculate_risk(correlated)
-            explain = build_explanation(res, correlated, score)
+            findings, degraded = split[i]
+            if i in batched:
+                correlated, score, value = batched[i]
+            else:
+                correlated = correlate_threats(res, findings, ctx=ctx)
+                score, value = calculate_risk_score(correlated)
+            explain = build_explanation(res, correlated, score, value, ctx=ctx)
+            if degraded:
+                # Feeds that could not be queried: the result is incomplete, not clean
+                explain['degraded'] = True
+                explain['degraded_feeds'] = sorted({f.get('feed') for f in degraded})
             results.append(explain)
+            aggregates.add(explain)
         except Exception as e:
             rid = res.get('resource_id', 'unknown')
-            logger.exception(f"⚠️ Error processing resource {rid}: {e}")
+            logger.exception("⚠️ Error processing resource", resource_id=rid, error=str(e))
+    return results, aggregates.summary()
 
-    update_status(scan_id, 'COMPLETED', results=results)
-    logger.info(f"✅ Completed scan {scan_id} with {len(results)} findings")
-    return results
+# ==== Profiling (opt-in per scan, see lib.profiling) ====
+def profiled_scan(scan_id, s3_key, budget=None):
+    profiler = ScanProfiler(scan_id)
+    if not profiler.start():
+        logger.info("ℹ️ Profiler busy or unavailable, scan runs unprofiled")
+        return process_scan(scan_id, s3_key, budget=budget)
+    try:
+        # tracemalloc keeps a record per allocated block: budget the plan for it
+        return process_scan(scan_id, s3_key, budget=budget,
+                            memory=MemoryBudget(factor=PLAN_MEMORY_FACTOR * PROFILE_MEMORY_FACTOR),
+                            metrics=ScanMetrics(scan_id, observer=profiler.checkpoint))
+    finally:
+        profiler.stop()
+        store_profile(scan_id, profiler)
 
-# ==== Lambda handler ====
-def handler(event, context):
-    logger.info(f"📨 Incoming event: {json.dumps(event)[:500]}")
+def store_profile(scan_id, profiler):
+    try:
+        keys = profile_keys(scan_id)
+        for name, body in profiler.artifacts().items():
+            s3.put_object(Bucket=S3_BUCKET, Key=keys[name], Body=body, ServerSideEncryption='AES256')
+        logger.info("🔬 Profile stored", bucket=S3_BUCKET, keys=list(keys.values()))
+    except Exception as e:
+        logger.warning("⚠️ Could not store profile", error=str(e))
 
-    for rec in event.get('Records', []):
-        try:
-            body = json.loads(rec['body'])
-            scan_id = body.get('scan_id')
-            s3_key = body.get('s3_key')
-            logger.info(f"🚀 Starting scan {scan_id}")
+# ==== Rescoring (stored findings only, no feed calls) ====
+def rescore_scan(scan_id):
+    with log_context(scan_id=scan_id):
+        obj = s3.get_object(Bucket=S3_BUCKET, Key=raw_key(scan_id))
+        parsed, contexts, all_findings, skipped_feeds = load_raw(json.loads(obj['Body'].read()))
+        results, summary = score_results(parsed, contexts, all_findings)
+        # a FAILED or in-flight scan keeps its status: the condition fails and the rescore reports an error
+        update_status(scan_id, 'COMPLETED', results=results, skipped_feeds=skipped_feeds, summary=summary,
+                      rescored_at=int(time.time()), expect_status='COMPLETED')
+        logger.info("♻️ Rescored scan", results=len(results))
+    return results
+
+def rescore_scans(scan_ids):
+    errors = {k: v for k, v in rescore_many(scan_ids, rescore_scan).items() if v}
+    for scan_id, err in errors.items():
+        logger.error("❌ Rescore failed", scan_id=scan_id, error=str(err))
+    logger.info("♻️ Rescored scans", rescored=len(scan_ids) - len(errors), requested=len(scan_ids))
+    return errors
 
+# ==== Lambda handler ====
+def handle_record(rec, context):
+    scan_id = None
+    try:
+        body = json.loads(rec['body'])
+        if body.get('action') == 'rescore':
+            # the scans keep their previous results if a rescore fails
+            rescore_scans(body.get('scan_ids') or [])
+            return
+        scan_id = body.get('scan_id')
+        s3_key = body.get('s3_key')
+        # every line logged for this scan, on this thread, carries its scan_id
+        with log_context(scan_id=scan_id):
+            logger.info("🚀 Starting scan")
             update_status(scan_id, 'WORKING')
-            process_scan(scan_id, s3_key)
-        except Exception as e:
-            tb = traceback.format_exc()
-            logger.error(f"❌ Failed to process scan: {e}\n{tb}")
-            if 'scan_id' in locals():
+            budget = RetryBudget.from_lambda_context(context, max_retries=MAX_FEED_RETRIES)
+            if should_profile(body.get('profile')):
+                profiled_scan(scan_id, s3_key, budget=budget)
+            else:
+                process_scan(scan_id, s3_key, budget=budget)
+    except Exception as e:
+        tb = traceback.format_exc()
+        logger.exception("❌ Failed to process scan", scan_id=scan_id, message_id=rec.get('messageId'), error=str(e))
+        if scan_id:
+            with log_context(scan_id=scan_id):
                 update_status(scan_id, 'FAILED', error=tb)
 
-    logger.info("✅ Worker invocation complete")
+
+def handler(event, context):
+    records = event.get('Records', [])
+    # the records' bodies are small SQS messages, but only the preview is ever serialized
+    logger.info("📨 Incoming event", records=len(records), event=lambda: preview(event, 500))
+    if MAX_PARALLEL_SCANS > 1 and len(records) > 1:
+        # scans in one SQS batch share the aggregator, so identical lookups are coalesced
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_SCANS, len(records))) as pool:
+            list(pool.map(lambda rec: handle_record(rec, context), records))
+    else:
+        for rec in records:
+            handle_record(rec, context)
+
+    feed_calls = _agg.stats() if _agg is not None else {}
+    logger.info("✅ Worker invocation complete", feed_calls=feed_calls)
